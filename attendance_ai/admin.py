@@ -12,6 +12,10 @@ from .models import (
     RemoteAttendance,
     AttendanceAnomaly,
     AuditLog,
+    DailyAttendanceSummary,
+    EmbeddingVersion,
+    NotificationEvent,
+    KioskDevice,
 )
 
 User = get_user_model()
@@ -77,6 +81,7 @@ class FaceProfileAdmin(admin.ModelAdmin):
     readonly_fields = (
         "created_at",
         "updated_at",
+        "face_image_small",
         "face_encoding_preview",
     )
 
@@ -86,6 +91,17 @@ class FaceProfileAdmin(admin.ModelAdmin):
 
     user_link.short_description = "User"
 
+    def face_image_small(self, obj):
+        if not obj.image_url:
+            return "-"
+        return format_html(
+            '<a href="{}" target="_blank"><img src="{}" loading="lazy" style="max-height:80px;border-radius:4px;" /></a>',
+            obj.image_url,
+            obj.face_crop_url or obj.thumbnail_url or obj.image_url
+        )
+
+    face_image_small.short_description = "Registered Face"
+
     def face_encoding_preview(self, obj):
         if not obj.face_encoding:
             return "-"
@@ -110,6 +126,7 @@ class RemoteAttendanceAdmin(admin.ModelAdmin):
 
     list_filter = ("status", "check_in_time","check_out_time")
     search_fields = ("user__username", "user__employee_id")
+    list_select_related = ("user",)
 
     readonly_fields = ("verification_image_small",)
 
@@ -121,9 +138,11 @@ class RemoteAttendanceAdmin(admin.ModelAdmin):
 
     def verification_image_small(self, obj):
         if obj.verification_image_url:
+            # thumbnail in the list, click through for the original
             return format_html(
-                '<img src="{}" style="max-height:80px;border-radius:4px;" />',
-                obj.verification_image_url
+                '<a href="{}" target="_blank"><img src="{}" loading="lazy" style="max-height:80px;border-radius:4px;" /></a>',
+                obj.verification_image_url,
+                obj.thumbnail_url or obj.verification_image_url
             )
         return "-"
 
@@ -187,6 +206,8 @@ class AuditLogAdmin(admin.ModelAdmin):
 
     list_filter = ("action", "timestamp")
     search_fields = ("actor__username", "action", "target_repr", "ip_address")
+    list_select_related = ("actor",)
+    show_full_result_count = False  # skip the unfiltered COUNT(*) on every page
 
     def actor_link(self, obj):
         if not obj.actor:
@@ -203,3 +224,80 @@ class AuditLogAdmin(admin.ModelAdmin):
         return text if len(text) < 80 else text[:80] + "..."
 
     extra_short.short_description = "Extra"
+
+
+# ---------------------------------------------------------
+# DAILY ROLLUP (read-only)
+# ---------------------------------------------------------
+@admin.register(DailyAttendanceSummary)
+class DailyAttendanceSummaryAdmin(admin.ModelAdmin):
+    list_display = (
+        "date",
+        "department",
+        "status",
+        "count",
+        "first_check_in",
+        "last_check_out",
+        "confidence_avg",
+    )
+
+    list_filter = ("status", "department")
+    date_hierarchy = "date"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# ---------------------------------------------------------
+# EMBEDDING VERSIONS (read-only; managed by reembed_gallery)
+# ---------------------------------------------------------
+@admin.register(EmbeddingVersion)
+class EmbeddingVersionAdmin(admin.ModelAdmin):
+    list_display = (
+        "name",
+        "model_pack",
+        "status",
+        "processed",
+        "failed",
+        "total",
+        "created_at",
+        "activated_at",
+    )
+
+    list_filter = ("status",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# ---------------------------------------------------------
+# NOTIFICATION OUTBOX (read-only; flushed by flush_notifications)
+# ---------------------------------------------------------
+@admin.register(NotificationEvent)
+class NotificationEventAdmin(admin.ModelAdmin):
+    list_display = ("recipient", "severity", "subject", "created_at", "sent_at", "attempts", "failed_at")
+    list_filter = ("severity", ("sent_at", admin.EmptyFieldListFilter), ("failed_at", admin.EmptyFieldListFilter))
+    search_fields = ("recipient", "subject")
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# ---------------------------------------------------------
+# KIOSK DEVICES (device -> gallery shard registry)
+# ---------------------------------------------------------
+@admin.register(KioskDevice)
+class KioskDeviceAdmin(admin.ModelAdmin):
+    list_display = ("device_id", "label", "shard", "is_active", "created_at")
+    list_filter = ("shard", "is_active")
+    search_fields = ("device_id", "label", "shard")
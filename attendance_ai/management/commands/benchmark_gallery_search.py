@@ -0,0 +1,179 @@
+# attendance_ai/management/commands/benchmark_gallery_search.py
+import os
+import json
+import time
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance_ai.services.face_recognition import load_face_encoding_field
+from attendance_ai.services.gallery_index import COARSE_DTYPES, GalleryIndex
+
+DIM = 512
+
+
+def _normalize(matrix):
+    return (matrix / np.maximum(np.linalg.norm(matrix, axis=-1, keepdims=True), 1e-10)).astype(np.float32)
+
+
+def load_backup_embeddings(path):
+    """
+    face_encoding of every faceprofile in a dumpdata file (plain lists or
+    encrypted tokens). Anything printed before the JSON is skipped.
+    """
+    with open(path) as fh:
+        text = fh.read()
+    start = text.find("[")
+    if start < 0:
+        raise CommandError(f"No JSON array in {path}")
+    encodings = []
+    for obj in json.loads(text[start:]):
+        if obj.get("model") != "attendance_ai.faceprofile":
+            continue
+        emb = load_face_encoding_field(obj["fields"].get("face_encoding"))
+        if emb is not None and emb.size == DIM:
+            encodings.append(emb)
+    if not encodings:
+        raise CommandError(f"No {DIM}-d face encodings in {path}")
+    return _normalize(np.vstack(encodings))
+
+
+def synthetic_gallery(rng, size):
+    # isotropic: the worst case for PCA
+    return _normalize(rng.standard_normal((size, DIM)).astype(np.float32))
+
+
+def derived_gallery(rng, base, size, spread):
+    """
+    Random mixtures of real embeddings plus isotropic noise: keeps the
+    real gallery's dominant directions at any size.
+    """
+    weights = rng.dirichlet(np.ones(len(base)), size=size).astype(np.float32)
+    noise = rng.standard_normal((size, DIM)).astype(np.float32) / np.sqrt(DIM)
+    return _normalize(weights @ base + spread * noise)
+
+
+def make_probes(rng, gallery, count, similarity):
+    """
+    New captures of enrolled people: cosine `similarity` to their template.
+    """
+    rows = rng.choice(len(gallery), size=min(count, len(gallery)), replace=False)
+    noise = _normalize(rng.standard_normal((len(rows), DIM)).astype(np.float32))
+    noise = _normalize(noise - np.sum(noise * gallery[rows], axis=1, keepdims=True) * gallery[rows])
+    return _normalize(similarity * gallery[rows] + np.sqrt(1 - similarity ** 2) * noise)
+
+
+def _ms(samples):
+    return round(float(np.percentile(samples, 50)) * 1000, 3), round(float(np.percentile(samples, 95)) * 1000, 3)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark compressed 1:N gallery search (PCA / float16 / int8 first pass + float32 re-rank) "
+        "against the exact scan: memory, latency and rank agreement on synthetic and "
+        "backup_faceprofiles.json-derived galleries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10000,100000", help="Comma-separated gallery sizes.")
+        parser.add_argument("--configs", default="0:float16,0:int8,128:float32,128:float16,128:int8,64:float16",
+                            help="Comma-separated DIMS:DTYPE coarse representations (DIMS 0 = no PCA).")
+        parser.add_argument("--top-k", type=int, default=32, help="Candidates re-ranked in float32.")
+        parser.add_argument("--probes", type=int, default=200, help="Queries per run.")
+        parser.add_argument("--probe-similarity", type=float, default=0.7,
+                            help="Cosine between a probe and its enrolled template.")
+        parser.add_argument("--spread", type=float, default=0.6, help="Noise added to derived identities.")
+        parser.add_argument("--backup", default=os.path.join(settings.BASE_DIR, "backup_faceprofiles.json"))
+        parser.add_argument("--no-backup", action="store_true", help="Synthetic galleries only.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default="bench_gallery.json")
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["seed"])
+        configs = []
+        for item in options["configs"].split(","):
+            dims, _, dtype = item.strip().partition(":")
+            if dtype not in COARSE_DTYPES:
+                raise CommandError(f"Unknown dtype in {item!r}; use one of {COARSE_DTYPES}")
+            configs.append((int(dims), dtype))
+
+        sources = {"synthetic": None}
+        if not options["no_backup"]:
+            if not os.path.exists(options["backup"]):
+                raise CommandError(f"{options['backup']} not found (or pass --no-backup)")
+            sources["backup"] = load_backup_embeddings(options["backup"])
+            self.stdout.write(f"{len(sources['backup'])} real embeddings from {options['backup']}")
+
+        runs = []
+        for source, base in sources.items():
+            for size in [int(s) for s in options["sizes"].split(",") if s.strip()]:
+                if base is None:
+                    gallery = synthetic_gallery(rng, size)
+                else:
+                    gallery = derived_gallery(rng, base, size, options["spread"])
+                probes = make_probes(rng, gallery, options["probes"], options["probe_similarity"])
+                runs.extend(self._run(source, gallery, probes, configs, options["top_k"]))
+
+        report = {
+            "top_k": options["top_k"],
+            "probes": options["probes"],
+            "probe_similarity": options["probe_similarity"],
+            "cpu_count": os.cpu_count(),
+            "runs": runs,
+        }
+        with open(options["output"], "w") as fh:
+            json.dump(report, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def _run(self, source, gallery, probes, configs, top_k):
+        exact = GalleryIndex(np.arange(len(gallery)), gallery)
+        exact_top1, exact_top10, exact_times = [], [], []
+        for probe in probes:
+            started = time.perf_counter()
+            scores = exact.exact_scores(probe)
+            best = int(np.argmax(scores))
+            exact_times.append(time.perf_counter() - started)
+            exact_top1.append(best)
+            exact_top10.append(set(np.argpartition(scores, -10)[-10:].tolist()))
+
+        p50, p95 = _ms(exact_times)
+        rows = [{
+            "gallery": source, "size": len(gallery), "dims": DIM, "dtype": "float32", "exact": True,
+            "memory_mb": round(exact.full_nbytes / 2 ** 20, 2), "p50_ms": p50, "p95_ms": p95,
+            "top1_agreement": 1.0, "coarse_recall_at_10": 1.0, "build_s": 0.0,
+        }]
+        self._print(rows[0])
+
+        for dims, dtype in configs:
+            started = time.perf_counter()
+            index = GalleryIndex(np.arange(len(gallery)), gallery, dims=dims, dtype=dtype)
+            build = time.perf_counter() - started
+
+            times, agree, recall = [], 0, []
+            for probe, want, want10 in zip(probes, exact_top1, exact_top10):
+                started = time.perf_counter()
+                got, _ = index.search(probe, top_k)
+                times.append(time.perf_counter() - started)
+                agree += got == want
+                coarse10 = np.argpartition(index.coarse_scores(probe), -10)[-10:]
+                recall.append(len(want10.intersection(coarse10.tolist())) / 10)
+
+            p50, p95 = _ms(times)
+            row = {
+                "gallery": source, "size": len(gallery), "dims": index.dims or DIM, "dtype": dtype, "exact": False,
+                "memory_mb": round(index.coarse_nbytes / 2 ** 20, 2), "p50_ms": p50, "p95_ms": p95,
+                "top1_agreement": round(agree / len(probes), 4),
+                "coarse_recall_at_10": round(float(np.mean(recall)), 4),
+                "build_s": round(build, 3),
+            }
+            rows.append(row)
+            self._print(row)
+        return rows
+
+    def _print(self, row):
+        label = "exact float32" if row["exact"] else f"{row['dims']}-d {row['dtype']}"
+        self.stdout.write(
+            f"{row['gallery']:>9} {row['size']:>8}  {label:<15} {row['memory_mb']:>9.2f} MB  "
+            f"p50 {row['p50_ms']:>8.3f} ms  p95 {row['p95_ms']:>8.3f} ms  "
+            f"top-1 agree {row['top1_agreement']:.3f}  coarse R@10 {row['coarse_recall_at_10']:.3f}"
+        )
@@ -0,0 +1,217 @@
+# attendance_ai/management/commands/benchmark_hot_queries.py
+import json
+import random
+import time
+from datetime import timedelta
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from attendance_ai.models import RemoteAttendance, AttendanceAnomaly, AuditLog
+from attendance_ai.utils.dates import local_day_bounds
+
+User = get_user_model()
+
+BENCH_PREFIX = "bench_"
+DEPARTMENTS = ["engineering", "finance", "hr", "sales", "support", "ops", "legal", "marketing"]
+STATUSES = ["verified", "pending", "approved", "rejected", "unverified"]
+STATUS_WEIGHTS = [0.70, 0.08, 0.12, 0.05, 0.05]
+INDEXED_MODELS = (RemoteAttendance, AttendanceAnomaly, AuditLog)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic attendance data (e.g. 1M / 10M rows) and record timings + "
+        "EXPLAIN plans for the hot attendance queries, optionally with and without the indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", action="store_true", help="Insert synthetic rows before measuring.")
+        parser.add_argument("--rows", type=int, default=1_000_000, help="RemoteAttendance rows to seed.")
+        parser.add_argument("--users", type=int, default=5000, help="Synthetic users to seed.")
+        parser.add_argument("--audit-rows", type=int, default=None, help="AuditLog rows to seed (default: --rows).")
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=20, help="Executions per query.")
+        parser.add_argument("--compare", action="store_true",
+                            help="Drop the model indexes, measure, recreate them and measure again.")
+        parser.add_argument("--purge", action="store_true", help="Delete all synthetic bench_ data and exit.")
+        parser.add_argument("--output", default="bench_output.json")
+
+    # ---------------------------------------------------------
+    # seeding
+    # ---------------------------------------------------------
+    def _seed(self, n_users, n_rows, n_audit, batch_size):
+        rng = random.Random(42)
+        offset = User.objects.filter(username__startswith=BENCH_PREFIX).count()
+        User.objects.bulk_create(
+            [
+                User(
+                    username=f"{BENCH_PREFIX}{i}",
+                    employee_id=f"BENCH-{i}",
+                    department=rng.choice(DEPARTMENTS),
+                    password="!",
+                )
+                for i in range(offset, offset + n_users)
+            ],
+            batch_size=batch_size,
+        )
+        user_ids = list(User.objects.filter(username__startswith=BENCH_PREFIX).values_list("id", flat=True))
+
+        now = timezone.now()
+        started = time.perf_counter()
+        for done in range(0, n_rows, batch_size):
+            batch = []
+            for _ in range(min(batch_size, n_rows - done)):
+                check_in = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+                is_open = rng.random() < 0.05
+                batch.append(RemoteAttendance(
+                    user_id=rng.choice(user_ids),
+                    check_in_time=check_in,
+                    check_out_time=None if is_open else check_in + timedelta(hours=rng.uniform(4, 10)),
+                    status=rng.choices(STATUSES, STATUS_WEIGHTS)[0],
+                    confidence_score=rng.uniform(0.55, 0.99),
+                    geolocation={"lat": 31.5, "lng": 74.3},
+                    device_info={"device_id": f"kiosk-{rng.randint(1, 50)}"},
+                ))
+            created = RemoteAttendance.objects.bulk_create(batch, batch_size=batch_size)
+            AttendanceAnomaly.objects.bulk_create(
+                [
+                    AttendanceAnomaly(attendance=a, anomaly_type="low_confidence", severity="high", description="bench")
+                    for a in created if a.pk and rng.random() < 0.02
+                ],
+                batch_size=batch_size,
+            )
+            self.stdout.write(f"  attendance {done + len(batch):,}/{n_rows:,}")
+
+        actions = ["attendance_checkin", "attendance_created", "attendance_checkout", "face_registered"]
+        for done in range(0, n_audit, batch_size):
+            AuditLog.objects.bulk_create(
+                [
+                    AuditLog(
+                        actor_id=rng.choice(user_ids),
+                        action=rng.choice(actions),
+                        target_repr="bench",
+                        extra={"bench": True},
+                    )
+                    for _ in range(min(batch_size, n_audit - done))
+                ],
+                batch_size=batch_size,
+            )
+        self.stdout.write(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+    # ---------------------------------------------------------
+    # hot queries (mirror the ones used in views/tasks)
+    # ---------------------------------------------------------
+    def _queries(self, user_ids):
+        start, end = local_day_bounds()
+        now = timezone.now()
+
+        def pick():
+            return random.choice(user_ids)
+
+        return {
+            "today_status": lambda: RemoteAttendance.objects.filter(
+                user_id=pick(), check_out_time__isnull=True, check_in_time__gte=start, check_in_time__lt=end,
+            ).order_by("-check_in_time")[:1],
+            "checkout_open_record": lambda: RemoteAttendance.objects.filter(
+                user_id=pick(), check_out_time__isnull=True,
+            ).order_by("-check_in_time")[:1],
+            "suspicious_frequency": lambda: RemoteAttendance.objects.filter(
+                user_id=pick(), check_in_time__gte=now - timedelta(hours=1),
+            ).values("user_id").annotate(n=Count("id")),
+            "pending_queue": lambda: RemoteAttendance.objects.filter(
+                status="pending",
+            ).order_by("-check_in_time")[:50],
+            "daily_report": lambda: RemoteAttendance.objects.filter(
+                check_in_time__gte=start, check_in_time__lt=end,
+            ).values("status").annotate(n=Count("id")),
+            "audit_recent": lambda: AuditLog.objects.order_by("-timestamp")[:100],
+            "audit_by_action": lambda: AuditLog.objects.filter(action="attendance_checkin").order_by("-timestamp")[:100],
+            "anomaly_list": lambda: AttendanceAnomaly.objects.order_by("-detected_at")[:100],
+        }
+
+    def _measure(self, label, user_ids, repeat):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cur:
+                cur.execute("ANALYZE")
+
+        results = {}
+        for name, build in self._queries(user_ids).items():
+            timings = []
+            for _ in range(repeat):
+                qs = build()
+                t0 = time.perf_counter()
+                list(qs)
+                timings.append((time.perf_counter() - t0) * 1000.0)
+            plan = build().explain(analyze=True) if connection.vendor == "postgresql" else build().explain()
+            results[name] = {
+                "p50_ms": round(float(np.percentile(timings, 50)), 3),
+                "p95_ms": round(float(np.percentile(timings, 95)), 3),
+                "max_ms": round(max(timings), 3),
+                "plan": plan,
+            }
+            self.stdout.write(f"[{label}] {name:<22} p50={results[name]['p50_ms']:>9.3f}ms "
+                              f"p95={results[name]['p95_ms']:>9.3f}ms")
+        return results
+
+    def _set_indexes(self, present):
+        with connection.schema_editor() as editor:
+            for model in INDEXED_MODELS:
+                for index in model._meta.indexes:
+                    if present:
+                        editor.add_index(model, index)
+                    else:
+                        editor.remove_index(model, index)
+
+    def _purge(self):
+        """
+        Raw DELETEs for the bulk-inserted rows: an ORM cascade would load
+        every one of them and fire the post_delete rollup / today_status
+        receivers for rows those never counted.
+        """
+        attendance = RemoteAttendance.objects.filter(user__username__startswith=BENCH_PREFIX)
+        deleted = 0
+        for queryset in (
+            AttendanceAnomaly.objects.filter(attendance__in=attendance),
+            attendance,
+            AuditLog.objects.filter(target_repr="bench"),
+        ):
+            deleted += queryset._raw_delete(queryset.db)
+        users, _ = User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+        return deleted + users
+
+    def handle(self, *args, **options):
+        if options["purge"]:
+            self.stdout.write(self.style.SUCCESS(f"Purged {self._purge()} synthetic rows"))
+            return
+
+        if options["seed"]:
+            self.stdout.write(self.style.WARNING("Seeding synthetic data - do not run against production."))
+            self._seed(options["users"], options["rows"], options["audit_rows"] or options["rows"],
+                       options["batch_size"])
+
+        user_ids = list(User.objects.values_list("id", flat=True)[:10_000])
+        if not user_ids:
+            raise CommandError("No users found; run with --seed first.")
+
+        report = {
+            "vendor": connection.vendor,
+            "attendance_rows": RemoteAttendance.objects.count(),
+            "audit_rows": AuditLog.objects.count(),
+            "runs": {},
+        }
+
+        if options["compare"]:
+            self._set_indexes(False)
+            try:
+                report["runs"]["before"] = self._measure("before", user_ids, options["repeat"])
+            finally:
+                self._set_indexes(True)
+        report["runs"]["after"] = self._measure("after", user_ids, options["repeat"])
+
+        with open(options["output"], "w") as fh:
+            json.dump(report, fh, indent=2, default=str)
+        self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
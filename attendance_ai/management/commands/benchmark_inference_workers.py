@@ -0,0 +1,130 @@
+# attendance_ai/management/commands/benchmark_inference_workers.py
+import gc
+import os
+import json
+import time
+import multiprocessing
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from attendance_ai.services.face_recognition import (
+    FaceRecognitionService,
+    get_face_analyzer,
+    warm_up_face_models,
+)
+
+# inherited by the forked children
+_IMAGE = None
+
+
+def _memory_kb():
+    """
+    (RSS, PSS) of the current process in kB. PSS splits shared pages
+    between the processes mapping them, so it shows what a child really costs.
+    """
+    rss = pss = 0
+    with open("/proc/self/status") as fh:
+        for line in fh:
+            if line.startswith("VmRSS:"):
+                rss = int(line.split()[1])
+    try:
+        with open("/proc/self/smaps_rollup") as fh:
+            for line in fh:
+                if line.startswith("Pss:"):
+                    pss = int(line.split()[1])
+    except FileNotFoundError:
+        pass
+    return rss, pss
+
+
+def _child_init(preloaded):
+    if not preloaded:
+        get_face_analyzer(intra_op_threads=1)
+
+
+def _infer(_):
+    analyzer = get_face_analyzer(intra_op_threads=1)
+    analyzer.get(_IMAGE)
+    return (os.getpid(), *_memory_kb())
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark face inference in 1/2/4/8 forked children (like a prefork Celery worker): "
+        "tasks/sec and RSS/PSS per child, with or without models preloaded in the parent."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--children", default="1,2,4,8", help="Comma-separated child counts.")
+        parser.add_argument("--tasks", type=int, default=200, help="Inferences per run.")
+        parser.add_argument("--image", help="Probe image (default: first known_faces image).")
+        parser.add_argument("--no-preload", action="store_true",
+                            help="Let every child load its own models (the naive prefork baseline).")
+        parser.add_argument("--output", default="bench_inference.json")
+
+    def handle(self, *args, **options):
+        global _IMAGE
+        if not hasattr(os, "fork"):
+            raise CommandError("Needs fork() (Linux / macOS), like Celery's prefork pool.")
+
+        path = options["image"] or self._default_image()
+        if not path:
+            raise CommandError("Pass --image; no known_faces image found.")
+        _IMAGE = FaceRecognitionService._load_image(path)
+
+        preload = not options["no_preload"]
+        if preload:
+            warm_up_face_models(intra_op_threads=1)
+        connections.close_all()
+        gc.freeze()
+        parent_rss, parent_pss = _memory_kb()
+
+        results = []
+        ctx = multiprocessing.get_context("fork")
+        for n in [int(c) for c in options["children"].split(",") if c.strip()]:
+            with ctx.Pool(n, initializer=_child_init, initargs=(preload,)) as pool:
+                pool.map(_infer, range(n * 2), chunksize=1)  # warm every child
+                started = time.perf_counter()
+                samples = pool.map(_infer, range(options["tasks"]), chunksize=1)
+                elapsed = time.perf_counter() - started
+
+            per_child = {}
+            for pid, rss, pss in samples:
+                per_child[pid] = (rss, pss)
+            rss_avg = sum(r for r, _ in per_child.values()) / len(per_child) / 1024
+            pss_avg = sum(p for _, p in per_child.values()) / len(per_child) / 1024
+            row = {
+                "children": n,
+                "tasks": options["tasks"],
+                "seconds": round(elapsed, 3),
+                "tasks_per_sec": round(options["tasks"] / elapsed, 2),
+                "rss_mb_per_child": round(rss_avg, 1),
+                "pss_mb_per_child": round(pss_avg, 1),
+            }
+            results.append(row)
+            self.stdout.write(
+                f"{n:>3} children: {row['tasks_per_sec']:>8.2f} tasks/s   "
+                f"RSS {row['rss_mb_per_child']:>7.1f} MB/child   PSS {row['pss_mb_per_child']:>7.1f} MB/child"
+            )
+
+        report = {
+            "preloaded": preload,
+            "image": path,
+            "cpu_count": os.cpu_count(),
+            "parent_rss_mb": round(parent_rss / 1024, 1),
+            "parent_pss_mb": round(parent_pss / 1024, 1),
+            "runs": results,
+        }
+        with open(options["output"], "w") as fh:
+            json.dump(report, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    @staticmethod
+    def _default_image():
+        root = os.path.join(settings.BASE_DIR, "attendance_ai", "known_faces")
+        for folder, _, files in sorted(os.walk(root)):
+            for name in sorted(files):
+                if name.lower().endswith((".jpg", ".jpeg", ".png")):
+                    return os.path.join(folder, name)
+        return None
@@ -0,0 +1,54 @@
+# attendance_ai/management/commands/celery_queue_stats.py
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from config.celery import app
+from attendance_ai.utils.queue_metrics import latency_summary
+
+
+class Command(BaseCommand):
+    help = "Show Celery queue depths and queue wait (enqueue -> start) per queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--minutes", type=int, default=15, help="Latency window (default 15).")
+        parser.add_argument("--workers", action="store_true", help="Also list active/reserved tasks per worker.")
+        parser.add_argument("--json", action="store_true", help="Print JSON instead of a table.")
+
+    def handle(self, *args, **options):
+        queues = [q.name for q in settings.CELERY_TASK_QUEUES]
+        rows = []
+        with app.connection_for_read() as conn:
+            channel = conn.default_channel
+            for name in queues:
+                try:
+                    depth = channel.queue_declare(queue=name, passive=True).message_count
+                except Exception:
+                    # not declared yet: nothing has been routed there
+                    depth = 0
+                    channel = conn.channel()
+                rows.append({"queue": name, "depth": depth, **latency_summary(name, options["minutes"])})
+
+        report = {"minutes": options["minutes"], "queues": rows}
+        if options["workers"]:
+            inspect = app.control.inspect(timeout=2.0)
+            report["workers"] = {
+                worker: {"active": len(active), "reserved": len((inspect_reserved or {}).get(worker, []))}
+                for inspect_reserved in [inspect.reserved()]
+                for worker, active in (inspect.active() or {}).items()
+            }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"{'queue':<10} {'depth':>7} {'started':>8} {'avg wait':>10} {'p50':>6} {'p95':>6}"
+                          f"   (last {options['minutes']} min)")
+        for r in rows:
+            avg = f"{r['avg_ms']:.0f}ms" if r["avg_ms"] is not None else "-"
+            self.stdout.write(
+                f"{r['queue']:<10} {r['depth']:>7} {r['count']:>8} {avg:>10} "
+                f"{'<=' + r['p50_s'] + 's' if r['p50_s'] else '-':>6} {'<=' + r['p95_s'] + 's' if r['p95_s'] else '-':>6}"
+            )
+        for worker, stats in report.get("workers", {}).items():
+            self.stdout.write(f"  {worker}: {stats['active']} active, {stats['reserved']} reserved")
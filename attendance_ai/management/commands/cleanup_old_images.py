@@ -1,31 +1,204 @@
 # attendance_ai/management/commands/cleanup_old_images.py
-from django.core.management.base import BaseCommand
-from django.conf import settings
 import os
+import re
+import time
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from itertools import chain, islice
+from django.core.management.base import BaseCommand
+from django.conf import settings
+
+from attendance_ai.models import FaceProfile, RemoteAttendance
+from attendance_ai.services.derivatives import media_path
+
+AGE_BUCKETS = (30, 60, 90, 180, 365)  # report edges, in days
+SUBMIT_BATCH = 5000                   # paths handed to the pool at a time
+SHARD_NAME = re.compile(r"^(\d{4})-?(\d{2})-?(\d{2})$")  # uploads/2025-03-14/ or uploads/20250314/
+
+
+class RateLimiter:
+    """
+    Spreads operations to at most `rate` per second across all workers
+    (0 = unlimited).
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def _bucket_label(age_days):
+    lower = 0
+    for edge in AGE_BUCKETS:
+        if age_days < edge:
+            return f"{lower}-{edge}d"
+        lower = edge
+    return f"{AGE_BUCKETS[-1]}d+"
+
+
+def _shard_date(name):
+    match = SHARD_NAME.match(name)
+    if not match:
+        return None
+    try:
+        return datetime(*map(int, match.groups()))
+    except ValueError:
+        return None
+
 
 class Command(BaseCommand):
     help = "Remove verification/uploaded images older than N days (default 30)"
 
     def add_arguments(self, parser):
         parser.add_argument("--days", type=int, default=30, help="Remove files older than DAYS")
+        parser.add_argument("--folder", default="uploads", help="Folder under MEDIA_ROOT (default uploads).")
+        parser.add_argument("--workers", type=int, default=8, help="Parallel unlink workers.")
+        parser.add_argument("--max-rate", type=float, default=0,
+                            help="Max deletions per second across all workers (0 = unlimited).")
+        parser.add_argument("--shards", action="store_true",
+                            help="Delete whole date-named subdirectories (YYYY-MM-DD / YYYYMMDD) older than DAYS.")
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be removed.")
 
     def handle(self, *args, **options):
         days = options["days"]
         cutoff = datetime.now() - timedelta(days=days)
-        folder = os.path.join(settings.MEDIA_ROOT, "uploads")
-        removed = 0
+        folder = os.path.join(settings.MEDIA_ROOT, options["folder"])
         if not os.path.exists(folder):
             self.stdout.write(self.style.WARNING("Uploads folder not found: %s" % folder))
             return
-        for fname in os.listdir(folder):
-            path = os.path.join(folder, fname)
-            if os.path.isfile(path):
-                mtime = datetime.fromtimestamp(os.path.getmtime(path))
-                if mtime < cutoff:
-                    try:
-                        os.remove(path)
-                        removed += 1
-                    except Exception as e:
-                        self.stdout.write(self.style.ERROR(f"Failed to remove {path}: {e}"))
-        self.stdout.write(self.style.SUCCESS(f"Removed {removed} files older than {days} days"))
+
+        self.dry_run = options["dry_run"]
+        self.limiter = RateLimiter(options["max_rate"])
+        self.stats = {"scanned": 0, "aged": 0, "referenced": 0, "deleted": 0, "errors": 0, "bytes": 0, "shards": 0}
+        self.buckets = {}
+        self.removed_shards = set()
+        self.referenced = self._referenced_paths()
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            if options["shards"]:
+                self._remove_shards(folder, cutoff)
+            candidates = self._aged_files(folder, cutoff.timestamp())
+            while True:
+                batch = list(islice(candidates, SUBMIT_BATCH))
+                if not batch:
+                    break
+                for ok, size in pool.map(self._unlink, batch):
+                    self.stats["deleted" if ok else "errors"] += 1
+                    self.stats["bytes"] += size if ok else 0
+
+        self._report(days, time.monotonic() - started)
+
+    # -----------------------------------------------------
+    def _referenced_paths(self):
+        """
+        Images that must survive: live images of pending reviews and
+        enrollment images (needed for re-embedding).
+        """
+        urls = RemoteAttendance.objects.filter(
+            status="pending", verification_image_url__isnull=False
+        ).values_list("verification_image_url", flat=True).iterator(chunk_size=5000)
+        profile_urls = FaceProfile.objects.exclude(image_url__isnull=True).exclude(image_url="") \
+            .values_list("image_url", flat=True).iterator(chunk_size=5000)
+
+        referenced = set()
+        for url in chain(urls, profile_urls):
+            if url:
+                referenced.add(os.path.normpath(media_path(url)))
+        return referenced
+
+    def _aged_files(self, folder, cutoff_ts):
+        """
+        Walk with os.scandir (DirEntry caches its stat result) and yield
+        unreferenced files older than the cutoff.
+        """
+        now = time.time()
+        stack = [folder]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.path not in self.removed_shards:
+                                stack.append(entry.path)
+                            continue
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        self.stats["scanned"] += 1
+                        st = entry.stat(follow_symlinks=False)
+                        if st.st_mtime >= cutoff_ts:
+                            continue
+                        if os.path.normpath(entry.path) in self.referenced:
+                            self.stats["referenced"] += 1
+                            continue
+                        self.stats["aged"] += 1
+                        label = _bucket_label((now - st.st_mtime) / 86400)
+                        self.buckets[label] = self.buckets.get(label, 0) + 1
+                        yield entry.path, st.st_size
+            except OSError as e:
+                self.stdout.write(self.style.ERROR(f"Failed to scan: {e}"))
+
+    def _unlink(self, item):
+        path, size = item
+        if self.dry_run:
+            return True, size
+        self.limiter.wait()
+        try:
+            os.remove(path)
+            return True, size
+        except FileNotFoundError:
+            return True, 0
+        except OSError as e:
+            self.stdout.write(self.style.ERROR(f"Failed to remove {path}: {e}"))
+            return False, 0
+
+    def _remove_shards(self, folder, cutoff):
+        """
+        Date-named subdirectories whose whole day is past the cutoff go in
+        one rmtree, unless a referenced image lives inside.
+        """
+        pinned = {os.path.relpath(p, folder).split(os.sep)[0] for p in self.referenced if p.startswith(folder + os.sep)}
+
+        with os.scandir(folder) as it:
+            shards = [e for e in it if e.is_dir(follow_symlinks=False)]
+        for entry in shards:
+            day = _shard_date(entry.name)
+            if day is None or day + timedelta(days=1) > cutoff or entry.name in pinned:
+                continue
+            self.limiter.wait()
+            if self.dry_run:
+                self.stdout.write(f"Would remove shard {entry.path}")
+            else:
+                shutil.rmtree(entry.path, ignore_errors=True)
+            self.removed_shards.add(entry.path)
+            self.stats["shards"] += 1
+
+    def _report(self, days, elapsed):
+        s = self.stats
+        rate = s["deleted"] / elapsed if elapsed else 0
+        mb = s["bytes"] / (1024 * 1024)
+        verb = "Would remove" if self.dry_run else "Removed"
+
+        for label in sorted(self.buckets, key=lambda l: int(l.split("-")[0].rstrip("d+"))):
+            self.stdout.write(f"  {label:>10}: {self.buckets[label]} files")
+        self.stdout.write(
+            f"Scanned {s['scanned']} files, {s['aged']} aged, {s['referenced']} kept (referenced), "
+            f"{s['errors']} errors, {s['shards']} shards"
+        )
+        self.stdout.write(f"{elapsed:.1f}s, {rate:.0f} files/s, {mb / elapsed if elapsed else 0:.1f} MB/s")
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {s['deleted']} files ({mb:.1f} MB) older than {days} days"
+        ))
@@ -0,0 +1,41 @@
+# attendance_ai/management/commands/generate_image_derivatives.py
+import os
+from django.core.management.base import BaseCommand
+from attendance_ai.models import FaceProfile, RemoteAttendance
+from attendance_ai.services.derivatives import media_path
+from attendance_ai.tasks import generate_image_derivatives
+
+
+class Command(BaseCommand):
+    help = "Queue thumbnail/face-crop generation for images that do not have derivatives yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pending-only", action="store_true",
+                            help="Only attendance rows waiting for review (plus all profiles).")
+        parser.add_argument("--sync", action="store_true", help="Run in-process instead of queueing on Celery.")
+
+    def handle(self, *args, **options):
+        run = generate_image_derivatives if options["sync"] else generate_image_derivatives.delay
+
+        attendance = RemoteAttendance.objects.filter(
+            verification_image_url__isnull=False,
+            thumbnail_url__isnull=True,
+        )
+        if options["pending_only"]:
+            attendance = attendance.filter(status="pending")
+
+        queued = 0
+        for pk, url in attendance.values_list("id", "verification_image_url").iterator():
+            path = media_path(url)
+            if os.path.exists(path):
+                run(path, attendance_id=pk)
+                queued += 1
+
+        profiles = FaceProfile.objects.filter(image_url__isnull=False, thumbnail_url__isnull=True)
+        for pk, url in profiles.values_list("id", "image_url").iterator():
+            path = media_path(url)
+            if os.path.exists(path):
+                run(path, profile_id=pk)
+                queued += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Queued derivatives for {queued} images"))
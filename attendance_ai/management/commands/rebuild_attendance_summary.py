@@ -0,0 +1,49 @@
+# attendance_ai/management/commands/rebuild_attendance_summary.py
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from attendance_ai.models import RemoteAttendance
+from attendance_ai.services import rollup
+
+
+class Command(BaseCommand):
+    help = "Backfill / rebuild the DailyAttendanceSummary rollup from RemoteAttendance."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="date_from", help="First local date (YYYY-MM-DD).")
+        parser.add_argument("--to", dest="date_to", help="Last local date (YYYY-MM-DD), default today.")
+        parser.add_argument("--days", type=int, help="Rebuild the last N days instead of --from.")
+        parser.add_argument("--all", action="store_true", help="Rebuild from the first recorded check-in.")
+        parser.add_argument("--chunk-days", type=int, default=31, help="Days per rebuild transaction.")
+
+    def handle(self, *args, **options):
+        date_to = parse_date(options["date_to"]) if options["date_to"] else timezone.localdate()
+
+        if options["all"]:
+            first = RemoteAttendance.objects.filter(check_in_time__isnull=False).order_by("check_in_time").first()
+            if first is None:
+                self.stdout.write(self.style.WARNING("No attendance recorded."))
+                return
+            date_from = timezone.localdate(first.check_in_time)
+        elif options["days"]:
+            date_from = date_to - timedelta(days=options["days"] - 1)
+        elif options["date_from"]:
+            date_from = parse_date(options["date_from"])
+        else:
+            raise CommandError("Pass --from, --days or --all.")
+
+        if date_from is None or date_to is None or date_from > date_to:
+            raise CommandError("Invalid date range.")
+
+        total = 0
+        day = date_from
+        while day <= date_to:
+            chunk_end = min(day + timedelta(days=options["chunk_days"] - 1), date_to)
+            written = rollup.rebuild(day, chunk_end)
+            total += written
+            self.stdout.write(f"  {day} .. {chunk_end}: {written} buckets")
+            day = chunk_end + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} summary rows for {date_from} .. {date_to}"))
@@ -0,0 +1,84 @@
+# attendance_ai/management/commands/reembed_gallery.py
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance_ai.models import EmbeddingVersion, FaceProfile
+from attendance_ai.services import reembed
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-embed every FaceProfile with another InsightFace model pack into a new "
+        "EmbeddingVersion (resumable), then optionally make it the live gallery."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("version", nargs="?", help="New encoding_version name, e.g. antelopev2_v1.")
+        parser.add_argument("--model-pack", help="InsightFace model pack (required when creating the version).")
+        parser.add_argument("--workers", type=int, help="Processes (default: CPU count). One model per process.")
+        parser.add_argument("--chunk-size", type=int, help="Profiles per chunk / checkpoint.")
+        parser.add_argument("--celery", action="store_true", help="Fan chunks out to Celery workers instead.")
+        parser.add_argument("--retry-missing", action="store_true",
+                            help="Ignore the checkpoint and retry every profile still missing.")
+        parser.add_argument("--activate", action="store_true", help="Flip the live gallery to this version.")
+        parser.add_argument("--allow-missing", action="store_true",
+                            help="With --activate: disable matching for profiles that could not be re-embedded.")
+        parser.add_argument("--status", action="store_true", help="List versions and progress, then exit.")
+
+    def handle(self, *args, **options):
+        if options["status"] or not options["version"]:
+            for v in EmbeddingVersion.objects.order_by("-created_at"):
+                missing = reembed.missing_profiles(v).count()
+                self.stdout.write(
+                    f"{v.name:<20} {v.model_pack:<14} {v.status:<9} "
+                    f"processed {v.processed}/{v.total}, failed {v.failed}, missing {missing}"
+                )
+            return
+
+        try:
+            version = reembed.get_version(options["version"], options["model_pack"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if version.status == "active" and not options["activate"]:
+            raise CommandError(f"{version.name} is already the active version.")
+
+        if options["retry_missing"]:
+            reembed.reset_checkpoint(version)
+            version.refresh_from_db()
+
+        if options["celery"]:
+            self._enqueue(version, options["chunk_size"] or reembed.REEMBED_CHUNK_SIZE)
+            return
+
+        if version.status != "active":
+            self.stdout.write(f"Re-embedding into {version.name} with {version.model_pack} ...")
+            totals = reembed.run(
+                version,
+                workers=options["workers"],
+                chunk_size=options["chunk_size"],
+                progress=lambda v: self.stdout.write(
+                    f"  {v.processed}/{v.total} processed, {v.failed} failed (checkpoint id {v.last_profile_id})"
+                ),
+            )
+            self.stdout.write(self.style.SUCCESS(f"Embedded {totals['embedded']}, failed {totals['failed']}"))
+
+        if options["activate"]:
+            try:
+                result = reembed.activate(version, allow_missing=options["allow_missing"])
+            except ValueError as e:
+                raise CommandError(f"{e}. Run again with --retry-missing, or pass --allow-missing.")
+            self.stdout.write(self.style.SUCCESS(
+                f"{version.name} is now active for {result['profiles']} profiles "
+                f"({result['missing']} without an embedding)"
+            ))
+
+    def _enqueue(self, version, chunk_size):
+        from attendance_ai.tasks import reembed_profiles
+
+        EmbeddingVersion.objects.filter(id=version.id).update(total=FaceProfile.objects.count())
+        ids = list(reembed.missing_profiles(version).values_list("id", flat=True))
+        for start in range(0, len(ids), chunk_size):
+            reembed_profiles.delay(version.id, ids[start:start + chunk_size])
+        self.stdout.write(self.style.SUCCESS(
+            f"Queued {len(ids)} profiles in {-(-len(ids) // chunk_size)} chunks; "
+            f"follow with --status, then --activate."
+        ))
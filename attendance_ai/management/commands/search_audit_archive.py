@@ -0,0 +1,51 @@
+# attendance_ai/management/commands/search_audit_archive.py
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_date
+
+from attendance_ai.services import audit_archive
+
+
+class Command(BaseCommand):
+    help = "Search archived (gzipped JSONL) audit log entries without re-importing them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="date_from", help="First local date (YYYY-MM-DD).")
+        parser.add_argument("--to", dest="date_to", help="Last local date (YYYY-MM-DD).")
+        parser.add_argument("--action", help="Exact action name, e.g. attendance_checkin.")
+        parser.add_argument("--actor", help="Actor user id or username.")
+        parser.add_argument("--contains", help="Case-insensitive text in target_repr or extra.")
+        parser.add_argument("--limit", type=int, default=100, help="Stop after N matches (0 = no limit).")
+        parser.add_argument("--json", action="store_true", help="Print raw JSON lines.")
+        parser.add_argument("--dir", dest="archive_dir", help="Archive directory (default AUDIT_ARCHIVE_DIR).")
+
+    def handle(self, *args, **options):
+        date_from = parse_date(options["date_from"]) if options["date_from"] else None
+        date_to = parse_date(options["date_to"]) if options["date_to"] else None
+        if (options["date_from"] and date_from is None) or (options["date_to"] and date_to is None):
+            raise CommandError("Dates must be YYYY-MM-DD.")
+
+        matches = audit_archive.search_archive(
+            date_from=date_from,
+            date_to=date_to,
+            action=options["action"],
+            actor=options["actor"],
+            contains=options["contains"],
+            archive_dir=options["archive_dir"],
+        )
+
+        found = 0
+        for entry in matches:
+            if options["json"]:
+                self.stdout.write(json.dumps(entry, cls=DjangoJSONEncoder))
+            else:
+                self.stdout.write(
+                    f"{entry['timestamp']:%Y-%m-%d %H:%M:%S}  {entry['action']:<28} "
+                    f"{entry['actor__username'] or '-':<16} {entry['target_repr']}"
+                )
+            found += 1
+            if options["limit"] and found >= options["limit"]:
+                break
+
+        self.stderr.write(f"{found} matching entries")
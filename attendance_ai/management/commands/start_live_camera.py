@@ -4,6 +4,7 @@ import time
 from attendance_ai.services.live_camera import LiveAttendanceEngine, start_camera_realtime
 from attendance_ai.models import FaceProfile, RemoteAttendance  # adjust names if different
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -68,7 +69,7 @@ class Command(BaseCommand):
             # Simple approach: always create a "check-in" record with status 'verified'
             a = RemoteAttendance.objects.create(
                 user=user,
-                check_in_time=time.strftime("%Y-%m-%d %H:%M:%S"),
+                check_in_time=timezone.now(),
                 status="verified",
                 confidence_score=conf
             )
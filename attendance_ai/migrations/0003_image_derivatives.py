@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_ai', '0002_registereduser_is_remote_worker'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='faceprofile',
+            name='image_url',
+            field=models.URLField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='faceprofile',
+            name='thumbnail_url',
+            field=models.URLField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='faceprofile',
+            name='face_crop_url',
+            field=models.URLField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='remoteattendance',
+            name='thumbnail_url',
+            field=models.URLField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='remoteattendance',
+            name='face_crop_url',
+            field=models.URLField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY: no write lock on large tables
+    atomic = False
+
+    dependencies = [
+        ('attendance_ai', '0003_image_derivatives'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='remoteattendance',
+            index=models.Index(fields=['user', '-check_in_time'], name='ra_user_checkin_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='remoteattendance',
+            index=models.Index(condition=models.Q(('check_out_time__isnull', True)), fields=['user', '-check_in_time'], name='ra_user_open_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='remoteattendance',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['-check_in_time'], name='ra_pending_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='remoteattendance',
+            index=models.Index(fields=['check_in_time', 'status'], name='ra_checkin_status_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='attendanceanomaly',
+            index=models.Index(fields=['-detected_at'], name='anomaly_detected_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='auditlog',
+            index=models.Index(fields=['-timestamp'], name='audit_ts_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='auditlog',
+            index=models.Index(fields=['action', '-timestamp'], name='audit_action_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance_ai', '0004_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('department', models.CharField(blank=True, default='', max_length=128)),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('first_check_in', models.DateTimeField(blank=True, null=True)),
+                ('last_check_out', models.DateTimeField(blank=True, null=True)),
+                ('confidence_sum', models.FloatField(default=0.0)),
+                ('confidence_count', models.IntegerField(default=0)),
+                ('confidence_min', models.FloatField(blank=True, null=True)),
+                ('confidence_max', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['department', 'date'], name='daily_summary_dept_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'department', 'status'), name='daily_summary_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY: no write lock on large tables
+    atomic = False
+
+    dependencies = [
+        ('attendance_ai', '0006_auditlog_timestamp_default'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='remoteattendance',
+            index=models.Index(condition=models.Q(('verification_image_url__isnull', False)), fields=['check_in_time'], name='ra_image_expiry_idx'),
+        ),
+    ]
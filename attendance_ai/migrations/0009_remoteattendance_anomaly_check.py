@@ -0,0 +1,23 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY: no write lock on large tables
+    atomic = False
+
+    dependencies = [
+        ('attendance_ai', '0008_embeddingversion_faceembedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='remoteattendance',
+            name='anomaly_check',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+        AddIndexConcurrently(
+            model_name='remoteattendance',
+            index=models.Index(condition=models.Q(('anomaly_check', 'pending')), fields=['id'], name='ra_anomaly_pending_idx'),
+        ),
+    ]
@@ -1,7 +1,9 @@
 #attendance_ai/models.py
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
+from django.utils import timezone
 from .utils.crypto import encrypt_array, decrypt_array
 
 
@@ -31,6 +33,11 @@ class FaceProfile(models.Model):
     face_encoding = models.JSONField(null=True, blank=True)
     encoding_version = models.CharField(max_length=20, default="v1")
 
+    # registration photo + derivatives generated in the background
+    image_url = models.URLField(null=True, blank=True)
+    thumbnail_url = models.URLField(null=True, blank=True)
+    face_crop_url = models.URLField(null=True, blank=True)
+
     consent_given = models.BooleanField(default=False)
     consent_date = models.DateTimeField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
@@ -55,6 +62,74 @@ class FaceProfile(models.Model):
     encoding = property(get_encoding, set_encoding)
 
 
+# ---------------------------------------------------------
+# EMBEDDING VERSIONS (model upgrades / re-embedding)
+# ---------------------------------------------------------
+class EmbeddingVersion(models.Model):
+    """
+    One InsightFace model pack's gallery. Built by services/reembed.py
+    alongside the active one; FaceProfile.face_encoding always holds the
+    active version's embedding.
+    """
+    STATUS_CHOICES = [
+        ("building", "Building"),
+        ("active", "Active"),
+        ("retired", "Retired"),
+    ]
+
+    name = models.CharField(max_length=20, unique=True)  # matches FaceProfile.encoding_version
+    model_pack = models.CharField(max_length=64)         # e.g. buffalo_l, antelopev2
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="building")
+
+    # progress / resume checkpoint
+    total = models.IntegerField(default=0)
+    processed = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    last_profile_id = models.BigIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    activated_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.model_pack}, {self.status})"
+
+
+class FaceEmbedding(models.Model):
+    """
+    A profile's embedding under one EmbeddingVersion (encrypted like
+    FaceProfile.face_encoding).
+    """
+    profile = models.ForeignKey(FaceProfile, on_delete=models.CASCADE, related_name="embeddings")
+    version = models.ForeignKey(EmbeddingVersion, on_delete=models.CASCADE, related_name="embeddings")
+    encoding = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["profile", "version"], name="face_embedding_unique"),
+        ]
+
+
+# ---------------------------------------------------------
+# KIOSK DEVICES (device -> gallery shard)
+# ---------------------------------------------------------
+class KioskDevice(models.Model):
+    """
+    Registry of check-in kiosks. A check-in whose device_info carries a
+    registered device_id is first matched against the shard's gallery only.
+    """
+    device_id = models.CharField(max_length=128, unique=True)
+    label = models.CharField(max_length=128, blank=True)
+    # a RegisteredUser.department (site / office) value
+    shard = models.CharField(max_length=128)
+    is_active = models.BooleanField(default=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.label or self.device_id} -> {self.shard}"
+
+
 # ---------------------------------------------------------
 # ATTENDANCE RECORD
 # ---------------------------------------------------------
@@ -74,6 +149,8 @@ class RemoteAttendance(models.Model):
     geolocation = models.JSONField(null=True, blank=True)
     device_info = models.JSONField(null=True, blank=True)
     verification_image_url = models.URLField(null=True, blank=True)
+    thumbnail_url = models.URLField(null=True, blank=True)
+    face_crop_url = models.URLField(null=True, blank=True)
 
     reviewed_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -86,6 +163,79 @@ class RemoteAttendance(models.Model):
     review_notes = models.TextField(null=True, blank=True)
     reviewed_at = models.DateTimeField(null=True, blank=True)
 
+    # anomaly engine state: "" never queued, "pending" waiting for the next
+    # micro-batch, "done" analysed (never queued again)
+    anomaly_check = models.CharField(max_length=10, blank=True, default="")
+
+    class Meta:
+        indexes = [
+            # history, today_status and the 1h frequency count: user + time range
+            models.Index(fields=["user", "-check_in_time"], name="ra_user_checkin_idx"),
+            # checkout / today_status: only the user's open check-ins
+            models.Index(
+                fields=["user", "-check_in_time"],
+                name="ra_user_open_idx",
+                condition=Q(check_out_time__isnull=True),
+            ),
+            # admin review queue
+            models.Index(
+                fields=["-check_in_time"],
+                name="ra_pending_idx",
+                condition=Q(status="pending"),
+            ),
+            # daily reports: one day of rows, grouped by status
+            models.Index(fields=["check_in_time", "status"], name="ra_checkin_status_idx"),
+            # nightly image cleanup: only rows whose image has not been removed yet
+            models.Index(
+                fields=["check_in_time"],
+                name="ra_image_expiry_idx",
+                condition=Q(verification_image_url__isnull=False),
+            ),
+            # anomaly engine: the small set of rows waiting for a micro-batch
+            models.Index(
+                fields=["id"],
+                name="ra_anomaly_pending_idx",
+                condition=Q(anomaly_check="pending"),
+            ),
+        ]
+
+
+# ---------------------------------------------------------
+# DAILY ROLLUP (date x department x status)
+# ---------------------------------------------------------
+class DailyAttendanceSummary(models.Model):
+    """
+    Maintained incrementally by services/rollup.py; rebuild with
+    `manage.py rebuild_attendance_summary`.
+    confidence_min/max only widen on insert and are made exact by a rebuild.
+    """
+    date = models.DateField()
+    department = models.CharField(max_length=128, blank=True, default="")
+    status = models.CharField(max_length=20)
+
+    count = models.IntegerField(default=0)
+    first_check_in = models.DateTimeField(null=True, blank=True)
+    last_check_out = models.DateTimeField(null=True, blank=True)
+
+    confidence_sum = models.FloatField(default=0.0)
+    confidence_count = models.IntegerField(default=0)
+    confidence_min = models.FloatField(null=True, blank=True)
+    confidence_max = models.FloatField(null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["date", "department", "status"], name="daily_summary_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["department", "date"], name="daily_summary_dept_idx"),
+        ]
+
+    @property
+    def confidence_avg(self):
+        return self.confidence_sum / self.confidence_count if self.confidence_count else None
+
 
 # ---------------------------------------------------------
 # ATTENDANCE ANOMALY
@@ -99,6 +249,40 @@ class AttendanceAnomaly(models.Model):
     detected_at = models.DateTimeField(auto_now_add=True)
     resolved = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["-detected_at"], name="anomaly_detected_idx"),
+        ]
+
+
+# ---------------------------------------------------------
+# NOTIFICATION OUTBOX (anomaly alerts, sent as digests)
+# ---------------------------------------------------------
+class NotificationEvent(models.Model):
+    recipient = models.EmailField()
+    severity = models.CharField(max_length=10)
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)     # failed sends so far
+    failed_at = models.DateTimeField(null=True, blank=True)    # gave up after NOTIFY_MAX_ATTEMPTS
+    claimed_until = models.DateTimeField(null=True, blank=True)  # lease held by a running flush
+
+    class Meta:
+        indexes = [
+            # digest flush: only the rows still to send
+            models.Index(
+                fields=["recipient", "id"],
+                name="notify_unsent_idx",
+                condition=Q(sent_at__isnull=True, failed_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient}: {self.subject}"
+
 
 # ---------------------------------------------------------
 # AUDIT LOG
@@ -116,10 +300,15 @@ class AuditLog(models.Model):
     extra = models.JSONField(null=True, blank=True)
 
     ip_address = models.CharField(max_length=45, null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # default (not auto_now_add) so buffered entries keep their event time
+    timestamp = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            models.Index(fields=["-timestamp"], name="audit_ts_idx"),
+            models.Index(fields=["action", "-timestamp"], name="audit_action_ts_idx"),
+        ]
 
 
 
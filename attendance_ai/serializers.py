@@ -40,6 +40,8 @@ class AttendanceCheckinSerializer(serializers.Serializer):
     image = serializers.ImageField(required=True)
     geolocation = serializers.JSONField(required=False)
     device_info = serializers.JSONField(required=False)
+    # set by kiosk badge readers -> 1:1 verification instead of 1:N search
+    employee_id = serializers.CharField(required=False, allow_blank=True)
 
 class AttendanceRecordSerializer(serializers.ModelSerializer):
     class Meta:
@@ -78,14 +80,15 @@ class PendingReviewSerializer(serializers.ModelSerializer):
         ]
 
     def get_registered_image_url(self, obj):
+        # expects .select_related("user__face_profile") on the queryset
         try:
-            face = FaceProfile.objects.get(user=obj.user)
-            return face.image.url if hasattr(face, "image") and face.image else None
+            face = obj.user.face_profile
         except FaceProfile.DoesNotExist:
             return None
+        return face.face_crop_url or face.thumbnail_url or face.image_url
 
     def get_live_image_url(self, obj):
-        return obj.verification_image_url
+        return obj.thumbnail_url or obj.verification_image_url
 
 
 
@@ -0,0 +1,132 @@
+# attendance_ai/services/anomaly_engine.py
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from attendance_ai.models import AttendanceAnomaly, RemoteAttendance
+from attendance_ai.services import checkin_window
+
+BATCH_SIZE = getattr(settings, "ANOMALY_BATCH_SIZE", 500)       # ids per pass / bulk_create
+FLUSH_SECONDS = getattr(settings, "ANOMALY_FLUSH_SECONDS", 5)   # longest a queued id waits
+DRAIN_SCHEDULED_KEY = "anomaly:drain_scheduled"
+QUEUED_COUNT_KEY = "anomaly:queued_count"
+
+LOW_CONFIDENCE = 0.50
+MAX_RECENT_CHECKINS = 5  # per checkin_window.WINDOW_SECONDS
+
+# code -> (description, severity)
+RULES = {
+    "low_confidence": ("Very low face match confidence", "high"),
+    "missing_geolocation": ("No geolocation provided", "medium"),
+    "suspicious_frequency": ("Too many check-ins within 1 hour", "high"),
+}
+
+
+def queue(attendance) -> bool:
+    """
+    Mark an attendance for the next micro-batch; the caller saves it.
+    anomaly_check is the dedup key: rows already analysed (task retries,
+    re-verification) are not queued again.
+    """
+    if attendance.anomaly_check == "done":
+        return False
+    attendance.anomaly_check = "pending"
+    return True
+
+
+def schedule_drain():
+    """
+    Coalesce drains: at most one delayed drain per FLUSH_SECONDS, or an
+    immediate one once BATCH_SIZE ids have queued up since the last drain.
+    Call after the queued row is committed.
+    """
+    from attendance_ai.tasks import detect_anomalies_batch
+
+    cache.add(QUEUED_COUNT_KEY, 0, FLUSH_SECONDS * 10)
+    try:
+        queued = cache.incr(QUEUED_COUNT_KEY)
+    except ValueError:
+        cache.set(QUEUED_COUNT_KEY, 1, FLUSH_SECONDS * 10)
+        queued = 1
+
+    if queued >= BATCH_SIZE:
+        cache.delete(QUEUED_COUNT_KEY)
+        detect_anomalies_batch.delay()
+    elif cache.add(DRAIN_SCHEDULED_KEY, True, FLUSH_SECONDS):
+        detect_anomalies_batch.apply_async(countdown=FLUSH_SECONDS)
+
+
+def evaluate(confidence, has_geolocation, recent) -> dict:
+    """
+    All rules over whole batches at once: {code: boolean mask}.
+    confidence is float with NaN for missing scores.
+    """
+    return {
+        # 0 / missing means "not scored", not "low"
+        "low_confidence": (confidence > 0) & (confidence < LOW_CONFIDENCE),
+        "missing_geolocation": ~has_geolocation,
+        "suspicious_frequency": recent > MAX_RECENT_CHECKINS,
+    }
+
+
+def _has_geolocation(geo) -> bool:
+    geo = geo or {}
+    return geo.get("lat") is not None and geo.get("lng") is not None
+
+
+def _drain_batch(batch_size) -> dict:
+    """
+    One pass: lock up to batch_size pending rows (SKIP LOCKED, so
+    concurrent drains split the work), evaluate, one bulk_create, one
+    UPDATE to mark them done.
+    """
+    with transaction.atomic():
+        rows = list(
+            RemoteAttendance.objects.filter(anomaly_check="pending")
+            .select_for_update(skip_locked=True, of=("self",))
+            .order_by("id")
+            .values_list("id", "user_id", "user__username", "confidence_score", "geolocation")[:batch_size]
+        )
+        if not rows:
+            return {"analysed": 0, "found": []}
+
+        ids, user_ids, usernames, scores, geos = zip(*rows)
+        recent_by_user = checkin_window.recent_checkins_many(user_ids)
+
+        masks = evaluate(
+            np.array([np.nan if s is None else s for s in scores], dtype=np.float64),
+            np.fromiter((_has_geolocation(g) for g in geos), dtype=bool, count=len(rows)),
+            np.array([recent_by_user[uid] for uid in user_ids]),
+        )
+
+        found = [
+            (ids[i], usernames[i], code, RULES[code][1])
+            for code, mask in masks.items()
+            for i in np.flatnonzero(mask)
+        ]
+        AttendanceAnomaly.objects.bulk_create([
+            AttendanceAnomaly(
+                attendance_id=pk, anomaly_type=code, description=RULES[code][0], severity=severity
+            )
+            for pk, _, code, severity in found
+        ])
+        RemoteAttendance.objects.filter(id__in=ids).update(anomaly_check="done")
+
+    return {"analysed": len(rows), "found": found}
+
+
+def drain(batch_size=None) -> dict:
+    """
+    Analyse everything pending, batch_size rows at a time.
+    Returns {"analysed", "found": [(attendance_id, username, code, severity)]}.
+    """
+    batch_size = batch_size or BATCH_SIZE
+    cache.delete(QUEUED_COUNT_KEY)
+    totals = {"analysed": 0, "found": []}
+    while True:
+        done = _drain_batch(batch_size)
+        totals["analysed"] += done["analysed"]
+        totals["found"].extend(done["found"])
+        if done["analysed"] < batch_size:
+            return totals
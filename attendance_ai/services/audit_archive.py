@@ -0,0 +1,123 @@
+# attendance_ai/services/audit_archive.py
+import gzip
+import json
+from datetime import timedelta
+from pathlib import Path
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from attendance_ai.models import AuditLog
+
+AUDIT_RETENTION_DAYS = getattr(settings, "AUDIT_RETENTION_DAYS", 90)
+AUDIT_ARCHIVE_DIR = getattr(settings, "AUDIT_ARCHIVE_DIR", Path(settings.BASE_DIR) / "audit_archive")
+AUDIT_ARCHIVE_CHUNK_SIZE = getattr(settings, "AUDIT_ARCHIVE_CHUNK_SIZE", 5000)  # rows per write + DELETE
+
+ARCHIVE_FIELDS = ("id", "timestamp", "actor_id", "actor__username", "action", "target_repr", "extra", "ip_address")
+
+
+def archive_path(day, archive_dir=None) -> Path:
+    """
+    One file per local day, grouped in monthly folders:
+    <dir>/2025/03/audit-2025-03-14.jsonl.gz
+    """
+    root = Path(archive_dir or AUDIT_ARCHIVE_DIR)
+    return root / f"{day:%Y}" / f"{day:%m}" / f"audit-{day:%Y-%m-%d}.jsonl.gz"
+
+
+def _write_chunk(rows, archive_dir):
+    by_day = {}
+    for row in rows:
+        by_day.setdefault(timezone.localdate(row["timestamp"]), []).append(row)
+
+    for day, day_rows in by_day.items():
+        path = archive_path(day, archive_dir)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # append mode adds a new gzip member; readers see one continuous stream
+        with gzip.open(path, "at", encoding="utf-8") as fh:
+            for row in day_rows:
+                fh.write(json.dumps(row, cls=DjangoJSONEncoder, separators=(",", ":")) + "\n")
+    return by_day.keys()
+
+
+def archive_older_than(days=None, archive_dir=None, chunk_size=None):
+    """
+    Move AuditLog rows older than `days` into compressed JSONL archives,
+    oldest first, deleting each chunk only after it has been written.
+    A crash between write and delete re-archives that chunk on the next
+    run, so archives may hold a row twice (search_archive de-duplicates).
+    Returns {"archived": rows, "days": sorted local dates touched}.
+    """
+    days = AUDIT_RETENTION_DAYS if days is None else days
+    chunk_size = chunk_size or AUDIT_ARCHIVE_CHUNK_SIZE
+    cutoff = timezone.now() - timedelta(days=days)
+
+    archived = 0
+    touched = set()
+    while True:
+        rows = list(
+            AuditLog.objects.filter(timestamp__lt=cutoff)
+            .order_by("timestamp", "id")
+            .values(*ARCHIVE_FIELDS)[:chunk_size]
+        )
+        if not rows:
+            break
+
+        touched.update(_write_chunk(rows, archive_dir))
+        with transaction.atomic():
+            AuditLog.objects.filter(id__in=[r["id"] for r in rows]).delete()
+        archived += len(rows)
+
+    return {"archived": archived, "days": sorted(touched)}
+
+
+def _archive_files(date_from=None, date_to=None, archive_dir=None):
+    root = Path(archive_dir or AUDIT_ARCHIVE_DIR)
+    for path in sorted(root.glob("*/*/audit-*.jsonl.gz")):
+        day = path.name[len("audit-"):-len(".jsonl.gz")]
+        if (date_from and day < date_from.isoformat()) or (date_to and day > date_to.isoformat()):
+            continue
+        yield path
+
+
+def _read_file(path):
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                entry = json.loads(line)
+                entry["timestamp"] = parse_datetime(entry["timestamp"])
+                yield entry
+
+
+def iter_archive(date_from=None, date_to=None, archive_dir=None):
+    """
+    Stream archived entries (dicts, timestamp parsed) for local dates in
+    [date_from, date_to], oldest file first, without loading whole files.
+    """
+    for path in _archive_files(date_from, date_to, archive_dir):
+        yield from _read_file(path)
+
+
+def search_archive(date_from=None, date_to=None, action=None, actor=None, contains=None, archive_dir=None):
+    """
+    Filter iter_archive() entries. actor matches the user id or username;
+    contains is a case-insensitive substring of target_repr / extra.
+    """
+    needle = contains.lower() if contains else None
+    for path in _archive_files(date_from, date_to, archive_dir):
+        # an id can only repeat within its own day's file (day archived twice)
+        seen = set()
+        for entry in _read_file(path):
+            if entry["id"] in seen:
+                continue
+            seen.add(entry["id"])
+
+            if action and entry["action"] != action:
+                continue
+            if actor and str(actor) not in (str(entry["actor_id"]), entry["actor__username"]):
+                continue
+            if needle and needle not in ((entry["target_repr"] or "") + json.dumps(entry["extra"])).lower():
+                continue
+            yield entry
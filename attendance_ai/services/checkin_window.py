@@ -0,0 +1,117 @@
+# attendance_ai/services/checkin_window.py
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from attendance_ai.models import RemoteAttendance
+
+WINDOW_SECONDS = getattr(settings, "CHECKIN_WINDOW_SECONDS", 3600)       # "check-ins in the last hour"
+BUCKET_SECONDS = getattr(settings, "CHECKIN_WINDOW_BUCKET_SECONDS", 300)  # counter granularity
+BUCKET_TTL = WINDOW_SECONDS + BUCKET_SECONDS
+# "counters are authoritative" marker; refreshed on every check-in so only
+# a cache flush / eviction (or a week without check-ins) forces a rebuild.
+# Expired buckets after that are simply windows with no check-ins.
+SEEDED_TTL = getattr(settings, "CHECKIN_WINDOW_SEEDED_SECONDS", 7 * 86400)
+
+
+def _bucket(ts) -> int:
+    return int(ts.timestamp()) // BUCKET_SECONDS
+
+
+def _bucket_key(user_id, bucket) -> str:
+    return f"checkins:{user_id}:{bucket}"
+
+
+def _seeded_key(user_id) -> str:
+    return f"checkins:{user_id}:seeded"
+
+
+def _window_buckets(now):
+    # the oldest bucket straddles the window edge and is counted whole,
+    # so the count may include up to BUCKET_SECONDS of extra history
+    last = _bucket(now)
+    first = _bucket(now - timedelta(seconds=WINDOW_SECONDS))
+    return range(first, last + 1)
+
+
+def rebuild(user_id, now=None) -> int:
+    """
+    Re-seed a user's buckets from RemoteAttendance (one index range scan
+    on ra_user_checkin_idx), e.g. after a cache flush or eviction.
+    Returns the window count.
+    """
+    return rebuild_many([user_id], now)[user_id]
+
+
+def rebuild_many(user_ids, now=None) -> dict:
+    """
+    rebuild() for several users with a single query; {user_id: count}.
+    """
+    now = now or timezone.now()
+    buckets = _window_buckets(now)
+    since = datetime.fromtimestamp(buckets[0] * BUCKET_SECONDS, tz=dt_timezone.utc)
+
+    rows = RemoteAttendance.objects.filter(
+        user_id__in=user_ids, check_in_time__gte=since, check_in_time__lte=now
+    ).values_list("user_id", "check_in_time")
+    counts = Counter((uid, _bucket(ts)) for uid, ts in rows)
+
+    cache.set_many(
+        {_bucket_key(uid, b): counts.get((uid, b), 0) for uid in user_ids for b in buckets}, BUCKET_TTL
+    )
+    cache.set_many({_seeded_key(uid): True for uid in user_ids}, SEEDED_TTL)
+    return {uid: sum(counts.get((uid, b), 0) for b in buckets) for uid in user_ids}
+
+
+def record_checkin(user_id, check_in_time=None):
+    """
+    Count one check-in that is already saved. Called from the check-in
+    path (post_save); an atomic cache INCR when the counters are seeded.
+    """
+    if not cache.get(_seeded_key(user_id)):
+        # the DB already holds this row, so seeding counts it
+        rebuild(user_id)
+        return
+
+    key = _bucket_key(user_id, _bucket(check_in_time or timezone.now()))
+    cache.add(key, 0, BUCKET_TTL)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # evicted between add() and incr()
+        cache.set(key, 1, BUCKET_TTL)
+    cache.touch(_seeded_key(user_id), SEEDED_TTL)
+
+
+def recent_checkins(user_id, now=None) -> int:
+    """
+    Check-ins by user_id in the last WINDOW_SECONDS: one get_many over
+    the window's buckets, falling back to rebuild() if unseeded.
+    """
+    if not cache.get(_seeded_key(user_id)):
+        return rebuild(user_id, now)
+
+    buckets = _window_buckets(now or timezone.now())
+    values = cache.get_many([_bucket_key(user_id, b) for b in buckets])
+    return sum(values.values())
+
+
+def recent_checkins_many(user_ids, now=None) -> dict:
+    """
+    recent_checkins() for a batch of users: one get_many for every
+    user's buckets plus one rebuild_many() query for the unseeded ones.
+    """
+    now = now or timezone.now()
+    user_ids = list(set(user_ids))
+    buckets = _window_buckets(now)
+    seeded = cache.get_many([_seeded_key(uid) for uid in user_ids])
+    cold = [uid for uid in user_ids if _seeded_key(uid) not in seeded]
+    warm = [uid for uid in user_ids if _seeded_key(uid) in seeded]
+
+    values = cache.get_many([_bucket_key(uid, b) for uid in warm for b in buckets])
+    counts = {uid: sum(values.get(_bucket_key(uid, b), 0) for b in buckets) for uid in warm}
+    if cold:
+        counts.update(rebuild_many(cold, now))
+    return counts
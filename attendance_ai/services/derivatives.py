@@ -0,0 +1,80 @@
+# attendance_ai/services/derivatives.py
+import os
+from typing import Optional, Sequence
+from django.conf import settings
+from PIL import Image, ImageOps, features
+
+from attendance_ai.services.face_recognition import FaceRecognitionService
+
+THUMBNAIL_MAX_SIDE = 320
+THUMBNAIL_QUALITY = 70
+FACE_CROP_SIZE = 160
+FACE_CROP_MARGIN = 0.25   # extra context around the detected bbox
+FACE_CROP_QUALITY = 80
+DERIVATIVES_DIR = "derivatives"
+
+
+def media_path(url: str) -> str:
+    """
+    /media/uploads/abc.jpg -> <MEDIA_ROOT>/uploads/abc.jpg
+    """
+    return os.path.join(str(settings.MEDIA_ROOT), url[len(settings.MEDIA_URL):].lstrip("/"))
+
+
+def media_url(relative_path: str) -> str:
+    return f"{settings.MEDIA_URL}{relative_path}"
+
+
+def _thumbnail_ext() -> str:
+    return "webp" if features.check("webp") else "jpg"
+
+
+def _save(img: Image.Image, relative_path: str, quality: int) -> str:
+    path = os.path.join(str(settings.MEDIA_ROOT), relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if relative_path.endswith(".webp"):
+        img.save(path, "WEBP", quality=quality, method=4)
+    else:
+        img.save(path, "JPEG", quality=quality, optimize=True)
+    return media_url(relative_path)
+
+
+def _crop_box(bbox: Sequence[float], width: int, height: int):
+    x1, y1, x2, y2 = bbox
+    # square crop centred on the face, with a margin
+    side = max(x2 - x1, y2 - y1) * (1.0 + 2 * FACE_CROP_MARGIN)
+    cx, cy = (x1 + x2) / 2.0, (y1 + y2) / 2.0
+    left = max(0, int(cx - side / 2))
+    top = max(0, int(cy - side / 2))
+    right = min(width, int(cx + side / 2))
+    bottom = min(height, int(cy + side / 2))
+    return left, top, right, bottom
+
+
+def generate_derivatives(image_path: str, bbox: Optional[Sequence[float]] = None) -> dict:
+    """
+    Write a small thumbnail and a tight face crop next to MEDIA_ROOT/derivatives/.
+    bbox ([x1, y1, x2, y2] in original pixels) is reused from the check-in
+    detection when available; otherwise the face is detected here.
+    Returns {"thumbnail_url", "face_crop_url"} (face_crop_url None if no face).
+    """
+    base = os.path.splitext(os.path.basename(image_path))[0]
+
+    with Image.open(image_path) as src:
+        img = src.convert("RGB")
+
+    thumb = img.copy()
+    thumb.thumbnail((THUMBNAIL_MAX_SIDE, THUMBNAIL_MAX_SIDE), Image.LANCZOS)
+    thumbnail_url = _save(thumb, f"{DERIVATIVES_DIR}/{base}_thumb.{_thumbnail_ext()}", THUMBNAIL_QUALITY)
+
+    if bbox is None:
+        faces = FaceRecognitionService.detect_faces(img)
+        bbox = faces[0]["bbox"] if faces else None
+
+    face_crop_url = None
+    if bbox is not None:
+        crop = img.crop(_crop_box(bbox, img.width, img.height))
+        crop = ImageOps.fit(crop, (FACE_CROP_SIZE, FACE_CROP_SIZE), Image.LANCZOS)
+        face_crop_url = _save(crop, f"{DERIVATIVES_DIR}/{base}_face.jpg", FACE_CROP_QUALITY)
+
+    return {"thumbnail_url": thumbnail_url, "face_crop_url": face_crop_url}
@@ -1,26 +1,167 @@
 # attendance_ai/services/face_recognition.py
 import os
+import time
 from typing import List, Optional, Tuple
 import numpy as np
 import cv2
 from PIL import Image
 from insightface import app
+from insightface.app.common import Face
+from django.conf import settings
+from django.core.cache import cache
 from attendance_ai.utils.crypto import decrypt_array
+from attendance_ai.utils.timing import stage
 
-# Singleton analyzer
-_FACE_ANALYZER = None
+# One analyzer per model pack (per process)
+_FACE_ANALYZERS = {}
 
-def get_face_analyzer(det_size: Tuple[int,int]=(640,640)):
+DEFAULT_MODEL_PACK = getattr(settings, "FACE_MODEL_PACK", "buffalo_l")
+DEFAULT_ENCODING_VERSION = getattr(settings, "FACE_ENCODING_VERSION", "insightface_v1")
+ACTIVE_MODEL_CACHE_KEY = "face:active_model"
+ACTIVE_MODEL_TTL = 30  # seconds a process trusts its last lookup
+_active_model = {"value": None, "expires": 0.0}
+
+
+def active_model() -> Tuple[str, str]:
+    """
+    (encoding_version, model_pack) the gallery is currently built with.
+    Process memo -> cache -> active EmbeddingVersion -> settings defaults,
+    so a version flip reaches every worker within ACTIVE_MODEL_TTL.
+    """
+    now = time.monotonic()
+    if _active_model["value"] and _active_model["expires"] > now:
+        return _active_model["value"]
+
+    value = cache.get(ACTIVE_MODEL_CACHE_KEY)
+    if value is None:
+        from attendance_ai.models import EmbeddingVersion
+        row = EmbeddingVersion.objects.filter(status="active").values_list("name", "model_pack").first()
+        value = tuple(row) if row else (DEFAULT_ENCODING_VERSION, DEFAULT_MODEL_PACK)
+        cache.set(ACTIVE_MODEL_CACHE_KEY, value, None)
+
+    _active_model["value"] = tuple(value)
+    _active_model["expires"] = now + ACTIVE_MODEL_TTL
+    return _active_model["value"]
+
+
+def _session_options(intra_op_threads: Optional[int] = None):
     """
-    Lazily initialize InsightFace FaceAnalysis (CPU).
+    onnxruntime threads per process. With several inference processes per
+    host (prefork children, re-embedding pools) set
+    FACE_ORT_INTRA_OP_THREADS so children x threads <= cores; 0 keeps the
+    onnxruntime default (one thread per core).
     """
-    global _FACE_ANALYZER
-    if _FACE_ANALYZER is None:
-        # allowed_modules: detection + recognition
-        _FACE_ANALYZER = app.FaceAnalysis(allowed_modules=['detection', 'recognition'])
+    import onnxruntime
+    opts = onnxruntime.SessionOptions()
+    if intra_op_threads is None:
+        intra_op_threads = int(getattr(settings, "FACE_ORT_INTRA_OP_THREADS", 0))
+    opts.intra_op_num_threads = intra_op_threads
+    opts.inter_op_num_threads = 1
+    opts.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    return opts
+
+
+def warm_up_face_models(model_pack: Optional[str] = None, intra_op_threads: Optional[int] = None):
+    """
+    Load the analyzer and run one inference so lazy allocations happen
+    now; used by the Celery parent before it forks its children.
+    """
+    analyzer = get_face_analyzer(model_pack=model_pack, intra_op_threads=intra_op_threads)
+    blank = np.zeros((640, 640, 3), dtype=np.uint8)
+    analyzer.get(blank)
+    if "recognition" in analyzer.models:
+        rec = analyzer.models["recognition"]
+        rec.get_feat(np.zeros((rec.input_size[1], rec.input_size[0], 3), dtype=np.uint8))
+    return analyzer
+
+
+def forget_active_model():
+    _active_model["value"] = None
+
+
+def get_face_analyzer(det_size: Tuple[int,int]=(640,640), model_pack: Optional[str] = None,
+                      intra_op_threads: Optional[int] = None):
+    """
+    Lazily initialize InsightFace FaceAnalysis (CPU) for model_pack
+    (default: the active version's pack).
+    """
+    model_pack = model_pack or active_model()[1]
+    analyzer = _FACE_ANALYZERS.get(model_pack)
+    if analyzer is None:
+        # allowed_modules: detection + recognition; extra kwargs reach onnxruntime.InferenceSession
+        analyzer = app.FaceAnalysis(
+            name=model_pack,
+            allowed_modules=['detection', 'recognition'],
+            providers=["CPUExecutionProvider"],
+            sess_options=_session_options(intra_op_threads),
+        )
         # ctx_id = -1 forces CPU; use ctx_id=0 for GPU if you have CUDA + onnxruntime-gpu
-        _FACE_ANALYZER.prepare(ctx_id=-1, det_size=det_size)
-    return _FACE_ANALYZER
+        analyzer.prepare(ctx_id=-1, det_size=det_size)
+        _FACE_ANALYZERS[model_pack] = analyzer
+    return analyzer
+
+
+def init_embedding_worker(model_pack: str):
+    """
+    ProcessPoolExecutor initializer for re-embedding: one model per process,
+    one ONNX thread per process so N workers use N cores.
+    """
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    get_face_analyzer(model_pack=model_pack, intra_op_threads=1)
+
+
+def embed_enrollment_images(items, model_pack: str):
+    """
+    items: [(profile_id, image_path)]. Runs in a pool worker and touches
+    no database. Returns [(profile_id, embedding list or None, error or None)],
+    using the most confident face in each image.
+    """
+    analyzer = get_face_analyzer(model_pack=model_pack)
+    results = []
+    for profile_id, path in items:
+        if not path or not os.path.exists(path):
+            results.append((profile_id, None, "image_missing"))
+            continue
+        try:
+            faces = analyzer.get(FaceRecognitionService._load_image(path))
+        except Exception as exc:
+            results.append((profile_id, None, f"decode_failed: {exc}"))
+            continue
+        if not faces:
+            results.append((profile_id, None, "no_face_detected"))
+            continue
+        face = max(faces, key=lambda f: float(getattr(f, "det_score", 0.0)))
+        emb = np.array(face.embedding, dtype=np.float32)
+        norm = np.linalg.norm(emb)
+        results.append((profile_id, (emb / norm if norm > 0 else emb).tolist(), None))
+    return results
+
+def embed_image_paths(paths, model_pack: str, face_ref_size: int = 112):
+    """
+    Pool worker for batch enrollment: decodes each image here, so only
+    paths and embeddings cross the process boundary. Returns
+    (results, unreadable paths) with one (embedding list, quality) per
+    image with a face, where quality = det_score scaled down for faces
+    smaller than face_ref_size px.
+    """
+    analyzer = get_face_analyzer(model_pack=model_pack)
+    results, unreadable = [], []
+    for path in paths:
+        img = cv2.imread(path)
+        if img is None:
+            unreadable.append(path)
+            continue
+        faces = analyzer.get(img)
+        if not faces:
+            continue
+        face = max(faces, key=lambda f: float(getattr(f, "det_score", 0.0)))
+        x1, y1, x2, y2 = face.bbox
+        size = min(x2 - x1, y2 - y1)
+        quality = float(getattr(face, "det_score", 0.0)) * min(1.0, size / face_ref_size)
+        emb = np.array(face.embedding, dtype=np.float32)
+        norm = np.linalg.norm(emb)
+        results.append(((emb / norm if norm > 0 else emb).tolist(), quality))
+    return results, unreadable
 
 def load_face_encoding_field(field):
     import numpy as np
@@ -38,6 +179,26 @@ def load_face_encoding_field(field):
     return None
 
 
+# Defaults for the pre-inference quality gate. Override any of them with
+# settings.FACE_QUALITY_THRESHOLDS = {...}.
+DEFAULT_QUALITY_THRESHOLDS = {
+    "min_blur_variance": 60.0,     # variance of Laplacian on the downscaled gray image
+    "min_brightness": 40.0,        # mean gray level (0-255)
+    "max_brightness": 220.0,
+    "max_dark_fraction": 0.60,     # share of pixels <= 16
+    "max_bright_fraction": 0.40,   # share of pixels >= 240
+    "min_face_size": 80,           # px, shorter side of the detected bbox
+    "min_det_score": 0.50,
+    "analysis_max_side": 512,      # image is downscaled to this for blur/exposure
+}
+
+
+def get_quality_thresholds() -> dict:
+    thresholds = dict(DEFAULT_QUALITY_THRESHOLDS)
+    thresholds.update(getattr(settings, "FACE_QUALITY_THRESHOLDS", None) or {})
+    return thresholds
+
+
 
 class FaceRecognitionService:
     """
@@ -102,9 +263,11 @@ class FaceRecognitionService:
         Extract normalized embedding from image (filepath or RGB numpy array).
         Returns None if no face detected.
         """
-        img = FaceRecognitionService._load_image(image_input)
+        with stage("decode"):
+            img = FaceRecognitionService._load_image(image_input)
         analyzer = get_face_analyzer()
-        faces = analyzer.get(img)
+        with stage("detect_embed"):
+            faces = analyzer.get(img)
         if not faces:
             return None
         f = faces[face_index]
@@ -114,6 +277,104 @@ class FaceRecognitionService:
             emb = emb / norm
         return emb
 
+    @staticmethod
+    def assess_image_quality(img: np.ndarray, thresholds: Optional[dict] = None) -> dict:
+        """
+        Cheap image-level checks (blur + exposure) on an RGB array, run
+        before any model is touched.
+        Returns {"passed", "reasons": [{code, message, value, threshold}], "metrics", "thresholds"}.
+        """
+        t = thresholds or get_quality_thresholds()
+        gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+        h, w = gray.shape[:2]
+        scale = float(t["analysis_max_side"]) / max(h, w)
+        if scale < 1.0:
+            gray = cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+        blur_variance = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+        total = float(hist.sum()) or 1.0
+        brightness = float(np.dot(hist, np.arange(256)) / total)
+        dark_fraction = float(hist[:17].sum() / total)
+        bright_fraction = float(hist[240:].sum() / total)
+
+        reasons = []
+        if blur_variance < t["min_blur_variance"]:
+            reasons.append({"code": "too_blurry", "message": "Image is too blurry",
+                            "value": blur_variance, "threshold": t["min_blur_variance"]})
+        if brightness < t["min_brightness"] or dark_fraction > t["max_dark_fraction"]:
+            reasons.append({"code": "underexposed", "message": "Image is too dark",
+                            "value": brightness, "threshold": t["min_brightness"]})
+        if brightness > t["max_brightness"] or bright_fraction > t["max_bright_fraction"]:
+            reasons.append({"code": "overexposed", "message": "Image is too bright",
+                            "value": brightness, "threshold": t["max_brightness"]})
+
+        return {
+            "passed": not reasons,
+            "reasons": reasons,
+            "metrics": {
+                "blur_variance": blur_variance,
+                "brightness": brightness,
+                "dark_fraction": dark_fraction,
+                "bright_fraction": bright_fraction,
+                "image_size": [int(w), int(h)],
+            },
+            "thresholds": t,
+        }
+
+    @staticmethod
+    def extract_face_encoding_checked(image_input, face_index: int = 0) -> Tuple[Optional[np.ndarray], dict]:
+        """
+        Staged version of extract_face_encoding():
+          1. blur/exposure gate on the raw image (no model)
+          2. detection only, then minimum face size / det score gate
+          3. recognition model on the selected face only
+        Returns (embedding or None, quality report). The embedding is None
+        whenever report["passed"] is False.
+        """
+        with stage("decode"):
+            img = FaceRecognitionService._load_image(image_input)
+        thresholds = get_quality_thresholds()
+        with stage("quality"):
+            report = FaceRecognitionService.assess_image_quality(img, thresholds)
+        if not report["passed"]:
+            return None, report
+
+        analyzer = get_face_analyzer()
+        with stage("detect"):
+            bboxes, kpss = analyzer.det_model.detect(img, max_num=0, metric="default")
+        if bboxes is None or len(bboxes) <= face_index:
+            report["passed"] = False
+            report["reasons"].append({"code": "no_face_detected", "message": "No face detected",
+                                      "value": 0, "threshold": 1})
+            return None, report
+
+        bbox = bboxes[face_index, 0:4]
+        det_score = float(bboxes[face_index, 4])
+        face_size = float(min(bbox[2] - bbox[0], bbox[3] - bbox[1]))
+        report["metrics"].update({
+            "faces": int(len(bboxes)),
+            "bbox": [int(v) for v in bbox],
+            "face_size": face_size,
+            "det_score": det_score,
+        })
+        if face_size < thresholds["min_face_size"]:
+            report["reasons"].append({"code": "face_too_small", "message": "Face is too small or too far away",
+                                      "value": face_size, "threshold": thresholds["min_face_size"]})
+        if det_score < thresholds["min_det_score"]:
+            report["reasons"].append({"code": "low_detection_score", "message": "Face not clearly visible",
+                                      "value": det_score, "threshold": thresholds["min_det_score"]})
+        if report["reasons"]:
+            report["passed"] = False
+            return None, report
+
+        face = Face(bbox=bbox, kps=kpss[face_index] if kpss is not None else None, det_score=det_score)
+        with stage("embed"):
+            analyzer.models["recognition"].get(img, face)
+        emb = np.array(face.embedding, dtype=np.float32)
+        norm = np.linalg.norm(emb)
+        return (emb / norm if norm > 0 else emb), report
+
     @staticmethod
     def extract_from_array_bgr(frame_bgr: np.ndarray, face_index: int = 0) -> Optional[np.ndarray]:
         """
@@ -0,0 +1,334 @@
+# attendance_ai/services/gallery.py
+import random
+from typing import List, Optional, Tuple
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Min
+
+from attendance_ai.models import FaceProfile, KioskDevice
+from attendance_ai.services.face_recognition import load_face_encoding_field
+from attendance_ai.services.gallery_index import GalleryIndex
+from attendance_ai.utils.timing import stage
+
+# 1:N identification
+MATCH_THRESHOLD = 0.65         # Face belongs to a user
+AUTO_APPROVE_THRESHOLD = 0.80  # Auto verified (no admin)
+
+# 1:1 verification (identity claimed via JWT or badge employee_id)
+VERIFY_MATCH_THRESHOLD = getattr(settings, "FACE_VERIFY_MATCH_THRESHOLD", 0.62)
+VERIFY_AUTO_APPROVE_THRESHOLD = getattr(settings, "FACE_VERIFY_AUTO_APPROVE_THRESHOLD", 0.78)
+VERIFY_COHORT_SIZE = getattr(settings, "FACE_VERIFY_COHORT_SIZE", 20)      # 0 disables the cohort check
+VERIFY_COHORT_MARGIN = getattr(settings, "FACE_VERIFY_COHORT_MARGIN", 0.03)
+COHORT_CACHE_KEY = "gallery:cohort"
+COHORT_CACHE_SECONDS = 600
+COHORT_SAMPLE_ROUNDS = 3     # random-id lookups before falling back to a contiguous id slice
+COHORT_OVERSAMPLE = 3        # ids drawn per missing row (gaps, inactive profiles)
+
+# optional compressed first pass for 1:N search (see gallery_index.py)
+COARSE_SEARCH = getattr(settings, "FACE_COARSE_SEARCH", False)
+COARSE_DIMS = getattr(settings, "FACE_COARSE_DIMS", 128)           # PCA dims, 0 = keep all
+COARSE_DTYPE = getattr(settings, "FACE_COARSE_DTYPE", "float16")   # float32 / float16 / int8
+COARSE_TOP_K = getattr(settings, "FACE_COARSE_TOP_K", 32)          # candidates re-ranked exactly
+COARSE_MIN_GALLERY = getattr(settings, "FACE_COARSE_MIN_GALLERY", 5000)  # smaller: plain exact scan
+GENERATION_CACHE_KEY = "gallery:generation"  # bumped when every index is stale
+
+# shards: one index per department, picked from the kiosk's KioskDevice row
+SHARDING = getattr(settings, "FACE_GALLERY_SHARDING", True)
+GLOBAL_SHARD = "*"
+DEVICE_CACHE_SECONDS = 3600
+
+# this process's indexes: {shard: (generation, index)}
+_INDEXES = {}
+
+
+def _to_matrix(encodings: List[np.ndarray]) -> np.ndarray:
+    mat = np.vstack(encodings).astype(np.float32)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    return mat / np.maximum(norms, 1e-10)
+
+
+def _scores(matrix: np.ndarray, embedding: np.ndarray) -> np.ndarray:
+    """
+    Vectorized FaceRecognitionService.calculate_confidence over a gallery matrix.
+    """
+    probe = embedding / (np.linalg.norm(embedding) + 1e-10)
+    return (matrix @ probe + 1.0) / 2.0
+
+
+def _decode_rows(rows) -> Tuple[List[int], List[np.ndarray]]:
+    user_ids, encodings = [], []
+    for user_id, field in rows:
+        emb = load_face_encoding_field(field)
+        if emb is None or emb.size == 0:
+            continue
+        user_ids.append(user_id)
+        encodings.append(emb)
+    return user_ids, encodings
+
+
+def _generation_key(shard) -> str:
+    return f"gallery:generation:{shard}"
+
+
+def _bump(key):
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def invalidate(departments=None):
+    """
+    Enrollment changed: drop the cohort sample and bump generations so
+    processes rebuild their in-memory indexes on the next search. With
+    departments only those shards (and the global index) are rebuilt,
+    otherwise every index is.
+    """
+    cache.delete(COHORT_CACHE_KEY)
+    if departments is None:
+        _bump(GENERATION_CACHE_KEY)
+        return
+    for shard in {GLOBAL_SHARD, *(d for d in departments if d)}:
+        _bump(_generation_key(shard))
+
+
+def _load_gallery(shard=GLOBAL_SHARD) -> Tuple[List[int], List[np.ndarray]]:
+    rows = (
+        FaceProfile.objects
+        .filter(is_active=True)
+        .exclude(face_encoding__isnull=True)
+    )
+    if shard != GLOBAL_SHARD:
+        rows = rows.filter(user__department=shard)
+    return _decode_rows(rows.values_list("user_id", "face_encoding"))
+
+
+def get_index(shard=GLOBAL_SHARD) -> Optional[GalleryIndex]:
+    """
+    In-memory index of the whole gallery or one department, rebuilt when
+    its generation moves on; compressed when FACE_COARSE_SEARCH is on.
+    None for an empty gallery / shard.
+    """
+    keys = [GENERATION_CACHE_KEY, _generation_key(shard)]
+    values = cache.get_many(keys)
+    generation = tuple(values.get(k, 0) for k in keys)
+
+    cached = _INDEXES.get(shard)
+    if cached is None or cached[0] != generation:
+        user_ids, encodings = _load_gallery(shard)
+        index = None
+        if encodings:
+            dims, dtype = (COARSE_DIMS, COARSE_DTYPE) if COARSE_SEARCH else (0, "float32")
+            index = GalleryIndex(user_ids, _to_matrix(encodings), dims=dims, dtype=dtype)
+        cached = _INDEXES[shard] = (generation, index)
+    return cached[1]
+
+
+def _search(index: GalleryIndex, embedding: np.ndarray) -> Tuple[Optional[int], float]:
+    # small galleries: exact scan of the in-memory float32 rows
+    top_k = COARSE_TOP_K if COARSE_SEARCH and len(index) >= COARSE_MIN_GALLERY else len(index)
+    return index.search(embedding, top_k)
+
+
+def _kiosk(device_info) -> Optional[list]:
+    """
+    [shard] for an active registered kiosk in device_info["device_id"],
+    None otherwise. Cached per device ([] marks an unknown one).
+    """
+    if not isinstance(device_info, dict) or not device_info.get("device_id"):
+        return None
+    key = f"gallery:kiosk:{device_info['device_id']}"
+    kiosk = cache.get(key)
+    if kiosk is None:
+        kiosk = list(KioskDevice.objects.filter(
+            device_id=str(device_info["device_id"]), is_active=True
+        ).values_list("shard", flat=True)[:1])
+        cache.set(key, kiosk, DEVICE_CACHE_SECONDS)
+    return kiosk or None
+
+
+def is_registered_kiosk(device_info) -> bool:
+    return _kiosk(device_info) is not None
+
+
+def shard_for_device(device_info) -> Optional[str]:
+    """
+    Department served by the kiosk in device_info["device_id"], or None
+    (unregistered device, sharding off).
+    """
+    if not SHARDING:
+        return None
+    kiosk = _kiosk(device_info)
+    return (kiosk[0] or None) if kiosk else None
+
+
+def forget_device(device_id):
+    cache.delete(f"gallery:kiosk:{device_id}")
+
+
+def identify(embedding: np.ndarray) -> Tuple[Optional[int], float]:
+    """
+    1:N search over every active profile.
+    Returns (best user_id or None, best score; -1.0 for an empty gallery).
+    """
+    if COARSE_SEARCH:
+        with stage("gallery_load"):
+            index = get_index()
+        if index is None:
+            return None, -1.0
+        with stage("match"):
+            return _search(index, embedding)
+
+    with stage("gallery_load"):
+        user_ids, encodings = _load_gallery()
+        if not encodings:
+            return None, -1.0
+        matrix = _to_matrix(encodings)
+
+    with stage("match"):
+        scores = _scores(matrix, embedding)
+        best = int(np.argmax(scores))
+    return user_ids[best], float(scores[best])
+
+
+def identify_in_shard(embedding: np.ndarray, shard: Optional[str]) -> Tuple[Optional[int], float, str]:
+    """
+    Search the device's shard first and fall back to identify() when the
+    shard is empty or its best score is below MATCH_THRESHOLD.
+    Returns (user_id or None, score, scope) with scope the shard or "global".
+    """
+    if shard:
+        with stage("gallery_load"):
+            index = get_index(shard)
+        if index is not None:
+            with stage("match_shard"):
+                user_id, score = _search(index, embedding)
+            if score >= MATCH_THRESHOLD:
+                return user_id, score, shard
+
+    user_id, score = identify(embedding)
+    return user_id, score, "global"
+
+
+def load_user_templates(user_id: int) -> List[np.ndarray]:
+    rows = (
+        FaceProfile.objects
+        .filter(user_id=user_id, is_active=True)
+        .exclude(face_encoding__isnull=True)
+        .values_list("user_id", "face_encoding")
+    )
+    return _decode_rows(rows)[1]
+
+
+def _random_profile_rows(count: int) -> list:
+    """
+    About `count` random (user_id, face_encoding) rows of active profiles,
+    without ORDER BY RANDOM() over the whole table: draw random ids within
+    [min id, max id] and fetch them by primary key; if gaps leave it short,
+    top up with the rows following a random id.
+    """
+    profiles = FaceProfile.objects.filter(is_active=True).exclude(face_encoding__isnull=True)
+    bounds = profiles.aggregate(lo=Min("id"), hi=Max("id"))
+    if bounds["lo"] is None:
+        return []
+    id_range = range(bounds["lo"], bounds["hi"] + 1)
+
+    rows = {}
+    for _ in range(COHORT_SAMPLE_ROUNDS):
+        missing = count - len(rows)
+        if missing <= 0:
+            break
+        ids = random.sample(id_range, min(missing * COHORT_OVERSAMPLE, len(id_range)))
+        for pk, user_id, encoding in profiles.filter(id__in=ids).values_list("id", "user_id", "face_encoding"):
+            rows[pk] = (user_id, encoding)
+
+    if len(rows) < count:
+        start = random.choice(id_range)
+        rest = profiles.exclude(id__in=list(rows)).order_by("id").values_list("id", "user_id", "face_encoding")
+        for part in (rest.filter(id__gte=start), rest.filter(id__lt=start)):
+            for pk, user_id, encoding in part[: count - len(rows)]:
+                rows[pk] = (user_id, encoding)
+            if len(rows) >= count:
+                break
+    return list(rows.values())[:count]
+
+
+def sample_cohort(exclude_user_id: int, size: int = VERIFY_COHORT_SIZE) -> Optional[np.ndarray]:
+    """
+    Small random sample of other users' templates, cached so verification
+    never touches the full gallery.
+    """
+    if size <= 0:
+        return None
+
+    cohort = cache.get(COHORT_CACHE_KEY)
+    if cohort is None:
+        user_ids, encodings = _decode_rows(_random_profile_rows(size + 1))
+        cohort = [(uid, emb.tolist()) for uid, emb in zip(user_ids, encodings)]
+        cache.set(COHORT_CACHE_KEY, cohort, COHORT_CACHE_SECONDS)
+
+    encodings = [np.array(emb, dtype=np.float32) for uid, emb in cohort if uid != exclude_user_id][:size]
+    if not encodings:
+        return None
+    return _to_matrix(encodings)
+
+
+def match_threshold(strict: bool = False) -> float:
+    # strict: the identity claim is not trusted, so never looser than 1:N
+    return max(VERIFY_MATCH_THRESHOLD, MATCH_THRESHOLD) if strict else VERIFY_MATCH_THRESHOLD
+
+
+def auto_approve_threshold(strict: bool = False) -> float:
+    return max(VERIFY_AUTO_APPROVE_THRESHOLD, AUTO_APPROVE_THRESHOLD) if strict else VERIFY_AUTO_APPROVE_THRESHOLD
+
+
+def verify(embedding: np.ndarray, user_id: int, cohort_size: int = VERIFY_COHORT_SIZE, strict: bool = False) -> dict:
+    """
+    1:1 comparison against the claimed user's template(s), optionally
+    followed by an "is this face closer to someone else?" cohort check.
+    strict=True applies the 1:N thresholds (untrusted claims, re-checks
+    of identified check-ins).
+    Returns {"matched", "score", "cohort_best", "cohort_conflict", "reason"}.
+    """
+    result = {"matched": False, "score": -1.0, "cohort_best": None, "cohort_conflict": False, "reason": None}
+
+    with stage("gallery_load"):
+        templates = load_user_templates(user_id)
+    if not templates:
+        result["reason"] = "profile_missing"
+        return result
+
+    with stage("match"):
+        score = float(np.max(_scores(_to_matrix(templates), embedding)))
+    result["score"] = score
+    if score < match_threshold(strict):
+        result["reason"] = "below_threshold"
+        return result
+
+    with stage("cohort_load"):
+        cohort = sample_cohort(user_id, cohort_size)
+    if cohort is not None:
+        cohort_best = float(np.max(_scores(cohort, embedding)))
+        result["cohort_best"] = cohort_best
+        if cohort_best >= score:
+            result["reason"] = "closer_to_other_user"
+            return result
+        result["cohort_conflict"] = cohort_best >= score - VERIFY_COHORT_MARGIN
+
+    result["matched"] = True
+    return result
+
+
+def decide(result: dict, strict: bool = False) -> str:
+    """
+    Check-in status for a verify() result: "verified" only above the
+    auto-approve threshold with no cohort conflict, else "pending";
+    "unverified" when it did not match.
+    """
+    if not result["matched"]:
+        return "unverified"
+    if result["score"] >= auto_approve_threshold(strict) and not result["cohort_conflict"]:
+        return "verified"
+    return "pending"
@@ -0,0 +1,115 @@
+# attendance_ai/services/gallery_index.py
+from typing import Optional, Sequence, Tuple
+import numpy as np
+
+COARSE_DTYPES = ("float32", "float16", "int8")
+SCAN_BLOCK_ROWS = 8192  # coarse rows upcast per BLAS call; keeps the float32 copy cache-sized
+
+
+def fit_pca(matrix: np.ndarray, dims: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (mean, components D x dims) of the enrolled embeddings, via the
+    D x D covariance so the cost is O(N * D^2) however large N is.
+    """
+    mean = matrix.mean(axis=0)
+    centered = matrix - mean
+    cov = centered.T @ centered
+    eigvals, eigvecs = np.linalg.eigh(cov)  # ascending
+    components = eigvecs[:, np.argsort(eigvals)[::-1][:dims]]
+    return mean.astype(np.float32), np.ascontiguousarray(components, dtype=np.float32)
+
+
+class GalleryIndex:
+    """
+    Two-stage 1:N search over L2-normalized embeddings:
+    1. coarse scan over a compressed copy (optional PCA projection,
+       float16 / int8 storage) to pick top_k candidates;
+    2. exact cosine re-rank of those candidates against the full
+       float32 rows.
+    With dims=0 and dtype="float32" the coarse pass is the exact scan.
+    """
+
+    def __init__(self, user_ids: Sequence[int], matrix: np.ndarray, dims: int = 0, dtype: str = "float32"):
+        if dtype not in COARSE_DTYPES:
+            raise ValueError(f"dtype must be one of {COARSE_DTYPES}")
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.full = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.dims = dims if 0 < dims < self.full.shape[1] and len(self.full) > dims else 0
+        self.dtype = dtype
+
+        coarse = self.full
+        self.mean = self.components = None
+        if self.dims:
+            self.mean, self.components = fit_pca(self.full, self.dims)
+            coarse = (self.full - self.mean) @ self.components
+
+        self.scales = None
+        if dtype == "int8":
+            # symmetric per-row scale
+            self.scales = np.maximum(np.abs(coarse).max(axis=1), 1e-10).astype(np.float32) / 127.0
+            coarse = np.round(coarse / self.scales[:, None]).astype(np.int8)
+        elif dtype == "float16":
+            coarse = coarse.astype(np.float16)
+        self.coarse = np.ascontiguousarray(coarse)
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @property
+    def coarse_nbytes(self) -> int:
+        extra = (self.scales.nbytes if self.scales is not None else 0) + \
+            (self.components.nbytes + self.mean.nbytes if self.dims else 0)
+        return self.coarse.nbytes + extra
+
+    @property
+    def full_nbytes(self) -> int:
+        return self.full.nbytes
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        probe = np.asarray(embedding, dtype=np.float32).ravel()
+        return probe / (np.linalg.norm(probe) + 1e-10)
+
+    def coarse_scores(self, embedding: np.ndarray) -> np.ndarray:
+        """
+        Approximate inner products (up to a per-query constant when PCA
+        is on: (x - mean) . q ranks like x . q).
+        """
+        probe = self._normalize(embedding)
+        if self.dims:
+            probe = probe @ self.components
+        if self.coarse.dtype == np.float32:
+            return self.coarse @ probe
+
+        scores = np.empty(len(self.coarse), dtype=np.float32)
+        for start in range(0, len(self.coarse), SCAN_BLOCK_ROWS):
+            block = self.coarse[start:start + SCAN_BLOCK_ROWS].astype(np.float32)
+            scores[start:start + len(block)] = block @ probe
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def candidates(self, embedding: np.ndarray, top_k: int) -> np.ndarray:
+        if top_k >= len(self):
+            return np.arange(len(self))
+        return np.argpartition(self.coarse_scores(embedding), -top_k)[-top_k:]
+
+    def exact_scores(self, embedding: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        FaceRecognitionService.calculate_confidence against all (or the
+        given) rows of the full-precision matrix.
+        """
+        matrix = self.full if rows is None else self.full[rows]
+        return (matrix @ self._normalize(embedding) + 1.0) / 2.0
+
+    def search(self, embedding: np.ndarray, top_k: int = 32) -> Tuple[Optional[int], float]:
+        """
+        (best user_id or None, exact score of that user; -1.0 when empty).
+        """
+        if not len(self):
+            return None, -1.0
+        rows = None if top_k >= len(self) else self.candidates(embedding, top_k)
+        scores = self.exact_scores(embedding, rows)
+        best = int(np.argmax(scores))
+        row = best if rows is None else rows[best]
+        return int(self.user_ids[row]), float(scores[best])
@@ -0,0 +1,105 @@
+# attendance_ai/services/image_cleanup.py
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+
+from attendance_ai.models import RemoteAttendance
+from attendance_ai.services.derivatives import media_path
+
+IMAGE_RETENTION_DAYS = getattr(settings, "IMAGE_RETENTION_DAYS", 30)
+CLEANUP_CHUNK_SIZE = getattr(settings, "IMAGE_CLEANUP_CHUNK_SIZE", 1000)  # rows per id range / UPDATE
+CLEANUP_WORKERS = getattr(settings, "IMAGE_CLEANUP_WORKERS", 8)           # parallel unlink() calls
+
+
+def _remove(url, dry_run):
+    """
+    Returns (outcome, bytes) with outcome in deleted / missing / error.
+    """
+    path = media_path(url)
+    try:
+        size = os.path.getsize(path)
+        if not dry_run:
+            os.remove(path)
+        return "deleted", size
+    except FileNotFoundError:
+        return "missing", 0
+    except OSError:
+        return "error", 0
+
+
+def _remove_row(urls, dry_run):
+    """
+    Verification image plus its thumbnail / face crop (derivatives/).
+    Returns [(outcome, bytes)] per file.
+    """
+    return [_remove(url, dry_run) for url in urls if url]
+
+
+def expired_images(days=None):
+    cutoff = timezone.now() - timedelta(days=IMAGE_RETENTION_DAYS if days is None else days)
+    return (
+        RemoteAttendance.objects
+        .filter(check_in_time__lt=cutoff, verification_image_url__isnull=False)
+        .exclude(verification_image_url="")
+    )
+
+
+def cleanup_expired_images(days=None, dry_run=False, chunk_size=None, workers=None, progress=None):
+    """
+    Delete verification images older than `days`, with their thumbnails
+    and face crops, in ascending id ranges and null the three URLs for
+    each processed chunk with one UPDATE.
+    Rows whose file could not be removed keep their URL and are retried on
+    the next run; everything else drops out of ra_image_expiry_idx, so a
+    run only ever sees newly expired images. Interrupted runs resume where
+    they stopped for the same reason.
+    dry_run reports what would be removed without touching files or rows.
+    progress(metrics) is called after each chunk.
+    Returns the metrics dict.
+    """
+    chunk_size = chunk_size or CLEANUP_CHUNK_SIZE
+    queryset = expired_images(days)
+    metrics = {"dry_run": dry_run, "scanned": 0, "deleted": 0, "missing": 0, "errors": 0,
+               "bytes_freed": 0, "rows_updated": 0, "chunks": 0, "seconds": 0.0}
+    started = time.monotonic()
+
+    last_id = 0
+    with ThreadPoolExecutor(max_workers=workers or CLEANUP_WORKERS) as pool:
+        while True:
+            rows = list(
+                queryset.filter(id__gt=last_id).order_by("id")
+                .values_list("id", "verification_image_url", "thumbnail_url", "face_crop_url")[:chunk_size]
+                .iterator(chunk_size=chunk_size)
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            outcomes = list(pool.map(lambda row: _remove_row(row[1:], dry_run), rows))
+            done_ids = []
+            for row, files in zip(rows, outcomes):
+                for outcome, size in files:
+                    metrics["errors" if outcome == "error" else outcome] += 1
+                    metrics["bytes_freed"] += size
+                if all(outcome != "error" for outcome, _ in files):
+                    done_ids.append(row[0])
+
+            if done_ids and not dry_run:
+                # update() skips post_save; status and times (all the signals track) are unchanged
+                metrics["rows_updated"] += (
+                    RemoteAttendance.objects.filter(id__in=done_ids).update(
+                        verification_image_url=None, thumbnail_url=None, face_crop_url=None
+                    )
+                )
+
+            metrics["scanned"] += len(rows)
+            metrics["chunks"] += 1
+            metrics["seconds"] = round(time.monotonic() - started, 2)
+            if progress:
+                progress(metrics)
+
+    metrics["seconds"] = round(time.monotonic() - started, 2)
+    return metrics
@@ -0,0 +1,158 @@
+# attendance_ai/services/notifications.py
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from attendance_ai.models import NotificationEvent
+
+SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+
+RECIPIENTS = getattr(settings, "NOTIFY_ANOMALY_RECIPIENTS", None) or [getattr(settings, "ADMIN_EMAIL", "")]
+DIGEST_MIN_SEVERITY = getattr(settings, "NOTIFY_DIGEST_MIN_SEVERITY", "high")        # below this: not mailed
+IMMEDIATE_MIN_SEVERITY = getattr(settings, "NOTIFY_IMMEDIATE_MIN_SEVERITY", "critical")  # flush without waiting
+IMMEDIATE_COOLDOWN = getattr(settings, "NOTIFY_IMMEDIATE_COOLDOWN", 60)  # at most one early flush per window
+FLUSH_LIMIT = getattr(settings, "NOTIFY_FLUSH_LIMIT", 5000)               # events per flush
+MAX_ATTEMPTS = getattr(settings, "NOTIFY_MAX_ATTEMPTS", 5)                # failed flushes before giving up
+CLAIM_SECONDS = getattr(settings, "NOTIFY_CLAIM_SECONDS", 600)             # lease; above the task's time limit
+IMMEDIATE_FLUSH_KEY = "notify:immediate_flush"
+
+
+def _rank(severity) -> int:
+    return SEVERITY_RANK.get(severity, 0)
+
+
+def queue(events, recipients=None) -> int:
+    """
+    events: iterable of (severity, subject, body). Stores one outbox row
+    per recipient (one bulk_create) for the next digest; anything at or
+    above IMMEDIATE_MIN_SEVERITY also schedules an early flush.
+    Returns the number of rows queued.
+    """
+    recipients = [r for r in (recipients or RECIPIENTS) if r]
+    events = [e for e in events if _rank(e[0]) >= _rank(DIGEST_MIN_SEVERITY)]
+    if not events or not recipients:
+        return 0
+
+    NotificationEvent.objects.bulk_create([
+        NotificationEvent(recipient=recipient, severity=severity, subject=subject[:200], body=body)
+        for severity, subject, body in events
+        for recipient in recipients
+    ])
+
+    if any(_rank(e[0]) >= _rank(IMMEDIATE_MIN_SEVERITY) for e in events):
+        transaction.on_commit(_schedule_immediate_flush)
+    return len(events) * len(recipients)
+
+
+def queue_anomalies(found) -> int:
+    """
+    One event per attendance from anomaly_engine.drain()["found"],
+    carrying its worst severity.
+    """
+    by_attendance = defaultdict(list)
+    for pk, username, code, severity in found:
+        by_attendance[(pk, username)].append((code, severity))
+
+    events = []
+    for (pk, username), hits in by_attendance.items():
+        severity = max((s for _, s in hits), key=_rank)
+        rules = ", ".join(f"{code} ({s})" for code, s in hits)
+        events.append((
+            severity,
+            f"⚠ Attendance anomaly: {username}",
+            f"User {username} triggered anomalies.\nAttendance ID: {pk}\nRules: {rules}",
+        ))
+    return queue(events)
+
+
+def _schedule_immediate_flush():
+    from attendance_ai.tasks import flush_notifications
+
+    if cache.add(IMMEDIATE_FLUSH_KEY, True, IMMEDIATE_COOLDOWN):
+        flush_notifications.delay()
+
+
+def _digest(recipient, events) -> EmailMessage:
+    if len(events) == 1:
+        subject = events[0].subject
+    else:
+        worst = max((e.severity for e in events), key=_rank)
+        subject = f"Attendance alerts digest: {len(events)} events (worst: {worst})"
+
+    body = "\n\n".join(
+        f"[{timezone.localtime(e.created_at):%Y-%m-%d %H:%M}] {e.severity.upper()} - {e.subject}\n{e.body}"
+        for e in events
+    )
+    return EmailMessage(
+        subject=subject,
+        body=f"{body}\n\nHRMS AI Attendance System",
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[recipient],
+    )
+
+
+def _claim(limit) -> list:
+    """
+    Lease up to `limit` unsent events in one short transaction: SKIP
+    LOCKED splits them between concurrent flushes, and claimed_until
+    hides them from the next flush until the lease runs out (a crashed
+    or killed flush leaves them to be picked up again).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            NotificationEvent.objects.filter(sent_at__isnull=True, failed_at__isnull=True)
+            .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now))
+            .select_for_update(skip_locked=True)
+            .order_by("recipient", "id")[:limit]
+        )
+        NotificationEvent.objects.filter(id__in=[e.id for e in events]).update(
+            claimed_until=now + timedelta(seconds=CLAIM_SECONDS)
+        )
+    return events
+
+
+def flush(limit=None) -> dict:
+    """
+    Send every unsent event as one digest per recipient over a single
+    mail connection. Events are claimed first (see _claim), sent outside
+    any transaction, and each recipient's events are marked sent right
+    after its message went out, so a flush that dies midway never
+    re-sends what already went out.
+    A failed recipient's events are released for the next flush until
+    they have failed MAX_ATTEMPTS times; then they are marked failed_at
+    and left for the admin.
+    """
+    events = _claim(limit or FLUSH_LIMIT)
+    if not events:
+        return {"events": 0, "emails": 0, "failed": 0, "given_up": 0}
+
+    by_recipient = defaultdict(list)
+    for event in events:
+        by_recipient[event.recipient].append(event)
+
+    sent, emails, failed, given_up = 0, 0, 0, 0
+    with get_connection(fail_silently=False) as connection:
+        for recipient, batch in by_recipient.items():
+            ids = [e.id for e in batch]
+            try:
+                connection.send_messages([_digest(recipient, batch)])
+            except Exception:
+                failed += 1
+                NotificationEvent.objects.filter(id__in=ids).update(
+                    attempts=F("attempts") + 1, claimed_until=None
+                )
+                given_up += NotificationEvent.objects.filter(
+                    id__in=ids, attempts__gte=MAX_ATTEMPTS
+                ).update(failed_at=timezone.now())
+                continue
+            NotificationEvent.objects.filter(id__in=ids).update(sent_at=timezone.now(), claimed_until=None)
+            emails += 1
+            sent += len(ids)
+
+    return {"events": sent, "emails": emails, "failed": failed, "given_up": given_up}
@@ -0,0 +1,215 @@
+# attendance_ai/services/reembed.py
+import os
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from attendance_ai.models import EmbeddingVersion, FaceEmbedding, FaceProfile
+from attendance_ai.services import gallery
+from attendance_ai.services.derivatives import media_path
+from attendance_ai.services.face_recognition import (
+    ACTIVE_MODEL_CACHE_KEY,
+    DEFAULT_ENCODING_VERSION,
+    DEFAULT_MODEL_PACK,
+    active_model,
+    embed_enrollment_images,
+    forget_active_model,
+    init_embedding_worker,
+)
+from attendance_ai.utils.crypto import encrypt_array
+
+REEMBED_CHUNK_SIZE = getattr(settings, "REEMBED_CHUNK_SIZE", 100)  # profiles per worker call / checkpoint
+KNOWN_FACES_DIR = os.path.join(settings.BASE_DIR, "attendance_ai", "known_faces")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def get_version(name, model_pack=None) -> EmbeddingVersion:
+    version, created = EmbeddingVersion.objects.get_or_create(
+        name=name, defaults={"model_pack": model_pack or active_model()[1]}
+    )
+    if not created and model_pack and version.model_pack != model_pack:
+        raise ValueError(f"{name} was started with {version.model_pack}, not {model_pack}")
+    return version
+
+
+def enrollment_image(profile_id, image_url, username):
+    """
+    Registration photo if we still have it, otherwise the first image in
+    known_faces/<username>/ (the layout generate_encodings.py reads).
+    """
+    if image_url:
+        path = media_path(image_url)
+        if os.path.exists(path):
+            return path
+    folder = os.path.join(KNOWN_FACES_DIR, username or "")
+    if username and os.path.isdir(folder):
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                return os.path.join(folder, name)
+    return None
+
+
+def discard_stale_embeddings(profile_ids):
+    """
+    A profile was re-enrolled with a new photo: its rows for building or
+    retired versions were made from the old photo, so drop them. The
+    profile shows up in missing_profiles() again and a build must cover
+    it (reset_checkpoint() if it is past the checkpoint) before activate().
+    """
+    FaceEmbedding.objects.filter(profile_id__in=list(profile_ids)).exclude(version__status="active").delete()
+
+
+def missing_profiles(version):
+    # anti-join: profiles with no embedding for this version yet
+    return FaceProfile.objects.exclude(embeddings__version=version).order_by("id")
+
+
+def _chunks(version, chunk_size):
+    """
+    Yield [(profile_id, image_path)] chunks after the checkpoint.
+    """
+    last_id = version.last_profile_id
+    while True:
+        rows = list(
+            missing_profiles(version).filter(id__gt=last_id)
+            .values_list("id", "image_url", "user__username")[:chunk_size]
+        )
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield [(pk, enrollment_image(pk, url, username)) for pk, url, username in rows]
+
+
+def store_results(version, results, checkpoint=None) -> dict:
+    """
+    Write one chunk's embeddings and advance the checkpoint in one
+    transaction, so a resume never skips an unsaved chunk.
+    """
+    embeddings = [
+        FaceEmbedding(profile_id=pk, version=version, encoding=encrypt_array(emb))
+        for pk, emb, error in results if emb is not None
+    ]
+    failed = len(results) - len(embeddings)
+
+    with transaction.atomic():
+        FaceEmbedding.objects.bulk_create(embeddings, ignore_conflicts=True)
+        values = {"processed": F("processed") + len(results), "failed": F("failed") + failed}
+        if checkpoint is not None:
+            values["last_profile_id"] = checkpoint
+        EmbeddingVersion.objects.filter(id=version.id).update(**values)
+    return {"embedded": len(embeddings), "failed": failed}
+
+
+def run(version, workers=None, chunk_size=None, progress=None) -> dict:
+    """
+    Re-embed every profile missing from `version` across a process pool
+    (one model per process). Chunks are committed in submission order, so
+    the checkpoint only ever covers finished work; rerunning resumes
+    after it. progress(version) gets the refreshed row after each chunk.
+    """
+    chunk_size = chunk_size or REEMBED_CHUNK_SIZE
+    workers = workers or os.cpu_count() or 1
+    EmbeddingVersion.objects.filter(id=version.id).update(total=FaceProfile.objects.count())
+
+    totals = {"embedded": 0, "failed": 0}
+    # children must not inherit open DB connections; spawn also avoids
+    # forking onnxruntime / the audit flush thread
+    connections.close_all()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=init_embedding_worker,
+                             initargs=(version.model_pack,)) as pool:
+        in_flight = deque()
+        chunks = _chunks(version, chunk_size)
+
+        def drain_one():
+            items, future = in_flight.popleft()
+            done = store_results(version, future.result(), checkpoint=items[-1][0])
+            totals["embedded"] += done["embedded"]
+            totals["failed"] += done["failed"]
+            if progress:
+                progress(EmbeddingVersion.objects.get(id=version.id))
+
+        for items in chunks:
+            in_flight.append((items, pool.submit(embed_enrollment_images, items, version.model_pack)))
+            if len(in_flight) >= workers * 2:
+                drain_one()
+        while in_flight:
+            drain_one()
+    return totals
+
+
+def reset_checkpoint(version):
+    """
+    Revisit everything still missing (failures, profiles registered since
+    the build started).
+    """
+    EmbeddingVersion.objects.filter(id=version.id).update(last_profile_id=0, processed=0, failed=0)
+
+
+def activate(version, allow_missing=False) -> dict:
+    """
+    Make `version` the live gallery in one transaction: keep the outgoing
+    embeddings as FaceEmbedding rows, copy the new ones into
+    FaceProfile.face_encoding with a single UPDATE and flip the statuses.
+    Profiles with no new embedding are taken out of matching
+    (face_encoding NULL) when allow_missing, otherwise nothing changes.
+    """
+    with transaction.atomic():
+        versions = {v.name: v for v in EmbeddingVersion.objects.select_for_update()}
+        version = versions[version.name]
+        missing = missing_profiles(version).count()
+        if missing and not allow_missing:
+            raise ValueError(f"{missing} profiles have no {version.name} embedding")
+
+        outgoing = next((v for v in versions.values() if v.status == "active"), None)
+        if outgoing is None and version.name != DEFAULT_ENCODING_VERSION:
+            # first upgrade: the gallery so far was built with the settings defaults
+            outgoing = EmbeddingVersion.objects.create(
+                name=DEFAULT_ENCODING_VERSION, model_pack=DEFAULT_MODEL_PACK, status="active"
+            )
+        if outgoing is not None and outgoing.id != version.id:
+            _snapshot_profiles(outgoing)
+            EmbeddingVersion.objects.filter(id=outgoing.id).update(status="retired")
+
+        new_encoding = FaceEmbedding.objects.filter(profile=OuterRef("pk"), version=version).values("encoding")[:1]
+        updated = FaceProfile.objects.update(
+            face_encoding=Subquery(new_encoding),
+            encoding_version=version.name,
+        )
+        EmbeddingVersion.objects.filter(id=version.id).update(status="active", activated_at=timezone.now())
+
+        def publish():
+            cache.set(ACTIVE_MODEL_CACHE_KEY, (version.name, version.model_pack), None)
+            gallery.invalidate()
+            forget_active_model()
+
+        transaction.on_commit(publish)
+    return {"profiles": updated, "missing": missing}
+
+
+def _snapshot_profiles(outgoing, batch_size=1000):
+    """
+    Copy live FaceProfile encodings into FaceEmbedding rows of the outgoing
+    version so a rollback is just activate(outgoing).
+    """
+    last_id = 0
+    while True:
+        rows = list(
+            FaceProfile.objects.filter(id__gt=last_id, face_encoding__isnull=False)
+            .order_by("id").values_list("id", "face_encoding")[:batch_size]
+        )
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        # the live encoding wins over rows left from an earlier build of this version
+        FaceEmbedding.objects.bulk_create(
+            [FaceEmbedding(profile_id=pk, version=outgoing, encoding=enc) for pk, enc in rows],
+            update_conflicts=True,
+            unique_fields=["profile", "version"],
+            update_fields=["encoding"],
+        )
@@ -0,0 +1,120 @@
+# attendance_ai/services/review.py
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from attendance_ai.models import RemoteAttendance
+from attendance_ai.services import rollup, today_status
+from attendance_ai.utils.audit import audit_log
+from attendance_ai.utils.dates import local_day_bounds
+from attendance_ai.utils.pagination import parse_day
+
+REVIEW_STATUSES = {"approve": "approved", "reject": "rejected"}
+BULK_SYNC_LIMIT = getattr(settings, "BULK_REVIEW_SYNC_LIMIT", 500)  # larger batches go to Celery
+BULK_CHUNK_SIZE = getattr(settings, "BULK_REVIEW_CHUNK_SIZE", 2000)  # rows per UPDATE
+
+
+def filter_pending(queryset, filters):
+    """
+    Apply review-queue filters to a RemoteAttendance queryset.
+    filters: {department, date ("today" or YYYY-MM-DD), from, to, min_confidence, max_confidence}
+    Raises ValueError on malformed values.
+    """
+    filters = filters or {}
+
+    if filters.get("department"):
+        queryset = queryset.filter(user__department=filters["department"])
+
+    date_from = parse_day(filters.get("from"))
+    date_to = parse_day(filters.get("to"))
+    if filters.get("date"):
+        day = timezone.localdate() if filters["date"] == "today" else parse_day(filters["date"])
+        date_from = date_to = day
+    if date_from:
+        queryset = queryset.filter(check_in_time__gte=local_day_bounds(date_from)[0])
+    if date_to:
+        queryset = queryset.filter(check_in_time__lt=local_day_bounds(date_to)[1])
+
+    if filters.get("min_confidence") not in (None, ""):
+        queryset = queryset.filter(confidence_score__gte=float(filters["min_confidence"]))
+    if filters.get("max_confidence") not in (None, ""):
+        queryset = queryset.filter(confidence_score__lt=float(filters["max_confidence"]))
+    return queryset
+
+
+def pending_queryset(attendance_ids=None, filters=None):
+    queryset = RemoteAttendance.objects.filter(status="pending")
+    if attendance_ids is not None:
+        queryset = queryset.filter(id__in=attendance_ids)
+    return filter_pending(queryset, filters)
+
+
+def _update_values(action, reviewer_id, notes):
+    return {
+        "status": REVIEW_STATUSES[action],
+        "reviewed_by_id": reviewer_id,
+        "reviewed_at": timezone.now(),
+        "review_notes": notes,
+    }
+
+
+def _review_chunk(queryset, values):
+    """
+    Lock the chunk, move it with one UPDATE, adjust the daily rollup
+    once per (date, department, old status) and drop the affected users'
+    cached today_status.
+    """
+    with transaction.atomic():
+        rows = list(
+            queryset.select_for_update(of=("self",))
+            .values("id", "user_id", "status", "check_in_time", "confidence_score", "user__department")
+        )
+        if not rows:
+            return 0
+        updated = RemoteAttendance.objects.filter(id__in=[r["id"] for r in rows]).update(**values)
+        rollup.record_bulk_status_change(rows, values["status"])
+        today_status.invalidate(r["user_id"] for r in rows)
+    return updated
+
+
+def apply_review(queryset, action, reviewer_id, notes="", progress=None):
+    """
+    Approve/reject every pending row matched by queryset with set-based
+    UPDATEs, one per BULK_CHUNK_SIZE matching ids (walked keyset-style,
+    so sparse selections cost one round trip per chunk of real rows and
+    locks stay short).
+    progress(done_chunks, total_chunks) is called after each chunk.
+    Returns the number of rows updated.
+    """
+    values = _update_values(action, reviewer_id, notes)
+    queryset = queryset.filter(status="pending")
+
+    total = -(-queryset.count() // BULK_CHUNK_SIZE)
+    updated, done, last_id = 0, 0, 0
+    while True:
+        ids = list(queryset.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:BULK_CHUNK_SIZE])
+        if not ids:
+            return updated
+        last_id = ids[-1]
+        # re-filtered under the lock: rows reviewed meanwhile are skipped
+        updated += _review_chunk(queryset.filter(id__in=ids), values)
+        done += 1
+        if progress:
+            progress(done, max(total, done))
+
+
+def audit_bulk_review(reviewer_id, action, count, attendance_ids=None, filters=None, ip_address=None):
+    """
+    One aggregated audit entry per bulk operation.
+    """
+    audit_log(
+        actor=reviewer_id,
+        action=f"attendance_bulk_{action}",
+        target_repr=f"RemoteAttendance x{count}",
+        extra={
+            "count": count,
+            "attendance_ids": (attendance_ids or [])[:1000],
+            "filters": filters or {},
+        },
+        ip_address=ip_address,
+    )
@@ -0,0 +1,167 @@
+# attendance_ai/services/rollup.py
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least, TruncDate
+from django.utils import timezone
+
+from attendance_ai.models import DailyAttendanceSummary, RemoteAttendance
+from attendance_ai.utils.dates import local_day_bounds
+
+
+def _bucket_id(day, department, status):
+    # get_or_create retries the get if a concurrent request created the row first
+    return DailyAttendanceSummary.objects.get_or_create(
+        date=day, department=department or "", status=status
+    )[0].id
+
+
+def _widen(fn, a, b):
+    values = [v for v in (a, b) if v is not None]
+    return fn(values) if values else None
+
+
+def add_to_bucket(day, department, status, count=1, confidence_sum=0.0, confidence_count=0,
+                  confidence_min=None, confidence_max=None, first_check_in=None, last_check_out=None):
+    """
+    Atomically add (or, with negative counts, remove) rows to one bucket.
+    min/max/first/last only ever widen.
+    """
+    values = {
+        "count": F("count") + count,
+        "confidence_sum": F("confidence_sum") + confidence_sum,
+        "confidence_count": F("confidence_count") + confidence_count,
+    }
+    if confidence_min is not None:
+        values["confidence_min"] = Least(Coalesce("confidence_min", Value(confidence_min)), Value(confidence_min))
+    if confidence_max is not None:
+        values["confidence_max"] = Greatest(Coalesce("confidence_max", Value(confidence_max)), Value(confidence_max))
+    if first_check_in is not None:
+        values["first_check_in"] = Least(Coalesce("first_check_in", Value(first_check_in)), Value(first_check_in))
+    if last_check_out is not None:
+        values["last_check_out"] = Greatest(Coalesce("last_check_out", Value(last_check_out)), Value(last_check_out))
+
+    DailyAttendanceSummary.objects.filter(id=_bucket_id(day, department, status)).update(**values)
+
+
+def _confidence(value):
+    return (float(value), 1) if value is not None else (0.0, 0)
+
+
+def record_created(check_in_time, department, status, confidence):
+    if check_in_time is None:
+        return
+    conf_sum, conf_count = _confidence(confidence)
+    add_to_bucket(
+        timezone.localdate(check_in_time), department, status, 1, conf_sum, conf_count,
+        confidence_min=confidence, confidence_max=confidence, first_check_in=check_in_time,
+    )
+
+
+def record_removed(check_in_time, department, status, confidence):
+    if check_in_time is None:
+        return
+    conf_sum, conf_count = _confidence(confidence)
+    add_to_bucket(timezone.localdate(check_in_time), department, status, -1, -conf_sum, -conf_count)
+
+
+def record_status_change(check_in_time, department, old_status, new_status, confidence, check_out_time=None):
+    record_removed(check_in_time, department, old_status, confidence)
+    conf_sum, conf_count = _confidence(confidence)
+    add_to_bucket(
+        timezone.localdate(check_in_time), department, new_status, 1, conf_sum, conf_count,
+        confidence_min=confidence, confidence_max=confidence,
+        first_check_in=check_in_time, last_check_out=check_out_time,
+    )
+
+
+def record_checkout(check_in_time, department, status, check_out_time):
+    if check_in_time is None or check_out_time is None:
+        return
+    add_to_bucket(timezone.localdate(check_in_time), department, status, 0, last_check_out=check_out_time)
+
+
+def record_bulk_status_change(rows, new_status):
+    """
+    rows: dicts with check_in_time, confidence_score, status, user__department
+    (all moved to new_status by one UPDATE). Applied as one adjustment per
+    (date, department, old status) instead of per row.
+    """
+    moves = defaultdict(lambda: {"count": 0, "sum": 0.0, "conf_count": 0, "min": None, "max": None, "first": None})
+    for row in rows:
+        if row["check_in_time"] is None:
+            continue
+        key = (timezone.localdate(row["check_in_time"]), row["user__department"] or "", row["status"])
+        m = moves[key]
+        m["count"] += 1
+        conf = row["confidence_score"]
+        if conf is not None:
+            m["sum"] += conf
+            m["conf_count"] += 1
+            m["min"] = conf if m["min"] is None else min(m["min"], conf)
+            m["max"] = conf if m["max"] is None else max(m["max"], conf)
+        m["first"] = row["check_in_time"] if m["first"] is None else min(m["first"], row["check_in_time"])
+
+    for (day, department, old_status), m in moves.items():
+        add_to_bucket(day, department, old_status, -m["count"], -m["sum"], -m["conf_count"])
+        add_to_bucket(day, department, new_status, m["count"], m["sum"], m["conf_count"],
+                      confidence_min=m["min"], confidence_max=m["max"], first_check_in=m["first"])
+
+
+def rebuild(date_from, date_to):
+    """
+    Recompute every bucket for [date_from, date_to] (local dates) from
+    RemoteAttendance. Returns the number of buckets written.
+    """
+    start = local_day_bounds(date_from)[0]
+    end = local_day_bounds(date_to)[1]
+    tz = timezone.get_current_timezone()
+
+    groups = (
+        RemoteAttendance.objects
+        .filter(check_in_time__gte=start, check_in_time__lt=end)
+        .annotate(day=TruncDate("check_in_time", tzinfo=tz))
+        .values("day", "user__department", "status")
+        .annotate(
+            n=Count("id"),
+            conf_sum=Sum("confidence_score"),
+            conf_count=Count("confidence_score"),
+            conf_min=Min("confidence_score"),
+            conf_max=Max("confidence_score"),
+            first_in=Min("check_in_time"),
+            last_out=Max("check_out_time"),
+        )
+        .order_by()
+    )
+
+    # NULL and "" departments share a bucket, so merge before inserting
+    summaries = {}
+    for g in groups:
+        key = (g["day"], g["user__department"] or "", g["status"])
+        s = summaries.get(key)
+        if s is None:
+            summaries[key] = DailyAttendanceSummary(
+                date=key[0],
+                department=key[1],
+                status=key[2],
+                count=g["n"],
+                confidence_sum=g["conf_sum"] or 0.0,
+                confidence_count=g["conf_count"],
+                confidence_min=g["conf_min"],
+                confidence_max=g["conf_max"],
+                first_check_in=g["first_in"],
+                last_check_out=g["last_out"],
+            )
+            continue
+        s.count += g["n"]
+        s.confidence_sum += g["conf_sum"] or 0.0
+        s.confidence_count += g["conf_count"]
+        s.confidence_min = _widen(min, s.confidence_min, g["conf_min"])
+        s.confidence_max = _widen(max, s.confidence_max, g["conf_max"])
+        s.first_check_in = _widen(min, s.first_check_in, g["first_in"])
+        s.last_check_out = _widen(max, s.last_check_out, g["last_out"])
+
+    with transaction.atomic():
+        DailyAttendanceSummary.objects.filter(date__gte=date_from, date__lte=date_to).delete()
+        DailyAttendanceSummary.objects.bulk_create(summaries.values(), batch_size=1000)
+    return len(summaries)
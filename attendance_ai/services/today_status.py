@@ -0,0 +1,88 @@
+# attendance_ai/services/today_status.py
+from zoneinfo import ZoneInfo
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from attendance_ai.models import RemoteAttendance
+from attendance_ai.utils.dates import local_day_bounds
+from attendance_ai.utils.pagination import payload_etag
+
+
+def _tz():
+    # the working day rolls over with the scheduled jobs, not the server clock
+    return ZoneInfo(getattr(settings, "CELERY_TIMEZONE", settings.TIME_ZONE))
+
+
+def _today():
+    return timezone.localdate(timezone=_tz())
+
+
+def cache_key(user_id, day=None) -> str:
+    return f"today_status:{user_id}:{(day or _today()).isoformat()}"
+
+
+def _seconds_until_midnight() -> int:
+    now = timezone.localtime(timezone=_tz())
+    return max(1, int((local_day_bounds(now.date(), _tz())[1] - now).total_seconds()))
+
+
+def compute(user_id) -> dict:
+    """
+    The user's open check-in for today (same shape today_status has always
+    returned, plus the record's review status).
+    """
+    start, end = local_day_bounds(_today(), _tz())
+    record = (
+        RemoteAttendance.objects
+        .filter(user_id=user_id, check_out_time__isnull=True, check_in_time__gte=start, check_in_time__lt=end)
+        .order_by("-check_in_time")
+        .values("check_in_time", "check_out_time", "status")
+        .first()
+    )
+    if not record:
+        return {"checked_in": False}
+    return {
+        "checked_in": True,
+        "check_in_time": record["check_in_time"],
+        "checked_out": bool(record["check_out_time"]),
+        "check_out_time": record["check_out_time"],
+        "status": record["status"],
+    }
+
+
+def refresh(user_id) -> dict:
+    """
+    Recompute and store the entry; it expires at local midnight.
+    Returns {"payload", "etag"}.
+    """
+    payload = compute(user_id)
+    entry = {"payload": payload, "etag": payload_etag(payload)}
+    cache.set(cache_key(user_id), entry, _seconds_until_midnight())
+    return entry
+
+
+def get(user_id) -> dict:
+    entry = cache.get(cache_key(user_id))
+    return entry if entry is not None else refresh(user_id)
+
+
+def record_changed(attendance):
+    """
+    Write-through after a RemoteAttendance save/delete. Deferred to commit
+    so a rolled-back write never reaches the cache.
+    """
+    if attendance.check_in_time is None or attendance.check_in_time < local_day_bounds(_today(), _tz())[0]:
+        return  # earlier days never show up in today's state
+    transaction.on_commit(lambda: refresh(attendance.user_id))
+
+
+def invalidate(user_ids):
+    """
+    For bulk UPDATEs that bypass post_save: drop the entries so the next
+    poll recomputes them.
+    """
+    keys = [cache_key(uid) for uid in set(user_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -1,14 +1,111 @@
 # attendance_ai/signals.py
 from django.dispatch import receiver
-from django.db.models.signals import post_save
-from .models import RemoteAttendance, AuditLog
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from .models import FaceProfile, KioskDevice, RemoteAttendance, RegisteredUser
+from .services import gallery, rollup, checkin_window, today_status
+from .utils.timing import stage
+from .utils.audit import audit_log
 
 @receiver(post_save, sender=RemoteAttendance)
 def attendance_post_save(sender, instance, created, **kwargs):
+    if created and not getattr(instance, "_audited_by_view", False):
+        with stage("signal_audit"):
+            audit_log(
+                actor=None,  # you can pass request.user via view when calling explicitly
+                action="attendance_created",
+                target_repr=f"RemoteAttendance:{instance.id}",
+                extra={"status": instance.status, "confidence_score": instance.confidence_score}
+            )
+
+
+@receiver(post_save, sender=RemoteAttendance)
+def attendance_count_checkin(sender, instance, created, **kwargs):
+    # per-user sliding-window counters read by the frequency anomaly rule
     if created:
-        AuditLog.objects.create(
-            actor=None,  # you can pass request.user via view when calling explicitly
-            action="attendance_created",
-            target_repr=f"RemoteAttendance:{instance.id}",
-            extra={"status": instance.status, "confidence_score": instance.confidence_score}
-        )
+        with stage("checkin_window"):
+            checkin_window.record_checkin(instance.user_id, instance.check_in_time)
+
+
+@receiver(post_save, sender=RemoteAttendance)
+@receiver(post_delete, sender=RemoteAttendance)
+def attendance_refresh_today_status(sender, instance, **kwargs):
+    # check-in, checkout, live camera punches and single review decisions
+    today_status.record_changed(instance)
+
+
+# ---------------------------------------------------------
+# DAILY ROLLUP MAINTENANCE
+# ---------------------------------------------------------
+def _department(instance):
+    if RemoteAttendance.user.is_cached(instance):
+        return instance.user.department or ""
+    return RegisteredUser.objects.filter(pk=instance.user_id).values_list("department", flat=True).first() or ""
+
+
+@receiver(post_init, sender=RemoteAttendance)
+def attendance_remember_state(sender, instance, **kwargs):
+    # __dict__ so deferred fields are not loaded here
+    instance._rollup_status = instance.__dict__.get("status")
+    instance._rollup_check_out = instance.__dict__.get("check_out_time")
+
+
+@receiver(post_save, sender=RemoteAttendance)
+def attendance_update_rollup(sender, instance, created, **kwargs):
+    old_status = instance._rollup_status
+    old_check_out = instance._rollup_check_out
+
+    with stage("rollup"):
+        if created:
+            rollup.record_created(instance.check_in_time, _department(instance),
+                                  instance.status, instance.confidence_score)
+        elif old_status is not None and old_status != instance.status:
+            rollup.record_status_change(instance.check_in_time, _department(instance), old_status,
+                                        instance.status, instance.confidence_score, instance.check_out_time)
+        elif old_check_out is None and instance.check_out_time is not None:
+            rollup.record_checkout(instance.check_in_time, _department(instance),
+                                   instance.status, instance.check_out_time)
+
+    instance._rollup_status = instance.status
+    instance._rollup_check_out = instance.check_out_time
+
+
+@receiver(post_delete, sender=RemoteAttendance)
+def attendance_remove_from_rollup(sender, instance, **kwargs):
+    rollup.record_removed(instance.check_in_time, _department(instance),
+                          instance._rollup_status or instance.status, instance.confidence_score)
+
+
+# ---------------------------------------------------------
+# GALLERY INDEX INVALIDATION
+# ---------------------------------------------------------
+@receiver(post_save, sender=FaceProfile)
+@receiver(post_delete, sender=FaceProfile)
+def face_profile_changed(sender, instance, **kwargs):
+    # enrollment / deactivation: only the user's shard and the global
+    # index rebuild on their next search
+    if FaceProfile.user.is_cached(instance):
+        department = instance.user.department
+    else:
+        department = RegisteredUser.objects.filter(pk=instance.user_id).values_list("department", flat=True).first()
+    transaction.on_commit(lambda: gallery.invalidate([department]))
+
+
+@receiver(post_init, sender=RegisteredUser)
+def user_remember_department(sender, instance, **kwargs):
+    instance._shard_department = instance.__dict__.get("department")
+
+
+@receiver(post_save, sender=RegisteredUser)
+def user_department_changed(sender, instance, created, **kwargs):
+    # a transfer moves the user's template between shards
+    old, new = instance._shard_department, instance.__dict__.get("department")
+    if not created and "department" in instance.__dict__ and old != new:
+        transaction.on_commit(lambda: gallery.invalidate([old, new]))
+    instance._shard_department = new
+
+
+@receiver(post_save, sender=KioskDevice)
+@receiver(post_delete, sender=KioskDevice)
+def kiosk_device_changed(sender, instance, **kwargs):
+    gallery.forget_device(instance.device_id)
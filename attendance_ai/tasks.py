@@ -1,28 +1,39 @@
 # attendance_ai/tasks.py
 
 import os
-import numpy as np
-from datetime import timedelta
 from celery import shared_task
 from django.utils import timezone
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db.models import Sum
+from django.utils.dateparse import parse_datetime
 
-from .models import RemoteAttendance, FaceProfile, AttendanceAnomaly
-from .services.face_recognition import FaceRecognitionService
+from .models import RemoteAttendance, FaceProfile, DailyAttendanceSummary, AuditLog, EmbeddingVersion
+from .services.face_recognition import FaceRecognitionService, embed_enrollment_images
+from .services.derivatives import generate_derivatives
+from .services.review import pending_queryset, apply_review, audit_bulk_review
+from .services import anomaly_engine, audit_archive, gallery, image_cleanup, notifications, reembed
+from .utils.timing import stage
 
 
 # -------------------------------------------------------------------
 # 1. FACE VERIFICATION (async check after check-in)
 # -------------------------------------------------------------------
 
+# how much a status trusts the check-in; the re-check may only lower it
+STATUS_TRUST = {"unverified": 0, "pending": 1, "verified": 2}
+
+
 @shared_task
-def process_face_verification(attendance_id, new_image_path):
+def process_face_verification(attendance_id, new_image_path, strict=True):
     """
     Re-process attendance verification in background:
     - Extract face encoding from image
-    - Compare with stored encoding
-    - Update status & confidence_score
+    - Compare with the user's templates (gallery.verify, with the same
+      thresholds and cohort check as the check-in: strict for 1:N and
+      untrusted claims)
+    - Update status & confidence_score: the re-check can hold back or
+      reject the check-in's decision, never upgrade it
     - Trigger anomaly detection
     """
 
@@ -32,35 +43,38 @@ def process_face_verification(attendance_id, new_image_path):
         return {"status": "error", "message": "Attendance record not found"}
 
     # extract embedding
-    new_emb = FaceRecognitionService.extract_face_encoding(new_image_path)
+    with stage("task_verify_embed", shared=True):
+        new_emb = FaceRecognitionService.extract_face_encoding(new_image_path)
     if new_emb is None:
         attendance.status = "no_face_detected"
-        attendance.save()
+        # only our columns: generate_image_derivatives writes the URLs concurrently
+        attendance.save(update_fields=["status"])
         return {"status": "error", "message": "No face detected"}
 
-    # load stored embedding
-    try:
-        profile = FaceProfile.objects.get(user=attendance.user, is_active=True)
-    except FaceProfile.DoesNotExist:
+    # compare with the stored templates
+    with stage("task_verify_match", shared=True):
+        result = gallery.verify(new_emb, attendance.user_id, strict=strict)
+    if result["reason"] == "profile_missing":
         attendance.status = "profile_missing"
-        attendance.save()
+        attendance.save(update_fields=["status"])
         return {"status": "error", "message": "No profile found"}
 
-    stored_emb = np.array(profile.face_encoding, dtype=np.float32)
-
-    confidence = FaceRecognitionService.calculate_confidence(stored_emb, new_emb)
-
+    confidence = result["score"]
     attendance.confidence_score = float(confidence)
 
-    if confidence < 0.65:
-        attendance.status = "unverified"
-    else:
-        attendance.status = "verified"
+    # reviewed (approved / rejected) rows keep their status
+    if attendance.status in STATUS_TRUST:
+        attendance.status = min(attendance.status, gallery.decide(result, strict=strict), key=STATUS_TRUST.get)
 
-    attendance.save()
+    # queued for the next anomaly micro-batch in the same write
+    queued = anomaly_engine.queue(attendance)
 
-    # run anomaly check async
-    detect_attendance_anomalies.delay(attendance.id)
+    with stage("task_verify_db_update", shared=True):
+        attendance.save(update_fields=["status", "confidence_score", "anomaly_check"])
+
+    with stage("task_verify_enqueue", shared=True):
+        if queued:
+            anomaly_engine.schedule_drain()
 
     return {"status": "success", "confidence": float(confidence)}
 
@@ -70,86 +84,54 @@ def process_face_verification(attendance_id, new_image_path):
 # -------------------------------------------------------------------
 
 @shared_task
-def detect_attendance_anomalies(attendance_id):
+def detect_anomalies_batch():
     """
-    Detect anomalies such as:
-    - Low confidence score
-    - Odd geolocation
-    - Suspicious device
-    - Too frequent check-ins
+    Analyse every queued attendance in micro-batches:
+    - one locked SELECT per batch (with username)
+    - per-user check-in counts in one cache round trip
+    - all rules evaluated over the whole batch at once
+    - one bulk_create for every anomaly found
+    - alerts queued for the next notification digest
+    Scheduled by anomaly_engine.schedule_drain() and swept by beat.
     """
 
-    try:
-        attendance = RemoteAttendance.objects.get(id=attendance_id)
-    except RemoteAttendance.DoesNotExist:
-        return {"status": "error", "message": "not found"}
-
-    anomalies = []
-
-    # 1. confidence anomaly
-    if attendance.confidence_score and attendance.confidence_score < 0.50:
-        anomalies.append(("low_confidence", "Very low face match confidence", "high"))
-
-    # 2. impossible geolocation (optional)
-    geo = attendance.geolocation or {}
-    if geo.get("lat") is None or geo.get("lng") is None:
-        anomalies.append(("missing_geolocation", "No geolocation provided", "medium"))
+    with stage("task_anomaly_batch", shared=True):
+        result = anomaly_engine.drain()
 
-    # 3. too many checkins
-    last_hour = RemoteAttendance.objects.filter(
-        user=attendance.user,
-        check_in_time__gte=timezone.now() - timedelta(hours=1)
-    ).count()
+    # alerts go to the notification outbox and leave as digests
+    queued = notifications.queue_anomalies(result["found"])
 
-    if last_hour > 5:  # suspicious
-        anomalies.append(("suspicious_frequency", "Too many check-ins within 1 hour", "high"))
+    return {"status": "ok", "analysed": result["analysed"], "anomalies": len(result["found"]), "queued": queued}
 
-    # save anomalies
-    for code, msg, severity in anomalies:
-        AttendanceAnomaly.objects.create(
-            attendance=attendance,
-            anomaly_type=code,
-            description=msg,
-            severity=severity
-        )
 
-    # notify admin on severe anomalies
-    if any(a[2] == "high" for a in anomalies):
-        send_mail(
-            subject="⚠ High Severity Attendance Anomaly Detected",
-            message=f"User {attendance.user.username} triggered anomalies.\nAttendance ID: {attendance.id}",
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[settings.ADMIN_EMAIL],
-            fail_silently=True,
-        )
+@shared_task
+def detect_attendance_anomalies(attendance_id):
+    """
+    Single-attendance entry point kept for callers and messages still in
+    flight: queues the row and drains.
+    """
 
-    return {"status": "ok", "anomalies": len(anomalies)}
+    RemoteAttendance.objects.filter(id=attendance_id).exclude(anomaly_check="done") \
+        .update(anomaly_check="pending")
+    return detect_anomalies_batch()
 
 
 # -------------------------------------------------------------------
 # 3. CLEANUP OLD IMAGES (every night)
 # -------------------------------------------------------------------
 
-@shared_task
-def cleanup_old_images(days=30):
+@shared_task(bind=True)
+def cleanup_old_images(self, days=None, dry_run=False):
     """
-    Delete attendance verification images older than X days.
+    Delete attendance verification images older than X days (default
+    IMAGE_RETENTION_DAYS) and clear their URLs, chunk by chunk.
+    Returns the run's metrics; PROGRESS state carries them while running.
     """
+    def progress(metrics):
+        self.update_state(state="PROGRESS", meta=metrics)
 
-    cutoff = timezone.now() - timedelta(days=days)
-    old_records = RemoteAttendance.objects.filter(
-        check_in_time__lt=cutoff,
-        verification_image_url__isnull=False
-    )
-
-    deleted = 0
-    for rec in old_records:
-        file_path = rec.verification_image_url.replace("/media", settings.MEDIA_ROOT)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            deleted += 1
-
-    return {"deleted_images": deleted}
+    metrics = image_cleanup.cleanup_expired_images(days, dry_run=dry_run, progress=progress)
+    return {"deleted_images": metrics["deleted"], **metrics}
 
 
 # -------------------------------------------------------------------
@@ -162,21 +144,36 @@ def generate_daily_reports():
     Send daily attendance summary email to HR.
     """
 
-    today = timezone.now().date()
-    records = RemoteAttendance.objects.filter(
-        check_in_time__date=today
+    today = timezone.localdate()
+
+    # one small query over the rollup instead of counting raw attendance
+    by_status = dict(
+        DailyAttendanceSummary.objects
+        .filter(date=today)
+        .values_list("status")
+        .annotate(n=Sum("count"))
+    )
+    by_department = (
+        DailyAttendanceSummary.objects
+        .filter(date=today)
+        .values("department")
+        .annotate(n=Sum("count"))
+        .order_by("department")
     )
 
-    total = records.count()
-    verified = records.filter(status="verified").count()
-    unverified = records.filter(status="unverified").count()
+    total = sum(by_status.values())
+    verified = by_status.get("verified", 0)
+    unverified = by_status.get("unverified", 0)
+    departments = "\n".join(f"  {d['department'] or '-'}: {d['n']}" for d in by_department)
 
     msg = (
         f"Daily Attendance Report\n\n"
         f"Date: {today}\n"
         f"Total Check-ins: {total}\n"
         f"Verified: {verified}\n"
-        f"Unverified: {unverified}\n\n"
+        f"Unverified: {unverified}\n"
+        f"Pending Review: {by_status.get('pending', 0)}\n\n"
+        f"By Department:\n{departments}\n\n"
         f"HRMS AI Attendance System"
     )
 
@@ -189,3 +186,122 @@ def generate_daily_reports():
     )
 
     return {"report_sent": True, "total": total}
+
+
+# -------------------------------------------------------------------
+# 5. IMAGE DERIVATIVES (thumbnail + face crop for review screens)
+# -------------------------------------------------------------------
+
+@shared_task
+def generate_image_derivatives(image_path, attendance_id=None, profile_id=None, bbox=None):
+    """
+    Build the thumbnail / face crop for a verification image or a
+    registration photo and store their URLs on the owning row.
+    """
+    if not os.path.exists(image_path):
+        return {"status": "error", "message": "Image not found"}
+
+    urls = generate_derivatives(image_path, bbox=bbox)
+
+    # update() keeps this off post_save and away from concurrent review edits
+    if attendance_id:
+        RemoteAttendance.objects.filter(id=attendance_id).update(**urls)
+    if profile_id:
+        FaceProfile.objects.filter(id=profile_id).update(**urls)
+
+    return {"status": "ok", **urls}
+
+
+# -------------------------------------------------------------------
+# 6. BULK REVIEW (large approve/reject batches)
+# -------------------------------------------------------------------
+
+@shared_task(bind=True)
+def bulk_review_attendance(self, action, reviewer_id, notes="", attendance_ids=None, filters=None, ip_address=None):
+    """
+    Approve/reject pending attendance in chunks of matching ids, reporting
+    progress through the task state (PROGRESS: done_chunks/total_chunks).
+    """
+    queryset = pending_queryset(attendance_ids, filters)
+
+    def progress(done, total):
+        self.update_state(state="PROGRESS", meta={"done_chunks": done, "total_chunks": total})
+
+    updated = apply_review(queryset, action, reviewer_id, notes, progress=progress)
+    audit_bulk_review(reviewer_id, action, updated, attendance_ids, filters, ip_address)
+
+    return {"status": "ok", "action": action, "updated": updated}
+
+
+# -------------------------------------------------------------------
+# 7. AUDIT LOG FALLBACK (batches the in-process sink could not insert)
+# -------------------------------------------------------------------
+
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=5)
+def write_audit_entries(entries):
+    """
+    entries: JSON-serialised AuditLog field dicts from AuditSink.flush().
+    """
+    rows = []
+    for entry in entries:
+        entry = dict(entry)
+        if entry.get("timestamp"):
+            entry["timestamp"] = parse_datetime(entry["timestamp"])
+        rows.append(AuditLog(**entry))
+
+    AuditLog.objects.bulk_create(rows, batch_size=500)
+    return {"status": "ok", "written": len(rows)}
+
+
+# -------------------------------------------------------------------
+# 8. AUDIT LOG RETENTION (archive + delete old rows)
+# -------------------------------------------------------------------
+
+@shared_task
+def archive_audit_logs(days=None):
+    """
+    Stream AuditLog rows older than AUDIT_RETENTION_DAYS into the
+    compressed daily archives and delete them in chunks.
+    """
+    result = audit_archive.archive_older_than(days)
+    return {"status": "ok", "archived": result["archived"], "days": [d.isoformat() for d in result["days"]]}
+
+
+# -------------------------------------------------------------------
+# 9. GALLERY RE-EMBEDDING (model upgrades)
+# -------------------------------------------------------------------
+
+@shared_task
+def reembed_profiles(version_id, profile_ids):
+    """
+    Embed one chunk of profiles for an EmbeddingVersion. Each worker
+    process keeps its own model loaded across chunks; already embedded
+    profiles are skipped, so re-delivered chunks are harmless.
+    """
+    version = EmbeddingVersion.objects.get(id=version_id)
+    rows = (
+        reembed.missing_profiles(version)
+        .filter(id__in=profile_ids)
+        .values_list("id", "image_url", "user__username")
+    )
+    items = [(pk, reembed.enrollment_image(pk, url, username)) for pk, url, username in rows]
+    if not items:
+        return {"status": "ok", "embedded": 0, "failed": 0}
+
+    done = reembed.store_results(version, embed_enrollment_images(items, version.model_pack))
+    return {"status": "ok", **done}
+
+
+# -------------------------------------------------------------------
+# 10. NOTIFICATION DIGESTS (own queue so SMTP stalls never block other work)
+# -------------------------------------------------------------------
+
+@shared_task
+def flush_notifications():
+    """
+    Mail queued notification events: one digest per recipient, all over
+    one mail connection. Runs on beat every NOTIFY_DIGEST_INTERVAL and
+    early for events at or above NOTIFY_IMMEDIATE_MIN_SEVERITY.
+    """
+
+    return notifications.flush()
@@ -1,3 +1,487 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.views import APIView
+
+from .models import (
+    AttendanceAnomaly, EmbeddingVersion, FaceEmbedding, FaceProfile, KioskDevice, NotificationEvent, RemoteAttendance,
+)
+from .services import anomaly_engine, checkin_window, gallery, image_cleanup, notifications, reembed, review
+from .services.face_recognition import DEFAULT_ENCODING_VERSION
+from .utils.crypto import decrypt_array, encrypt_array
+from .utils.idempotency import idempotent_view
+from .utils import timing
+from .services.gallery_index import GalleryIndex
+
+User = get_user_model()
+
+
+class PendingReviewQueueTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username="admin", password="x", employee_id="ADM-1", is_staff=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _make_pending(self, n, prefix):
+        for i in range(n):
+            user = User.objects.create_user(
+                username=f"{prefix}{i}", password="x", employee_id=f"{prefix}-{i}", department="ops"
+            )
+            FaceProfile.objects.create(user=user, face_crop_url=f"/media/derivatives/{prefix}{i}_face.jpg")
+            RemoteAttendance.objects.create(
+                user=user, check_in_time=timezone.now(), status="pending", confidence_score=0.7
+            )
+
+    def _get(self, url="/api/review/pending/"):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_query_count_does_not_grow_with_queue(self):
+        self._make_pending(2, "a")
+        small, _ = self._get()
+
+        self._make_pending(20, "b")
+        large, response = self._get()
+
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.data["results"]), 22)
+        self.assertTrue(all(r["registered_face_url"] for r in response.data["results"]))
+
+    def test_keyset_pages_cover_queue_once(self):
+        self._make_pending(7, "c")
+
+        seen = []
+        url = "/api/review/pending/?limit=3"
+        while url:
+            _, response = self._get(url)
+            seen.extend(r["id"] for r in response.data["results"])
+            cursor = response.data["next_cursor"]
+            url = f"/api/review/pending/?limit=3&cursor={cursor}" if cursor else None
+
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+
+    def test_bulk_review_walks_matching_ids(self):
+        self._make_pending(5, "d")
+        RemoteAttendance.objects.filter(user__username="d2").update(status="approved")
+        calls = []
+        with mock.patch.object(review, "BULK_CHUNK_SIZE", 2):
+            updated = review.apply_review(
+                review.pending_queryset(), "approve", self.admin.id, progress=lambda *p: calls.append(p)
+            )
+        self.assertEqual(updated, 4)
+        self.assertEqual(calls, [(1, 2), (2, 2)])
+        self.assertFalse(RemoteAttendance.objects.filter(status="pending").exists())
+
+
+class _IdempotentView(APIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    calls = []
+    release = None
+
+    @idempotent_view("test")
+    def post(self, request):
+        self.calls.append(request.data.get("photo"))
+        if self.release is not None:
+            self.release.wait(5)
+        if request.data.get("photo") == "blurry":
+            return Response({"status": "quality_rejected"}, status=422)
+        return Response({"attendance_id": len(self.calls)}, status=200)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class IdempotencyTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        _IdempotentView.calls = []
+        _IdempotentView.release = None
+        self.view = _IdempotentView.as_view()
+
+    def _post(self, photo, key="k-1"):
+        request = APIRequestFactory().post("/", {"photo": photo}, format="json", HTTP_IDEMPOTENCY_KEY=key)
+        return self.view(request)
+
+    def test_replays_same_body(self):
+        first = self._post("good")
+        second = self._post("good")
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(_IdempotentView.calls, ["good"])
+
+    def test_rejection_is_not_cached(self):
+        self.assertEqual(self._post("blurry").status_code, 422)
+        # same key, better photo: handled, not replayed or refused
+        response = self._post("good")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(_IdempotentView.calls, ["blurry", "good"])
+
+    def test_key_reuse_with_different_body(self):
+        self._post("good")
+        response = self._post("other")
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(_IdempotentView.calls, ["good"])
+
+    def test_concurrent_duplicate_waits_for_result(self):
+        _IdempotentView.release = threading.Event()
+        results = {}
+        first = threading.Thread(target=lambda: results.setdefault("first", self._post("good")))
+        first.start()
+        while not _IdempotentView.calls:
+            threading.Event().wait(0.01)
+
+        second = threading.Thread(target=lambda: results.setdefault("second", self._post("good")))
+        second.start()
+        self.assertEqual(self._post("other").status_code, 422)  # in flight with another body
+        _IdempotentView.release.set()
+        first.join()
+        second.join()
+
+        self.assertEqual(results["second"].data, results["first"].data)
+        self.assertEqual(_IdempotentView.calls, ["good"])
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class SharedStageTimingTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_task_stages_are_reported_from_the_cache(self):
+        for ms in (5, 5, 40, 700):
+            timing.record_shared("task_verify_embed", ms)
+        with timing.stage("web_only"):
+            pass
+        report = timing.shared_stage_percentiles(minutes=5)
+        self.assertEqual(list(report), ["task_verify_embed"])
+        row = report["task_verify_embed"]
+        self.assertEqual(row["count"], 4)
+        self.assertEqual(row["p50_ms"], 10)
+        self.assertEqual(row["p99_ms"], 1000)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CheckinWindowTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="w", password="x", employee_id="W-1")
+
+    def _check_in(self, n):
+        for _ in range(n):
+            RemoteAttendance.objects.create(user=self.user, check_in_time=timezone.now(), status="pending")
+
+    def test_counts_checkins_from_cache(self):
+        self._check_in(3)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(checkin_window.recent_checkins(self.user.id), 3)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_checkin_after_window_does_not_rebuild(self):
+        self._check_in(1)
+        # an hour later: the buckets have expired, the seeded marker has not
+        buckets = checkin_window._window_buckets(timezone.now())
+        cache.delete_many([checkin_window._bucket_key(self.user.id, b) for b in buckets])
+        with CaptureQueriesContext(connection) as ctx:
+            checkin_window.record_checkin(self.user.id, timezone.now())
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_rebuilds_after_cache_flush(self):
+        self._check_in(4)
+        cache.clear()
+        self.assertEqual(checkin_window.recent_checkins(self.user.id), 4)
+        self._check_in(1)
+        self.assertEqual(checkin_window.recent_checkins(self.user.id), 5)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class AnomalyEngineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="a", password="x", employee_id="A-1")
+
+    def _queued(self, confidence, geolocation):
+        return RemoteAttendance.objects.create(
+            user=self.user, check_in_time=timezone.now(), status="verified",
+            confidence_score=confidence, geolocation=geolocation, anomaly_check="pending",
+        )
+
+    def test_drains_queue_once(self):
+        low = self._queued(0.3, {"lat": 1, "lng": 2})
+        no_geo = self._queued(0.9, None)
+        self._queued(0.9, {"lat": 1, "lng": 2})
+
+        result = anomaly_engine.drain(batch_size=2)
+        self.assertEqual(result["analysed"], 3)
+        self.assertEqual(
+            sorted(result["found"]),
+            sorted([(low.id, "a", "low_confidence", "high"), (no_geo.id, "a", "missing_geolocation", "medium")]),
+        )
+        self.assertEqual(
+            set(AttendanceAnomaly.objects.values_list("attendance_id", "anomaly_type")),
+            {(low.id, "low_confidence"), (no_geo.id, "missing_geolocation")},
+        )
+
+        # analysed rows are never queued or analysed again
+        low.refresh_from_db()
+        self.assertFalse(anomaly_engine.queue(low))
+        self.assertEqual(anomaly_engine.drain()["analysed"], 0)
+
+
+class NotificationDigestTests(TestCase):
+    def setUp(self):
+        self.outbox = tempfile.TemporaryDirectory()
+        self.addCleanup(self.outbox.cleanup)
+
+    def test_one_digest_per_recipient_over_one_connection(self):
+        events = [
+            ("high", "Anomaly 1", "first"),
+            ("high", "Anomaly 2", "second"),
+            ("medium", "Ignored", "below the digest threshold"),
+        ]
+        self.assertEqual(notifications.queue(events, recipients=["a@example.com", "b@example.com"]), 4)
+
+        backend = "django.core.mail.backends.filebased.EmailBackend"
+        with self.settings(EMAIL_BACKEND=backend, EMAIL_FILE_PATH=self.outbox.name):
+            result = notifications.flush()
+            self.assertEqual(result, {"events": 4, "emails": 2, "failed": 0, "given_up": 0})
+            self.assertEqual(notifications.flush()["events"], 0)
+
+        # the file backend writes one file per connection
+        files = os.listdir(self.outbox.name)
+        self.assertEqual(len(files), 1)
+        with open(os.path.join(self.outbox.name, files[0])) as fh:
+            content = fh.read()
+        self.assertEqual(content.count("Attendance alerts digest: 2 events"), 2)
+        self.assertFalse(NotificationEvent.objects.filter(sent_at__isnull=True).exists())
+
+    def test_claimed_events_wait_for_the_lease(self):
+        notifications.queue([("high", "Anomaly", "body")], recipients=["a@example.com"])
+        # a flush that died after claiming
+        self.assertEqual(len(notifications._claim(10)), 1)
+        backend = "django.core.mail.backends.locmem.EmailBackend"
+        with self.settings(EMAIL_BACKEND=backend):
+            self.assertEqual(notifications.flush()["events"], 0)
+            NotificationEvent.objects.update(claimed_until=timezone.now() - timedelta(seconds=1))
+            self.assertEqual(notifications.flush()["events"], 1)
+
+    def test_failing_recipient_is_given_up_after_max_attempts(self):
+        notifications.queue([("high", "Anomaly", "body")], recipients=["a@example.com"])
+        backend = "django.core.mail.backends.locmem.EmailBackend"
+        with self.settings(EMAIL_BACKEND=backend), \
+                mock.patch("django.core.mail.backends.locmem.EmailBackend.send_messages", side_effect=OSError):
+            for _ in range(notifications.MAX_ATTEMPTS - 1):
+                self.assertEqual(notifications.flush()["given_up"], 0)
+            self.assertEqual(notifications.flush()["given_up"], 1)
+            self.assertEqual(notifications.flush()["events"], 0)
+        event = NotificationEvent.objects.get()
+        self.assertIsNone(event.sent_at)
+        self.assertIsNotNone(event.failed_at)
+        self.assertEqual(event.attempts, notifications.MAX_ATTEMPTS)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TodayStatusCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="t", password="x", employee_id="T-1")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_poll_is_served_from_cache_after_checkin(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            RemoteAttendance.objects.create(user=self.user, check_in_time=timezone.now(), status="pending")
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/attendance/today/")
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertTrue(response.data["checked_in"])
+
+        response = self.client.get("/api/attendance/today/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+
+class ImageCleanupTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.user = User.objects.create_user(username="i", password="x", employee_id="I-1")
+
+    def _file(self, relative):
+        path = os.path.join(self.media.name, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as fh:
+            fh.write(b"x" * 10)
+        return path
+
+    def _attendance(self, name, age_days):
+        paths = [self._file(f"uploads/{name}"), self._file(f"derivatives/thumb_{name}"),
+                 self._file(f"derivatives/crop_{name}")]
+        RemoteAttendance.objects.create(
+            user=self.user,
+            check_in_time=timezone.now() - timedelta(days=age_days),
+            status="verified",
+            verification_image_url=f"/media/uploads/{name}",
+            thumbnail_url=f"/media/derivatives/thumb_{name}",
+            face_crop_url=f"/media/derivatives/crop_{name}",
+        )
+        return paths
+
+    def test_removes_expired_images_once(self):
+        with self.settings(MEDIA_ROOT=self.media.name, MEDIA_URL="/media/"):
+            old = self._attendance("old.jpg", 40)
+            new = self._attendance("new.jpg", 1)
+
+            dry = image_cleanup.cleanup_expired_images(30, dry_run=True)
+            self.assertEqual(dry["deleted"], 3)
+            self.assertTrue(all(os.path.exists(p) for p in old))
+
+            metrics = image_cleanup.cleanup_expired_images(30, chunk_size=1)
+            self.assertEqual((metrics["deleted"], metrics["rows_updated"]), (3, 1))
+            # the verification image and its thumbnail / face crop are gone
+            self.assertFalse(any(os.path.exists(p) for p in old))
+            self.assertTrue(all(os.path.exists(p) for p in new))
+            self.assertFalse(
+                RemoteAttendance.objects.filter(check_in_time__lt=timezone.now() - timedelta(days=30))
+                .exclude(thumbnail_url__isnull=True, face_crop_url__isnull=True).exists()
+            )
+
+            self.assertEqual(image_cleanup.cleanup_expired_images(30)["scanned"], 0)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class GalleryShardTests(TestCase):
+    def setUp(self):
+        import numpy as np
+
+        cache.clear()
+        self.rng = np.random.default_rng(1)
+        KioskDevice.objects.create(device_id="lhr-kiosk-1", shard="Lahore")
+        self.lahore = self._enroll("l1", "Lahore")
+        self.karachi = self._enroll("k1", "Karachi")
+
+    def _enroll(self, username, department):
+        user = User.objects.create_user(
+            username=username, password="x", employee_id=username.upper(), department=department
+        )
+        emb = self.rng.standard_normal(512)
+        with self.captureOnCommitCallbacks(execute=True):
+            FaceProfile.objects.create(user=user, face_encoding=emb.tolist(), is_active=True)
+        return user, emb
+
+    def test_shard_first_then_global_fallback(self):
+        shard = gallery.shard_for_device({"device_id": "lhr-kiosk-1"})
+        self.assertEqual(shard, "Lahore")
+        self.assertIsNone(gallery.shard_for_device({"device_id": "unknown"}))
+
+        user, emb = self.lahore
+        self.assertEqual(gallery.identify_in_shard(emb, shard)[::2], (user.id, "Lahore"))
+
+        # not in the Lahore shard: found by the global fallback
+        user, emb = self.karachi
+        self.assertEqual(gallery.identify_in_shard(emb, shard)[::2], (user.id, "global"))
+
+        # a new Lahore enrollment rebuilds the shard index
+        user, emb = self._enroll("l2", "Lahore")
+        self.assertEqual(gallery.identify_in_shard(emb, shard)[::2], (user.id, "Lahore"))
+
+    def test_kiosk_trust_and_strict_thresholds(self):
+        self.assertTrue(gallery.is_registered_kiosk({"device_id": "lhr-kiosk-1"}))
+        self.assertFalse(gallery.is_registered_kiosk({"device_id": "laptop"}))
+        self.assertGreaterEqual(gallery.match_threshold(strict=True), gallery.MATCH_THRESHOLD)
+        self.assertGreaterEqual(gallery.auto_approve_threshold(strict=True), gallery.AUTO_APPROVE_THRESHOLD)
+
+    def test_background_recheck_never_upgrades_the_checkin(self):
+        from .tasks import process_face_verification
+
+        user, emb = self.lahore
+        held = RemoteAttendance.objects.create(user=user, check_in_time=timezone.now(), status="pending")
+        wrong = RemoteAttendance.objects.create(user=user, check_in_time=timezone.now(), status="verified")
+        with mock.patch.object(anomaly_engine, "schedule_drain"), \
+                mock.patch("attendance_ai.tasks.FaceRecognitionService.extract_face_encoding") as extract:
+            extract.return_value = emb
+            process_face_verification(held.id, "unused.jpg")
+            extract.return_value = self.karachi[1]
+            process_face_verification(wrong.id, "unused.jpg")
+
+        held.refresh_from_db()
+        wrong.refresh_from_db()
+        self.assertEqual(held.status, "pending")
+        self.assertEqual(wrong.status, "unverified")
+
+    def test_cohort_sample_without_random_ordering(self):
+        others = [self._enroll(f"c{i}", "Karachi")[0].id for i in range(4)]
+        FaceProfile.objects.filter(user_id=others[0]).update(is_active=False)
+        with CaptureQueriesContext(connection) as ctx:
+            rows = gallery._random_profile_rows(3)
+        self.assertFalse(any("RANDOM()" in q["sql"].upper() for q in ctx.captured_queries))
+        user_ids = [uid for uid, _ in rows]
+        self.assertEqual(len(user_ids), 3)
+        self.assertEqual(len(set(user_ids)), 3)
+        self.assertNotIn(others[0], user_ids)
+        # asking for more than exist returns every active profile
+        self.assertEqual(len(gallery._random_profile_rows(50)), 5)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ReembedTests(TestCase):
+    def test_reregister_during_build_then_activate(self):
+        user = User.objects.create_user(username="r", password="x", employee_id="R-1")
+        profile = FaceProfile.objects.create(user=user, face_encoding=encrypt_array([1.0, 0.0]), is_active=True)
+        live = EmbeddingVersion.objects.create(name=DEFAULT_ENCODING_VERSION, model_pack="old", status="active")
+        # left over from an earlier build of the live version
+        FaceEmbedding.objects.create(profile=profile, version=live, encoding=encrypt_array([9.0, 9.0]))
+
+        new = reembed.get_version("v2", "new_pack")
+        reembed.store_results(new, [(profile.id, [0.5, 0.5], None)])
+
+        # re-registration with a new photo mid-build
+        profile.face_encoding = encrypt_array([0.0, 1.0])
+        profile.save()
+        reembed.discard_stale_embeddings([profile.id])
+
+        with self.assertRaises(ValueError):
+            reembed.activate(new)
+
+        reembed.store_results(new, [(profile.id, [0.3, 0.7], None)])
+        reembed.activate(new)
+
+        profile.refresh_from_db()
+        self.assertEqual(decrypt_array(profile.face_encoding), [0.3, 0.7])
+        # the rollback snapshot holds the live encoding, not the stale row
+        snapshot = FaceEmbedding.objects.get(profile=profile, version=live)
+        self.assertEqual(decrypt_array(snapshot.encoding), [0.0, 1.0])
+
+
+class GalleryIndexTests(SimpleTestCase):
+    def test_compressed_search_agrees_with_exact_scan(self):
+        import numpy as np
+
+        rng = np.random.default_rng(0)
+        gallery = rng.standard_normal((2000, 512)).astype(np.float32)
+        gallery /= np.linalg.norm(gallery, axis=1, keepdims=True)
+        exact = GalleryIndex(np.arange(2000) + 100, gallery)
+
+        for dims, dtype in ((0, "int8"), (128, "float16"), (128, "int8")):
+            index = GalleryIndex(np.arange(2000) + 100, gallery, dims=dims, dtype=dtype)
+            self.assertLess(index.coarse_nbytes, exact.full_nbytes)
+            for row in (0, 777, 1999):
+                probe = gallery[row] + 0.05 * rng.standard_normal(512).astype(np.float32)
+                user_id, score = index.search(probe, top_k=32)
+                want_id, want_score = exact.search(probe, top_k=2000)
+                self.assertEqual(user_id, want_id)
+                self.assertAlmostEqual(score, want_score, places=5)
@@ -9,7 +9,12 @@ from .views_admin import (
    ApproveAttendanceView,
    RejectAttendanceView,
    BatchApproveView,
-   AnomalyListView
+   BatchRejectView,
+   BulkReviewView,
+   BulkReviewStatusView,
+   AnomalyListView,
+   StageTimingsView,
+   AttendanceSummaryView,
 )
 
 urlpatterns = [
@@ -34,8 +39,17 @@ urlpatterns = [
     path("review/approve/", ApproveAttendanceView.as_view()),
     path("review/reject/", RejectAttendanceView.as_view()),
     path("review/batch-approve/", BatchApproveView.as_view()),
+    path("review/batch-reject/", BatchRejectView.as_view()),
+    path("review/bulk/", BulkReviewView.as_view(), name="review_bulk"),
+    path("review/bulk/<str:task_id>/", BulkReviewStatusView.as_view(), name="review_bulk_status"),
     path("review/anomalies/", AnomalyListView.as_view()),
 
+    # Reports from the daily rollup (admin only)
+    path("reports/summary/", AttendanceSummaryView.as_view(), name="attendance_summary"),
+
+    # Per-stage latency percentiles (admin only)
+    path("metrics/timings/", StageTimingsView.as_view(), name="stage_timings"),
+
 
     # Optional UI test page
     path("checkin/", checkin_page, name="ui_checkin"),
@@ -1,6 +1,117 @@
 # attendance_ai/utils/audit.py
-from attendance_ai.models import AuditLog
+import json
+import atexit
+import logging
+import threading
 from functools import wraps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.utils import timezone
+from attendance_ai.models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+AUDIT_BUFFER_SIZE = getattr(settings, "AUDIT_BUFFER_SIZE", 200)       # flush when this many entries are queued
+AUDIT_FLUSH_INTERVAL = getattr(settings, "AUDIT_FLUSH_INTERVAL", 2.0)  # ... or this many seconds after the first
+# one "attendance_checkin" entry per check-in instead of checkin + attendance_created
+AUDIT_MERGE_CHECKIN_ENTRIES = getattr(settings, "AUDIT_MERGE_CHECKIN_ENTRIES", False)
+
+
+class AuditSink:
+    """
+    In-process buffer of AuditLog rows, written with bulk_create when it
+    reaches AUDIT_BUFFER_SIZE or AUDIT_FLUSH_INTERVAL seconds after the
+    first queued entry. If the insert fails the batch is handed to the
+    write_audit_entries Celery task.
+    Entries still in the buffer when the process is killed (crash, OOM,
+    SIGKILL) are lost: at most AUDIT_BUFFER_SIZE entries or
+    AUDIT_FLUSH_INTERVAL seconds' worth. atexit only covers clean exits.
+    Set AUDIT_BUFFERED = False where that is not acceptable.
+    """
+
+    def __init__(self, max_size=AUDIT_BUFFER_SIZE, interval=AUDIT_FLUSH_INTERVAL):
+        self.max_size = max_size
+        self.interval = interval
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def emit(self, entry: dict):
+        with self._lock:
+            self._buffer.append(entry)
+            full = len(self._buffer) >= self.max_size
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.interval, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # timer threads get their own DB connection; don't leak it
+            connection.close()
+
+    def flush(self) -> int:
+        with self._lock:
+            entries, self._buffer = self._buffer, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not entries:
+            return 0
+
+        try:
+            AuditLog.objects.bulk_create([AuditLog(**e) for e in entries], batch_size=500)
+        except Exception:
+            logger.exception("Audit bulk insert failed, handing %d entries to Celery", len(entries))
+            try:
+                from attendance_ai.tasks import write_audit_entries
+                write_audit_entries.delay(json.loads(json.dumps(entries, cls=DjangoJSONEncoder)))
+            except Exception:
+                logger.exception("Audit Celery fallback failed; %d entries lost", len(entries))
+        return len(entries)
+
+
+_sink = AuditSink()
+atexit.register(_sink.flush)
+
+
+def get_audit_sink() -> AuditSink:
+    return _sink
+
+
+def _buffered() -> bool:
+    # read per call so override_settings works; off under tests (settings.TESTING)
+    return getattr(settings, "AUDIT_BUFFERED", True)
+
+
+def audit_log(action, actor=None, target_repr="", extra=None, ip_address=None):
+    """
+    Record an audit entry off the request path (see AuditSink).
+    actor may be a user, an AnonymousUser, a user id or None.
+    """
+    if isinstance(actor, int) or actor is None:
+        actor_id = actor
+    else:
+        actor_id = actor.pk if getattr(actor, "is_authenticated", False) else None
+
+    entry = {
+        "actor_id": actor_id,
+        "action": action,
+        "target_repr": str(target_repr)[:255],
+        "extra": extra,
+        "ip_address": ip_address,
+        "timestamp": timezone.now(),
+    }
+    if _buffered():
+        _sink.emit(entry)
+    else:
+        AuditLog.objects.create(**entry)
+
 
 def audit_action(action_name):
     def decorator(func):
@@ -9,9 +120,9 @@ def audit_action(action_name):
             response = func(view_self, request, *args, **kwargs)
             try:
                 # best effort - create a log entry
-                AuditLog.objects.create(
-                    actor=request.user if getattr(request, "user", None) and request.user.is_authenticated else None,
-                    action=action_name,
+                audit_log(
+                    action_name,
+                    actor=getattr(request, "user", None),
                     target_repr=getattr(response, "data", {}) or "",
                     extra={"path": request.path},
                     ip_address=request.META.get("REMOTE_ADDR")
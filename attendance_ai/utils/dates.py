@@ -0,0 +1,16 @@
+# attendance_ai/utils/dates.py
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+
+
+def local_day_bounds(day=None, tz=None):
+    """
+    [start, end) of a local calendar day as aware datetimes.
+    Filtering check_in_time on this range (instead of check_in_time__date)
+    keeps the query sargable, so the (user, check_in_time) indexes apply.
+    """
+    tz = tz or timezone.get_current_timezone()
+    day = day or timezone.localdate(timezone=tz)
+    start = timezone.make_aware(datetime.combine(day, time.min), tz)
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min), tz)
+    return start, end
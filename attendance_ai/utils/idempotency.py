@@ -0,0 +1,162 @@
+# attendance_ai/utils/idempotency.py
+import json
+import time
+import hashlib
+import threading
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from attendance_ai.utils.timing import stage
+
+RESULT_TTL = getattr(settings, "IDEMPOTENCY_TTL_SECONDS", 24 * 3600)   # how long a result is replayed
+IN_FLIGHT_TTL = getattr(settings, "IDEMPOTENCY_IN_FLIGHT_SECONDS", 60)  # claim expiry if the owner dies
+WAIT_TIMEOUT = getattr(settings, "IDEMPOTENCY_WAIT_SECONDS", 30)        # how long duplicates wait
+POLL_INTERVAL = 0.1
+MAX_KEY_LENGTH = 255
+
+# duplicates inside the same process wait on an Event instead of polling
+_local_lock = threading.Lock()
+_local_inflight = {}
+
+
+def _cache_base(scope, request, key):
+    if getattr(request, "user", None) and request.user.is_authenticated:
+        owner = f"user:{request.user.id}"
+    else:
+        owner = f"ip:{request.META.get('REMOTE_ADDR', 'anon')}"
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f"idem:{scope}:{owner}:{digest}"
+
+
+def _fingerprint(request) -> str:
+    """
+    sha256 of the request body as parsed by DRF (uploaded files by content),
+    so a reused key can be told apart from a genuine retry.
+    """
+    digest = hashlib.sha256()
+    data = request.data
+    if hasattr(data, "lists"):
+        items = data.lists()
+    elif isinstance(data, dict):
+        items = ((k, [v]) for k, v in data.items())
+    else:
+        items = [("", [data])]
+    for name, values in sorted(items, key=lambda item: item[0]):
+        digest.update(name.encode() + b"\0")
+        for value in values:
+            if hasattr(value, "chunks"):
+                for chunk in value.chunks():
+                    digest.update(chunk)
+                value.seek(0)
+            else:
+                digest.update(json.dumps(value, sort_keys=True, default=str).encode())
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _key_reused():
+    return Response(
+        {"detail": "Idempotency-Key was already used with a different request body"},
+        status=422
+    )
+
+
+def _replay(cached, key):
+    response = Response(cached["data"], status=cached["status"])
+    response["Idempotency-Key"] = key
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _wait_for_result(base, result_key, lock_key):
+    with _local_lock:
+        event = _local_inflight.get(base)
+    if event is not None:
+        event.wait(WAIT_TIMEOUT)
+        return cache.get(result_key)
+
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        cached = cache.get(result_key)
+        if cached is not None:
+            return cached
+        if cache.get(lock_key) is None:
+            # owner finished without storing a result (4xx/5xx) -> caller may retry
+            return None
+    return None
+
+
+def idempotent_view(scope: str):
+    """
+    Decorator for APIView POST handlers honouring an Idempotency-Key header.
+    - first request with a key runs the handler and caches (status, data)
+      together with a fingerprint of the request body
+    - retries with the same key and body replay the cached result
+    - concurrent duplicates wait for the in-flight request instead of
+      running the handler again
+    - the same key with a different body gets 422
+    Only 2xx/3xx results are cached: after a 4xx (e.g. the 422 quality
+    rejection) or 5xx the client may retry the key, with a better photo.
+    Requests without the header are handled normally.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(view_self, request, *args, **kwargs):
+            key = request.headers.get("Idempotency-Key")
+            if not key:
+                return func(view_self, request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response({"detail": "Idempotency-Key too long"}, status=400)
+
+            base = _cache_base(scope, request, key)
+            result_key = f"{base}:result"
+            lock_key = f"{base}:lock"
+
+            with stage("idempotency_lookup"):
+                fingerprint = _fingerprint(request)
+                cached = cache.get(result_key)
+            if cached is not None:
+                if cached.get("fingerprint") != fingerprint:
+                    return _key_reused()
+                return _replay(cached, key)
+
+            if not cache.add(lock_key, fingerprint, IN_FLIGHT_TTL):
+                owner = cache.get(lock_key)
+                if owner is not None and owner != fingerprint:
+                    return _key_reused()
+                with stage("idempotency_wait"):
+                    cached = _wait_for_result(base, result_key, lock_key)
+                if cached is not None:
+                    if cached.get("fingerprint") != fingerprint:
+                        return _key_reused()
+                    return _replay(cached, key)
+                response = Response(
+                    {"detail": "A request with this Idempotency-Key is still in progress"},
+                    status=409
+                )
+                response["Retry-After"] = "1"
+                return response
+
+            event = threading.Event()
+            with _local_lock:
+                _local_inflight[base] = event
+            try:
+                response = func(view_self, request, *args, **kwargs)
+                if response.status_code < 400:
+                    cache.set(
+                        result_key,
+                        {"status": response.status_code, "data": response.data, "fingerprint": fingerprint},
+                        RESULT_TTL,
+                    )
+                response["Idempotency-Key"] = key
+                return response
+            finally:
+                cache.delete(lock_key)
+                with _local_lock:
+                    _local_inflight.pop(base, None)
+                event.set()
+        return wrapper
+    return decorator
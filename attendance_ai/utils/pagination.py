@@ -0,0 +1,120 @@
+# attendance_ai/utils/pagination.py
+import json
+import base64
+import hashlib
+from datetime import date
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime, parse_date
+from django.utils.http import quote_etag, parse_etags
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+EXACT_COUNT_BELOW = 1000  # planner estimates under this are replaced by a real COUNT
+
+
+class CursorError(ValueError):
+    pass
+
+
+def encode_cursor(ts, pk) -> str:
+    raw = json.dumps([ts.isoformat(), pk], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        parsed = parse_datetime(ts)
+        if parsed is None:
+            raise CursorError("invalid cursor")
+        return parsed, int(pk)
+    except (ValueError, TypeError) as exc:
+        raise CursorError("invalid cursor") from exc
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE) -> int:
+    try:
+        limit = int(value) if value not in (None, "") else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, maximum))
+
+
+def parse_day(value):
+    """
+    'YYYY-MM-DD' -> date, None/'' -> None, anything else -> ValueError.
+    """
+    if not value:
+        return None
+    day = parse_date(value)
+    if not isinstance(day, date):
+        raise ValueError(f"invalid date: {value}")
+    return day
+
+
+def keyset_page(queryset, cursor=None, limit=DEFAULT_PAGE_SIZE, time_field="check_in_time"):
+    """
+    Newest-first keyset page over (time_field, id).
+    queryset may already be projected with .values(); it must include
+    time_field and "id". Cost per page is one index range scan of limit+1
+    rows regardless of how deep the page is.
+    Returns (rows, next_cursor or None).
+    """
+    qs = queryset.filter(**{f"{time_field}__isnull": False})
+    if cursor:
+        ts, pk = decode_cursor(cursor)
+        qs = qs.filter(Q(**{f"{time_field}__lt": ts}) | Q(**{time_field: ts, "id__lt": pk}))
+
+    rows = list(qs.order_by(f"-{time_field}", "-id")[: limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        if isinstance(last, dict):
+            next_cursor = encode_cursor(last[time_field], last["id"])
+        else:
+            next_cursor = encode_cursor(getattr(last, time_field), last.id)
+    return rows, next_cursor
+
+
+def payload_etag(payload) -> str:
+    body = json.dumps(payload, cls=DjangoJSONEncoder, sort_keys=True).encode()
+    return quote_etag(hashlib.md5(body).hexdigest())
+
+
+def etag_matches(request, etag: str) -> bool:
+    header = request.META.get("HTTP_IF_NONE_MATCH")
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return "*" in etags or _opaque(etag) in {_opaque(e) for e in etags}
+
+
+def _opaque(tag: str) -> str:
+    return tag.removeprefix("W/").strip('"')
+
+
+def estimated_count(queryset):
+    """
+    Cheap total for paginated lists: on PostgreSQL the planner's row
+    estimate for the filtered query (no scan); small results, and other
+    databases, fall back to an exact COUNT.
+    Returns (count, is_estimate).
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        sql, params = queryset.order_by().values("id").query.sql_with_params()
+        with connection.cursor() as cur:
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cur.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+        if estimate >= EXACT_COUNT_BELOW:
+            return estimate, True
+    return queryset.count(), False
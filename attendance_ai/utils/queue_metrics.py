@@ -0,0 +1,74 @@
+# attendance_ai/utils/queue_metrics.py
+import time
+from django.core.cache import cache
+
+# cumulative histogram edges for queue wait (enqueue -> task start), seconds
+LATENCY_BUCKETS = (0.1, 0.5, 1, 5, 15, 60, 300)
+MINUTE_TTL = 2 * 3600  # per-minute counters kept this long
+ENQUEUED_AT_HEADER = "enqueued_at"
+
+
+def _minute(ts=None) -> int:
+    return int(ts or time.time()) // 60
+
+
+def _key(queue, minute, field) -> str:
+    return f"celery_latency:{queue}:{minute}:{field}"
+
+
+def _incr(key, delta=1):
+    cache.add(key, 0, MINUTE_TTL)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, MINUTE_TTL)
+
+
+def stamp_headers(headers: dict):
+    """
+    before_task_publish: remember when the message was sent.
+    """
+    if headers is not None:
+        headers.setdefault(ENQUEUED_AT_HEADER, time.time())
+
+
+def record_start(queue: str, enqueued_at):
+    """
+    task_prerun: add this task's queue wait to the per-minute counters
+    (count, total ms, histogram bucket). Atomic cache INCRs, so every
+    worker process on every host feeds the same numbers.
+    """
+    if not queue or not enqueued_at:
+        return
+    waited = max(0.0, time.time() - float(enqueued_at))
+    minute = _minute()
+    _incr(_key(queue, minute, "count"))
+    _incr(_key(queue, minute, "sum_ms"), int(waited * 1000))
+    bucket = next((str(edge) for edge in LATENCY_BUCKETS if waited <= edge), "inf")
+    _incr(_key(queue, minute, f"le_{bucket}"))
+
+
+def latency_summary(queue: str, minutes: int = 15) -> dict:
+    """
+    {"count", "avg_ms", "p50_s", "p95_s"} over the last `minutes`; the
+    percentiles are histogram upper bounds.
+    """
+    now = _minute()
+    fields = ["count", "sum_ms"] + [f"le_{b}" for b in (*map(str, LATENCY_BUCKETS), "inf")]
+    keys = [_key(queue, m, f) for m in range(now - minutes + 1, now + 1) for f in fields]
+    values = cache.get_many(keys)
+
+    def total(field):
+        return sum(v for k, v in values.items() if k.endswith(f":{field}"))
+
+    count = total("count")
+    summary = {"count": count, "avg_ms": round(total("sum_ms") / count, 1) if count else None}
+    for name, q in (("p50_s", 0.50), ("p95_s", 0.95)):
+        summary[name] = None
+        seen = 0
+        for bucket in (*map(str, LATENCY_BUCKETS), "inf"):
+            seen += total(f"le_{bucket}")
+            if count and seen >= q * count:
+                summary[name] = bucket
+                break
+    return summary
@@ -0,0 +1,175 @@
+# attendance_ai/utils/timing.py
+import time
+import threading
+import contextvars
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+import numpy as np
+from django.core.cache import cache
+
+HISTOGRAM_SIZE = 2048  # most recent samples kept per stage (per process)
+
+# shared (cross-process) histograms for Celery task stages: cumulative edges, ms
+SHARED_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+SHARED_MINUTE_TTL = 2 * 3600
+SHARED_NAMES_KEY = "stage_timings:names"
+
+_current_timer = contextvars.ContextVar("stage_timer", default=None)
+_lock = threading.Lock()
+_samples = defaultdict(lambda: deque(maxlen=HISTOGRAM_SIZE))
+
+
+class StageTimer:
+    """
+    Collects (stage, ms) pairs for one request / task run.
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    def add(self, name: str, ms: float):
+        self.stages.append((name, ms))
+
+    def server_timing_header(self) -> str:
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in self.stages)
+
+
+def record(name: str, ms: float):
+    with _lock:
+        _samples[name].append(ms)
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.add(name, ms)
+
+
+def _shared_key(name, minute, field) -> str:
+    return f"stage_timings:{name}:{minute}:{field}"
+
+
+def _incr(key, delta=1):
+    cache.add(key, 0, SHARED_MINUTE_TTL)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, SHARED_MINUTE_TTL)
+
+
+def record_shared(name: str, ms: float):
+    """
+    Add one sample to the per-minute cache counters (count, total ms,
+    histogram bucket), like queue_metrics.record_start: every worker
+    process feeds the same numbers, so the web process can report them.
+    """
+    names = cache.get(SHARED_NAMES_KEY) or []
+    if name not in names:
+        cache.set(SHARED_NAMES_KEY, sorted({*names, name}), None)
+    minute = int(time.time()) // 60
+    _incr(_shared_key(name, minute, "count"))
+    _incr(_shared_key(name, minute, "sum_ms"), int(ms))
+    bucket = next((str(edge) for edge in SHARED_BUCKETS_MS if ms <= edge), "inf")
+    _incr(_shared_key(name, minute, f"le_{bucket}"))
+
+
+@contextmanager
+def stage(name: str, shared: bool = False):
+    """
+    with stage("detect"): ...
+    Records into the process-wide histogram and the active request timer (if any).
+    shared=True also feeds the cache histograms (Celery task stages, which
+    run in worker processes the web process cannot see).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - start) * 1000.0
+        record(name, ms)
+        if shared:
+            record_shared(name, ms)
+
+
+@contextmanager
+def request_timer():
+    timer = StageTimer()
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+
+
+def timed_view(prefix: str):
+    """
+    Decorator for APIView handlers: times every stage() reached while
+    handling the request and returns them in a Server-Timing header.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(view_self, request, *args, **kwargs):
+            with request_timer() as timer:
+                with stage(f"{prefix}_total"):
+                    response = func(view_self, request, *args, **kwargs)
+                response["Server-Timing"] = timer.server_timing_header()
+            return response
+        return wrapper
+    return decorator
+
+
+def stage_percentiles() -> dict:
+    with _lock:
+        snapshot = {name: list(values) for name, values in _samples.items()}
+
+    report = {}
+    for name, values in sorted(snapshot.items()):
+        arr = np.array(values, dtype=np.float64)
+        p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+        report[name] = {
+            "count": int(arr.size),
+            "mean_ms": round(float(arr.mean()), 2),
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+        }
+    return report
+
+
+def shared_stage_percentiles(minutes: int = 15) -> dict:
+    """
+    {"count", "mean_ms", "p50_ms", "p95_ms", "p99_ms"} per shared stage
+    over the last `minutes`, across all processes; the percentiles are
+    histogram upper bounds (None above the last edge).
+    """
+    names = cache.get(SHARED_NAMES_KEY) or []
+    now = int(time.time()) // 60
+    edges = (*map(str, SHARED_BUCKETS_MS), "inf")
+    fields = ["count", "sum_ms"] + [f"le_{b}" for b in edges]
+    values = cache.get_many([
+        _shared_key(name, m, f) for name in names for m in range(now - minutes + 1, now + 1) for f in fields
+    ])
+
+    report = {}
+    for name in names:
+        def total(field):
+            return sum(
+                values.get(_shared_key(name, m, field), 0) for m in range(now - minutes + 1, now + 1)
+            )
+
+        count = total("count")
+        if not count:
+            continue
+        row = {"count": count, "mean_ms": round(total("sum_ms") / count, 2)}
+        for label, q in (("p50_ms", 0.50), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            seen = 0
+            for bucket in edges:
+                seen += total(f"le_{bucket}")
+                if seen >= q * count:
+                    row[label] = None if bucket == "inf" else int(bucket)
+                    break
+        report[name] = row
+    return report
+
+
+def reset():
+    with _lock:
+        _samples.clear()
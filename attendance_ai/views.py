@@ -20,11 +20,24 @@ from .serializers import (
     AttendanceRecordSerializer
 )
 
-from .models import FaceProfile, RemoteAttendance, AuditLog
-from .services.face_recognition import FaceRecognitionService
-from .tasks import process_face_verification
+from .models import FaceProfile, RemoteAttendance
+from .services.face_recognition import FaceRecognitionService, active_model
+from .services import gallery, reembed
+from .services import today_status as today_status_cache
+from .tasks import process_face_verification, generate_image_derivatives
 from .utils.validators import validate_image_file
-from .utils.audit import audit_action
+from .utils.audit import audit_action, audit_log, AUDIT_MERGE_CHECKIN_ENTRIES
+from .utils.timing import stage, timed_view
+from .utils.idempotency import idempotent_view
+from .utils.dates import local_day_bounds
+from .utils.pagination import (
+    CursorError,
+    keyset_page,
+    parse_limit,
+    parse_day,
+    payload_etag,
+    etag_matches,
+)
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from django.contrib.auth import authenticate
@@ -56,12 +69,47 @@ def save_uploaded_image(f):
     return path, f"/media/uploads/{filename}"
 
 
+def quality_rejection_response(request, quality, public_url, action):
+    """
+    Build the response for an upload that failed the pre-inference quality
+    gate and record the measured metrics + active thresholds.
+    """
+    codes = [r["code"] for r in quality["reasons"]]
+
+    audit_log(
+        actor=request.user if request.user.is_authenticated else None,
+        action=action,
+        target_repr=",".join(codes),
+        extra={
+            "reasons": quality["reasons"],
+            "metrics": quality["metrics"],
+            "thresholds": quality["thresholds"],
+            "image_url": public_url,
+        },
+        ip_address=request.META.get("REMOTE_ADDR"),
+    )
+
+    if codes == ["no_face_detected"]:
+        return Response({"status": "error", "message": "No face detected", "reasons": quality["reasons"]}, status=400)
+
+    return Response(
+        {
+            "status": "rejected",
+            "message": quality["reasons"][0]["message"],
+            "reasons": quality["reasons"],
+            "image_url": public_url,
+        },
+        status=422
+    )
+
+
 # --------------------------
 # Face Register View
 # --------------------------
 class FaceRegisterView(APIView):
     permission_classes = [permissions.AllowAny]
 
+    @timed_view("register")
     def post(self, request):
         serializer = FaceRegisterSerializer(data=request.data)
         if not serializer.is_valid():
@@ -73,14 +121,15 @@ class FaceRegisterView(APIView):
         # ---------------------------
         # 1. SAVE IMAGE
         # ---------------------------
-        saved_path, public_url = save_uploaded_image(image)
+        with stage("upload_write"):
+            saved_path, public_url = save_uploaded_image(image)
 
         # ---------------------------
-        # 2. FACE ENCODING
+        # 2. FACE ENCODING (quality gated)
         # ---------------------------
-        emb = FaceRecognitionService.extract_face_encoding(saved_path)
+        emb, quality = FaceRecognitionService.extract_face_encoding_checked(saved_path)
         if emb is None:
-            return Response({"status": "error", "message": "No face detected"}, status=400)
+            return quality_rejection_response(request, quality, public_url, "face_register_rejected")
 
         # Normalize encoding
         if isinstance(emb, np.ndarray):
@@ -126,27 +175,35 @@ class FaceRegisterView(APIView):
         # ---------------------------
         # 4. SAVE FACE PROFILE
         # ---------------------------
-        FaceProfile.objects.update_or_create(
+        encoding_version = active_model()[0]
+        profile, profile_created = FaceProfile.objects.update_or_create(
             user=user,
             defaults={
                 "face_encoding": emb,
-                "encoding_version": "insightface_v1",
+                "encoding_version": encoding_version,
                 "consent_given": True,
                 "is_active": True,
+                "image_url": public_url,
+                "thumbnail_url": None,
+                "face_crop_url": None,
             }
         )
+        if not profile_created:
+            # embeddings of the old photo must not be activated later
+            reembed.discard_stale_embeddings([profile.id])
+        generate_image_derivatives.delay(saved_path, profile_id=profile.id, bbox=quality["metrics"]["bbox"])
 
         # ---------------------------
         # 5. AUDIT LOG ENTRY
         # ---------------------------
-        AuditLog.objects.create(
+        audit_log(
             actor=None,  # registration API has no authenticated actor
             action="face_registered",
             target_repr=f"User:{user.id}",
             extra={
                 "employee_id": user.employee_id,
                 "image_url": public_url,
-                "encoding_version": "insightface_v1",
+                "encoding_version": encoding_version,
             },
             ip_address=request.META.get("REMOTE_ADDR")
         )
@@ -174,6 +231,8 @@ class FaceRegisterView(APIView):
 class AttendanceCheckinView(APIView):
     permission_classes = [permissions.AllowAny]
 
+    @timed_view("checkin")
+    @idempotent_view("checkin")
     def post(self, request):
         serializer = AttendanceCheckinSerializer(data=request.data)
         if not serializer.is_valid():
@@ -184,104 +243,140 @@ class AttendanceCheckinView(APIView):
         device_info = serializer.validated_data.get("device_info", {})
 
         # --------------------------------------------------
-        # 1. Save uploaded image
+        # 0. Claimed identity (kiosk badge or JWT)
+        #    A body employee_id is only trusted from a logged-in
+        #    caller or a registered kiosk; anyone else is held to
+        #    the 1:N thresholds and gets one uniform rejection.
         # --------------------------------------------------
-        saved_path, public_url = save_uploaded_image(image)
+        trusted = request.user.is_authenticated or gallery.is_registered_kiosk(device_info)
+        claimed_user = None
+        employee_id = serializer.validated_data.get("employee_id")
+        if employee_id:
+            claimed_user = User.objects.filter(employee_id=employee_id).first()
+            if claimed_user is None and trusted:
+                return Response(
+                    {"status": "not_found", "message": "Unknown employee_id"},
+                    status=404
+                )
+        elif request.user.is_authenticated:
+            claimed_user = request.user
 
         # --------------------------------------------------
-        # 2. Extract face embedding
+        # 1. Save uploaded image
         # --------------------------------------------------
-        embedding = FaceRecognitionService.extract_face_encoding(saved_path)
-        if embedding is None:
-            return Response(
-                {"status": "error", "message": "No face detected"},
-                status=400
-            )
+        with stage("upload_write"):
+            saved_path, public_url = save_uploaded_image(image)
 
         # --------------------------------------------------
-        # 3. Compare with stored face profiles
+        # 2. Quality gate + face embedding
         # --------------------------------------------------
-        profiles = FaceProfile.objects.filter(
-            is_active=True
-        ).exclude(face_encoding__isnull=True)
-
-        best_score = -1.0
-        best_profile = None
-
-        for profile in profiles:
-            stored_embedding = np.array(profile.face_encoding, dtype=np.float32)
-            score = FaceRecognitionService.calculate_confidence(
-                stored_embedding, embedding
-            )
-
-            if score > best_score:
-                best_score = score
-                best_profile = profile
+        embedding, quality = FaceRecognitionService.extract_face_encoding_checked(saved_path)
+        if embedding is None:
+            return quality_rejection_response(request, quality, public_url, "attendance_quality_rejected")
 
         # --------------------------------------------------
-        # 4. Thresholds
+        # 3. Match: 1:1 verification when the identity is
+        #    claimed, otherwise 1:N search over the gallery
         # --------------------------------------------------
-        MATCH_THRESHOLD = 0.65        # Face belongs to a user
-        AUTO_APPROVE_THRESHOLD = 0.80 # Auto verified (no admin)
-
-        if not best_profile or best_score < MATCH_THRESHOLD:
-            return Response(
-                {
-                    "status": "not_found",
-                    "message": "Face not registered",
-                    "best_score": float(best_score) if best_score >= 0 else None,
+        match_scope = None
+        if employee_id or claimed_user is not None:
+            match_mode = "verification"
+            strict = not trusted
+            if claimed_user is None:
+                result = {"matched": False, "score": -1.0, "reason": "unknown_employee"}
+            else:
+                result = gallery.verify(embedding, claimed_user.id, strict=strict)
+            best_score = result["score"]
+
+            if not result["matched"]:
+                body = {
+                    "status": "not_matched",
+                    "message": "Face does not match employee",
                     "image_url": public_url,
-                },
-                status=404
+                }
+                if trusted:
+                    body["reason"] = result["reason"]
+                    body["best_score"] = float(best_score) if best_score >= 0 else None
+                return Response(body, status=404)
+
+            user = claimed_user
+            attendance_status = gallery.decide(result, strict=strict)
+        else:
+            match_mode = "identification"
+            strict = True
+            best_user_id, best_score, match_scope = gallery.identify_in_shard(
+                embedding, gallery.shard_for_device(device_info)
+            )
+
+            if best_user_id is None or best_score < gallery.MATCH_THRESHOLD:
+                return Response(
+                    {
+                        "status": "not_found",
+                        "message": "Face not registered",
+                        "best_score": float(best_score) if best_score >= 0 else None,
+                        "image_url": public_url,
+                    },
+                    status=404
+                )
+
+            user = User.objects.get(pk=best_user_id)
+            attendance_status = (
+                "verified"
+                if best_score >= gallery.AUTO_APPROVE_THRESHOLD
+                else "pending"
             )
 
         # --------------------------------------------------
-        # 5. Decide attendance status
+        # 4. Create attendance
         # --------------------------------------------------
-        attendance_status = (
-            "verified"
-            if best_score >= AUTO_APPROVE_THRESHOLD
-            else "pending"
-        )
-
-        user = best_profile.user
-
-        attendance = RemoteAttendance.objects.create(
-            user=user,
-            check_in_time=timezone.now(),
-            status=attendance_status,
-            confidence_score=float(best_score),
-            geolocation=geolocation,
-            device_info=device_info,
-            verification_image_url=public_url,
-        )
+        with stage("db_insert"):
+            attendance = RemoteAttendance(
+                user=user,
+                check_in_time=timezone.now(),
+                status=attendance_status,
+                confidence_score=float(best_score),
+                geolocation=geolocation,
+                device_info=device_info,
+                verification_image_url=public_url,
+            )
+            # the post_save signal skips its own "attendance_created" entry
+            attendance._audited_by_view = AUDIT_MERGE_CHECKIN_ENTRIES
+            attendance.save()
 
         # --------------------------------------------------
-        # 6. Audit log
+        # 5. Audit log
         # --------------------------------------------------
-        AuditLog.objects.create(
-            actor=request.user if request.user.is_authenticated else None,
-            action="attendance_checkin",
-            target_repr=f"user:{user.id}",
-            extra={
-                "confidence": float(best_score),
-                "status": attendance_status,
-            },
-            ip_address=request.META.get("REMOTE_ADDR"),
-        )
+        with stage("audit"):
+            audit_log(
+                actor=request.user if request.user.is_authenticated else None,
+                action="attendance_checkin",
+                target_repr=f"user:{user.id}",
+                extra={
+                    "attendance_id": attendance.id,
+                    "confidence": float(best_score),
+                    "status": attendance_status,
+                    "match_mode": match_mode,
+                    "match_scope": match_scope,
+                    "quality": quality["metrics"],
+                },
+                ip_address=request.META.get("REMOTE_ADDR"),
+            )
 
         # --------------------------------------------------
-        # 7. Async verification task
+        # 6. Async verification task
         # --------------------------------------------------
-        process_face_verification.delay(attendance.id, saved_path)
+        with stage("enqueue"):
+            process_face_verification.delay(attendance.id, saved_path, strict=strict)
+            generate_image_derivatives.delay(saved_path, attendance_id=attendance.id, bbox=quality["metrics"]["bbox"])
 
         # --------------------------------------------------
-        # 8. Response
+        # 7. Response
         # --------------------------------------------------
         return Response(
             {
                 "status": "success",
                 "attendance_status": attendance_status,
+                "match_mode": match_mode,
                 "confidence_score": float(best_score),
                 "attendance_id": attendance.id,
                 "check_in_time": attendance.check_in_time,
@@ -387,38 +482,75 @@ def register_user(request):
     }, status=201)
 
 
+HISTORY_FIELDS = set(AttendanceRecordSerializer.Meta.fields) | {"thumbnail_url"}
+HISTORY_DEFAULT_FIELDS = ["id", "check_in_time", "check_out_time", "status", "confidence_score"]
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def attendance_history(request):
-    records = RemoteAttendance.objects.filter(
-        user=request.user
-    ).order_by("-check_in_time")
+    """
+    GET /api/attendance/history/?limit=50&cursor=...&from=YYYY-MM-DD&to=YYYY-MM-DD&fields=id,status
+    Newest first, keyset-paginated on (check_in_time, id). The JSON blobs
+    (geolocation, device_info) are only returned when asked for in ?fields=.
+    """
+    params = request.query_params
+
+    fields = [f for f in params.get("fields", "").split(",") if f] or HISTORY_DEFAULT_FIELDS
+    unknown = set(fields) - HISTORY_FIELDS
+    if unknown:
+        return Response({"error": f"Unknown fields: {', '.join(sorted(unknown))}"}, status=400)
+    projection = list(dict.fromkeys(["id", "check_in_time", *fields]))
+
+    try:
+        date_from = parse_day(params.get("from"))
+        date_to = parse_day(params.get("to"))
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=400)
+
+    records = RemoteAttendance.objects.filter(user=request.user)
+    if date_from:
+        records = records.filter(check_in_time__gte=local_day_bounds(date_from)[0])
+    if date_to:
+        records = records.filter(check_in_time__lt=local_day_bounds(date_to)[1])
+
+    try:
+        rows, next_cursor = keyset_page(
+            records.values(*projection),
+            cursor=params.get("cursor"),
+            limit=parse_limit(params.get("limit")),
+        )
+    except CursorError:
+        return Response({"error": "Invalid cursor"}, status=400)
+
+    payload = {
+        "results": [{f: row[f] for f in fields} for row in rows],
+        "next_cursor": next_cursor,
+    }
 
-    serializer = AttendanceRecordSerializer(records, many=True)
-    return Response(serializer.data)
+    etag = payload_etag(payload)
+    if etag_matches(request, etag):
+        response = Response(status=304)
+    else:
+        response = Response(payload)
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def today_status(request):
-    today = timezone.now().date()
-
-    record = RemoteAttendance.objects.filter(
-        user=request.user,
-        check_out_time__isnull=True,
-        check_in_time__date=today
-    ).order_by("-check_in_time").first()
-
-
-    if record:
-        return Response({
-            "checked_in": True,
-            "check_in_time": record.check_in_time,
-            "checked_out": bool(record.check_out_time),
-            "check_out_time": record.check_out_time
-        })
+    # served from the per-user cache entry kept current by the attendance signals
+    entry = today_status_cache.get(request.user.id)
 
-    return Response({"checked_in": False})
+    if etag_matches(request, entry["etag"]):
+        response = Response(status=304)
+    else:
+        response = Response(entry["payload"])
+    response["ETag"] = entry["etag"]
+    response["Cache-Control"] = "private, no-cache"
+    return response
 
 
 
@@ -448,7 +580,7 @@ class AttendanceCheckoutView(APIView):
         attendance.save(update_fields=["check_out_time"])
 
         # Audit log
-        AuditLog.objects.create(
+        audit_log(
             actor=user,
             action="attendance_checkout",
             target_repr=f"user:{user.id}",
@@ -3,28 +3,87 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser
 from rest_framework import status
-from .models import RemoteAttendance, AttendanceAnomaly
+from django.db.models import Sum, Min, Max
+from .models import RemoteAttendance, AttendanceAnomaly, DailyAttendanceSummary
+from .utils.timing import stage_percentiles, shared_stage_percentiles, reset as reset_stage_timings
+from .utils.pagination import CursorError, keyset_page, parse_limit, parse_day, estimated_count
+from .services.review import (
+    REVIEW_STATUSES,
+    BULK_SYNC_LIMIT,
+    pending_queryset,
+    apply_review,
+    audit_bulk_review,
+)
+from .tasks import bulk_review_attendance
+from celery.result import AsyncResult
 from django.utils import timezone
 
 
 class PendingVerificationsView(APIView):
+    """
+    GET /api/review/pending/
+      ?limit=50&cursor=...            keyset pagination (newest first)
+      &department=...                 exact department
+      &from=YYYY-MM-DD&to=YYYY-MM-DD  local check-in dates
+      &min_confidence=0.6&max_confidence=0.8
+      &original=1                     full-resolution images instead of thumbnails
+    One joined query per page plus a planner-estimated total.
+    """
     permission_classes = [IsAdminUser]
 
+    FIELDS = (
+        "id",
+        "check_in_time",
+        "confidence_score",
+        "verification_image_url",
+        "thumbnail_url",
+        "face_crop_url",
+        "user__employee_id",
+        "user__username",
+        "user__department",
+        "user__face_profile__face_crop_url",
+        "user__face_profile__thumbnail_url",
+    )
+
     def get(self, request):
-        items = RemoteAttendance.objects.filter(status="pending").order_by("-check_in_time")
+        params = request.query_params
+        original = params.get("original") in ("1", "true")
+
+        try:
+            items = pending_queryset(filters=params)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=400)
+
+        try:
+            rows, next_cursor = keyset_page(
+                items.values(*self.FIELDS),
+                cursor=params.get("cursor"),
+                limit=parse_limit(params.get("limit")),
+            )
+        except CursorError:
+            return Response({"error": "Invalid cursor"}, status=400)
 
-        data = []
-        for a in items:
-            data.append({
-                "id": a.id,
-                "employee_id": a.user.employee_id,
-                "employee_name": a.user.username,
-                "check_in_time": a.check_in_time,
-                "confidence_score": a.confidence_score,
-                "image_url": a.verification_image_url,
-            })
+        count, is_estimate = estimated_count(items)
 
-        return Response(data)
+        data = [{
+            "id": a["id"],
+            "employee_id": a["user__employee_id"],
+            "employee_name": a["user__username"],
+            "department": a["user__department"],
+            "check_in_time": a["check_in_time"],
+            "confidence_score": a["confidence_score"],
+            "image_url": a["verification_image_url"] if original else (a["thumbnail_url"] or a["verification_image_url"]),
+            "face_crop_url": a["face_crop_url"],
+            "original_image_url": a["verification_image_url"],
+            "registered_face_url": a["user__face_profile__face_crop_url"] or a["user__face_profile__thumbnail_url"],
+        } for a in rows]
+
+        return Response({
+            "results": data,
+            "next_cursor": next_cursor,
+            "count": count,
+            "count_is_estimate": is_estimate,
+        })
 
 
 # attendance_ai/views_admin.py
@@ -65,7 +124,7 @@ class ApproveAttendanceView(APIView):
         attendance.review_notes = notes
         attendance.reviewed_by = request.user
         attendance.reviewed_at = timezone.now()
-        attendance.save()
+        attendance.save(update_fields=["status", "review_notes", "reviewed_by", "reviewed_at"])
 
         return Response({
             "status": "approved",
@@ -110,7 +169,7 @@ class RejectAttendanceView(APIView):
         attendance.review_notes = notes
         attendance.reviewed_by = request.user
         attendance.reviewed_at = timezone.now()
-        attendance.save()
+        attendance.save(update_fields=["status", "review_notes", "reviewed_by", "reviewed_at"])
 
         return Response({
             "status": "rejected",
@@ -122,7 +181,12 @@ class RejectAttendanceView(APIView):
 
 
 class BatchApproveView(APIView):
+    """
+    Approve the latest pending check-in of each employee in employee_ids:
+    one SELECT to pick the rows, one UPDATE to review them.
+    """
     permission_classes = [IsAdminUser]
+    action = "approve"
 
     def post(self, request):
         employee_ids = request.data.get("employee_ids")
@@ -133,32 +197,101 @@ class BatchApproveView(APIView):
                 status=400
             )
 
-        approved = []
-        skipped = []
+        latest = {}
+        rows = (
+            RemoteAttendance.objects
+            .filter(user__employee_id__in=employee_ids, status="pending")
+            .order_by("user_id", "-check_in_time")
+            .values_list("id", "user__employee_id")
+        )
+        for attendance_id, emp_id in rows:
+            latest.setdefault(emp_id, attendance_id)
+
+        updated = apply_review(
+            RemoteAttendance.objects.filter(id__in=latest.values()),
+            self.action,
+            request.user.id,
+            request.data.get("notes", ""),
+        )
+        audit_bulk_review(request.user.id, self.action, updated, list(latest.values()),
+                          ip_address=request.META.get("REMOTE_ADDR"))
+
+        done = [emp_id for emp_id in employee_ids if emp_id in latest]
+        skipped = [emp_id for emp_id in employee_ids if emp_id not in latest]
+        return Response({
+            "status": f"batch_{REVIEW_STATUSES[self.action]}",
+            f"{REVIEW_STATUSES[self.action]}_employee_ids": done,
+            "skipped_employee_ids": skipped,
+            f"{REVIEW_STATUSES[self.action]}_count": updated
+        })
 
-        for emp_id in employee_ids:
-            attendance = RemoteAttendance.objects.filter(
-                user__employee_id=emp_id,
-                status="pending"
-            ).order_by("-check_in_time").first()
 
-            if not attendance:
-                skipped.append(emp_id)
-                continue
+class BatchRejectView(BatchApproveView):
+    action = "reject"
 
-            attendance.status = "approved"
-            attendance.reviewed_by = request.user
-            attendance.reviewed_at = timezone.now()
-            attendance.save()
 
-            approved.append(emp_id)
+class BulkReviewView(APIView):
+    """
+    POST /api/review/bulk/
+    {
+      "action": "approve" | "reject",
+      "attendance_ids": [1, 2, 3]                     # or
+      "filters": {"department": "sales", "date": "today", "min_confidence": 0.75},
+      "notes": "...",
+      "async": false                                  # forced on above BULK_REVIEW_SYNC_LIMIT rows
+    }
+    Small batches are applied inline; large ones return 202 with a task id
+    to poll at /api/review/bulk/<task_id>/.
+    """
+    permission_classes = [IsAdminUser]
 
-        return Response({
-            "status": "batch_approved",
-            "approved_employee_ids": approved,
-            "skipped_employee_ids": skipped,
-            "approved_count": len(approved)
-        })
+    def post(self, request):
+        action = request.data.get("action")
+        if action not in REVIEW_STATUSES:
+            return Response({"error": "action must be 'approve' or 'reject'"}, status=400)
+
+        attendance_ids = request.data.get("attendance_ids")
+        filters = request.data.get("filters")
+        if attendance_ids is None and not filters:
+            return Response({"error": "attendance_ids or filters required"}, status=400)
+        if attendance_ids is not None and (
+            not isinstance(attendance_ids, list) or not all(isinstance(i, int) for i in attendance_ids)
+        ):
+            return Response({"error": "attendance_ids must be a list of integers"}, status=400)
+        if filters is not None and not isinstance(filters, dict):
+            return Response({"error": "filters must be an object"}, status=400)
+
+        try:
+            queryset = pending_queryset(attendance_ids, filters)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=400)
+
+        notes = request.data.get("notes", "")
+        ip_address = request.META.get("REMOTE_ADDR")
+        size = len(attendance_ids) if attendance_ids is not None else estimated_count(queryset)[0]
+
+        if request.data.get("async") or size > BULK_SYNC_LIMIT:
+            task = bulk_review_attendance.delay(action, request.user.id, notes, attendance_ids, filters, ip_address)
+            return Response({
+                "status": "queued",
+                "task_id": task.id,
+                "estimated_rows": size,
+                "status_url": f"/api/review/bulk/{task.id}/",
+            }, status=status.HTTP_202_ACCEPTED)
+
+        updated = apply_review(queryset, action, request.user.id, notes)
+        audit_bulk_review(request.user.id, action, updated, attendance_ids, filters, ip_address)
+
+        return Response({"status": REVIEW_STATUSES[action], "updated": updated})
+
+
+class BulkReviewStatusView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, task_id):
+        result = AsyncResult(task_id)
+        info = result.info if isinstance(result.info, dict) else {"detail": str(result.info) if result.info else None}
+        return Response({"task_id": task_id, "state": result.state, **info})
 
 
 
@@ -182,7 +315,73 @@ class AnomalyListView(APIView):
         } for a in anomalies]
 
         return Response(data)
-    
 
 
+class StageTimingsView(APIView):
+    """
+    p50/p95/p99 per check-in stage: "web" as seen by this web process,
+    "tasks" for Celery task stages across all workers over the last
+    ?minutes= (default 15, read from the cache).
+    DELETE clears the in-process histograms.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            minutes = min(max(int(request.query_params.get("minutes", 15)), 1), 120)
+        except ValueError:
+            return Response({"detail": "minutes must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"web": stage_percentiles(), "tasks": shared_stage_percentiles(minutes)})
+
+    def delete(self, request):
+        reset_stage_timings()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class AttendanceSummaryView(APIView):
+    """
+    GET /api/reports/summary/?from=YYYY-MM-DD&to=YYYY-MM-DD&department=...&group_by=date,department,status
+    Reads the DailyAttendanceSummary rollup (one row per date x department
+    x status), so a year of data is a few thousand rows at most.
+    """
+    permission_classes = [IsAdminUser]
+    GROUP_FIELDS = ("date", "department", "status")
+
+    def get(self, request):
+        params = request.query_params
+        group_by = [g for g in params.get("group_by", "date").split(",") if g]
+        if not group_by or set(group_by) - set(self.GROUP_FIELDS):
+            return Response({"error": f"group_by must be a subset of {', '.join(self.GROUP_FIELDS)}"}, status=400)
+
+        try:
+            date_from = parse_day(params.get("from")) or timezone.localdate().replace(day=1)
+            date_to = parse_day(params.get("to")) or timezone.localdate()
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=400)
+
+        rows = DailyAttendanceSummary.objects.filter(date__gte=date_from, date__lte=date_to)
+        if params.get("department"):
+            rows = rows.filter(department=params["department"])
+
+        rows = (
+            rows.values(*group_by)
+            .annotate(
+                count=Sum("count"),
+                confidence_sum=Sum("confidence_sum"),
+                confidence_count=Sum("confidence_count"),
+                confidence_min=Min("confidence_min"),
+                confidence_max=Max("confidence_max"),
+                first_check_in=Min("first_check_in"),
+                last_check_out=Max("last_check_out"),
+            )
+            .order_by(*group_by)
+        )
+
+        data = []
+        for r in rows:
+            conf_sum = r.pop("confidence_sum") or 0.0
+            conf_count = r.pop("confidence_count") or 0
+            r["confidence_avg"] = conf_sum / conf_count if conf_count else None
+            data.append(r)
 
+        return Response({"from": date_from, "to": date_to, "group_by": group_by, "results": data})
@@ -1,9 +1,64 @@
 #config/celery.py
+import gc
 import os
+import logging
 from celery import Celery
+from celery.signals import before_task_publish, task_prerun, worker_init
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 app = Celery("attendance_ai")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+
+logger = logging.getLogger(__name__)
+
+
+@worker_init.connect
+def preload_face_models(**kwargs):
+    """
+    Load and warm the InsightFace/ONNX models in the worker's main process
+    before the prefork pool starts, so every child inherits the weights
+    copy-on-write instead of loading its own copy.
+
+    onnxruntime thread pools do not survive fork, so this only runs with
+    single-threaded sessions (FACE_ORT_INTRA_OP_THREADS=1); scale with
+    --concurrency instead. Any other value leaves loading to each child.
+    """
+    from django.conf import settings
+    from django.db import connections
+
+    if not getattr(settings, "CELERY_PRELOAD_FACE_MODELS", True):
+        return
+    if int(getattr(settings, "FACE_ORT_INTRA_OP_THREADS", 0)) != 1:
+        logger.warning("FACE_ORT_INTRA_OP_THREADS != 1: face models load per child, not shared")
+        return
+
+    from attendance_ai.services.face_recognition import warm_up_face_models
+    warm_up_face_models()
+    logger.info("Face models preloaded in worker parent (pid %s)", os.getpid())
+
+    # children must not share the parent's DB sockets, and freezing the
+    # heap keeps gc from touching (and so copying) the shared pages
+    connections.close_all()
+    gc.freeze()
+
+
+# ---------------------------------------------------------
+# Queue wait metrics (manage.py celery_queue_stats)
+# ---------------------------------------------------------
+@before_task_publish.connect
+def stamp_enqueue_time(headers=None, **kwargs):
+    from attendance_ai.utils.queue_metrics import stamp_headers
+    stamp_headers(headers)
+
+
+@task_prerun.connect
+def record_queue_wait(task=None, **kwargs):
+    from attendance_ai.utils.queue_metrics import record_start, ENQUEUED_AT_HEADER
+    try:
+        delivery = task.request.delivery_info or {}
+        record_start(delivery.get("routing_key"), getattr(task.request, ENQUEUED_AT_HEADER, None))
+    except Exception:
+        # metrics must never fail a task
+        logger.debug("queue wait metric failed", exc_info=True)
@@ -10,4 +10,16 @@ app.conf.beat_schedule = {
         "task": "attendance_ai.tasks.generate_daily_reports",
         "schedule": crontab(hour=18, minute=0),  # 6 PM daily
     },
+    "archive-audit-logs-daily": {
+        "task": "attendance_ai.tasks.archive_audit_logs",
+        "schedule": crontab(hour=2, minute=30),  # 2:30 AM daily
+    },
+    "anomaly-drain-sweep": {
+        "task": "attendance_ai.tasks.detect_anomalies_batch",
+        "schedule": 60.0,  # catches drains lost to a cache flush
+    },
+    "notification-digest": {
+        "task": "attendance_ai.tasks.flush_notifications",
+        "schedule": 900.0,  # every 15 minutes (NOTIFY_DIGEST_INTERVAL)
+    },
 }
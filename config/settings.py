@@ -12,10 +12,13 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 from celery.schedules import crontab
-from decouple import config
+from kombu import Queue
+from decouple import Csv, config
 import dj_database_url
+from corsheaders.defaults import default_headers
 
 
 ATTENDANCE_FERNET_KEY = os.environ.get("ATTENDANCE_FERNET_KEY")
@@ -33,6 +36,9 @@ SECRET_KEY = config("DJANGO_SECRET_KEY")
 
 DEBUG = config("DEBUG", cast=bool, default=False)
 
+# manage.py test / pytest
+TESTING = sys.argv[1:2] == ["test"] or "pytest" in sys.modules
+
 ALLOWED_HOSTS = config(
     "DJANGO_ALLOWED_HOSTS",
     default="localhost,127.0.0.1"
@@ -69,6 +75,8 @@ CORS_ALLOWED_ORIGINS = config(
     default="http://localhost:5173"
 ).split(",")
 
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
+
 
 
 AUTH_USER_MODEL = "attendance_ai.RegisteredUser"
@@ -142,6 +150,80 @@ CHANNEL_LAYERS = {
 
 
 
+# Shared cache (idempotency keys, counters, cached status) - must be shared
+# between web and worker processes, so it lives in Redis.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": config("CACHE_URL", default=config("REDIS_URL")),
+    }
+}
+if TESTING:
+    # tests run without Redis
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# Check-in Idempotency-Key handling
+IDEMPOTENCY_TTL_SECONDS = config("IDEMPOTENCY_TTL_SECONDS", cast=int, default=24 * 3600)
+IDEMPOTENCY_WAIT_SECONDS = config("IDEMPOTENCY_WAIT_SECONDS", cast=int, default=30)
+
+# Per-user sliding-window check-in counters (frequency anomaly rule)
+CHECKIN_WINDOW_SECONDS = config("CHECKIN_WINDOW_SECONDS", cast=int, default=3600)
+CHECKIN_WINDOW_BUCKET_SECONDS = config("CHECKIN_WINDOW_BUCKET_SECONDS", cast=int, default=300)
+CHECKIN_WINDOW_SEEDED_SECONDS = config("CHECKIN_WINDOW_SEEDED_SECONDS", cast=int, default=7 * 86400)
+
+# Anomaly engine: queued check-ins are analysed in micro-batches
+ANOMALY_BATCH_SIZE = config("ANOMALY_BATCH_SIZE", cast=int, default=500)
+ANOMALY_FLUSH_SECONDS = config("ANOMALY_FLUSH_SECONDS", cast=int, default=5)
+
+# Nightly verification image cleanup (cleanup_old_images task)
+IMAGE_RETENTION_DAYS = config("IMAGE_RETENTION_DAYS", cast=int, default=30)
+IMAGE_CLEANUP_CHUNK_SIZE = config("IMAGE_CLEANUP_CHUNK_SIZE", cast=int, default=1000)
+IMAGE_CLEANUP_WORKERS = config("IMAGE_CLEANUP_WORKERS", cast=int, default=8)
+
+# Audit log writes are buffered in-process and bulk inserted; entries
+# buffered when a process crashes are lost (AUDIT_BUFFERED=False writes inline).
+# Off under tests: the flush timer thread would write on its own connection.
+AUDIT_BUFFERED = config("AUDIT_BUFFERED", cast=bool, default=not TESTING)
+AUDIT_BUFFER_SIZE = config("AUDIT_BUFFER_SIZE", cast=int, default=200)
+AUDIT_FLUSH_INTERVAL = config("AUDIT_FLUSH_INTERVAL", cast=float, default=2.0)
+AUDIT_MERGE_CHECKIN_ENTRIES = config("AUDIT_MERGE_CHECKIN_ENTRIES", cast=bool, default=False)
+
+# Audit retention: older rows move to <AUDIT_ARCHIVE_DIR>/YYYY/MM/audit-YYYY-MM-DD.jsonl.gz
+AUDIT_RETENTION_DAYS = config("AUDIT_RETENTION_DAYS", cast=int, default=90)
+AUDIT_ARCHIVE_DIR = config("AUDIT_ARCHIVE_DIR", default=str(BASE_DIR / "audit_archive"))
+AUDIT_ARCHIVE_CHUNK_SIZE = config("AUDIT_ARCHIVE_CHUNK_SIZE", cast=int, default=5000)
+
+# Email. For local runs and tests point EMAIL_BACKEND at
+# django.core.mail.backends.console.EmailBackend (stdout) or
+# django.core.mail.backends.filebased.EmailBackend (one file per
+# connection under EMAIL_FILE_PATH) instead of a real SMTP server.
+EMAIL_BACKEND = config(
+    "EMAIL_BACKEND",
+    default="django.core.mail.backends.console.EmailBackend" if DEBUG else "django.core.mail.backends.smtp.EmailBackend",
+)
+EMAIL_FILE_PATH = config("EMAIL_FILE_PATH", default=str(BASE_DIR / "sent_emails"))
+EMAIL_HOST = config("EMAIL_HOST", default="localhost")
+EMAIL_PORT = config("EMAIL_PORT", cast=int, default=25)
+EMAIL_HOST_USER = config("EMAIL_HOST_USER", default="")
+EMAIL_HOST_PASSWORD = config("EMAIL_HOST_PASSWORD", default="")
+EMAIL_USE_TLS = config("EMAIL_USE_TLS", cast=bool, default=False)
+EMAIL_TIMEOUT = config("EMAIL_TIMEOUT", cast=int, default=10)
+DEFAULT_FROM_EMAIL = config("DEFAULT_FROM_EMAIL", default="attendance@localhost")
+ADMIN_EMAIL = config("ADMIN_EMAIL", default="admin@localhost")
+HR_TEAM_EMAIL = config("HR_TEAM_EMAIL", default=ADMIN_EMAIL)
+
+# Anomaly alerts are queued and mailed as one digest per recipient
+NOTIFY_ANOMALY_RECIPIENTS = config("NOTIFY_ANOMALY_RECIPIENTS", cast=Csv(), default=ADMIN_EMAIL)
+NOTIFY_DIGEST_MIN_SEVERITY = config("NOTIFY_DIGEST_MIN_SEVERITY", default="high")          # lower: not mailed
+NOTIFY_IMMEDIATE_MIN_SEVERITY = config("NOTIFY_IMMEDIATE_MIN_SEVERITY", default="critical")  # flush early
+NOTIFY_IMMEDIATE_COOLDOWN = config("NOTIFY_IMMEDIATE_COOLDOWN", cast=int, default=60)
+NOTIFY_DIGEST_INTERVAL = config("NOTIFY_DIGEST_INTERVAL", cast=int, default=900)
+NOTIFY_FLUSH_LIMIT = config("NOTIFY_FLUSH_LIMIT", cast=int, default=5000)
+NOTIFY_MAX_ATTEMPTS = config("NOTIFY_MAX_ATTEMPTS", cast=int, default=5)  # failed flushes before giving up
+NOTIFY_CLAIM_SECONDS = config("NOTIFY_CLAIM_SECONDS", cast=int, default=600)  # > flush_notifications time limit
+
+
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -202,6 +284,45 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Pre-inference image quality gate (see FaceRecognitionService.assess_image_quality)
+FACE_QUALITY_THRESHOLDS = {
+    "min_blur_variance": config("FACE_QUALITY_MIN_BLUR_VARIANCE", cast=float, default=60.0),
+    "min_brightness": config("FACE_QUALITY_MIN_BRIGHTNESS", cast=float, default=40.0),
+    "max_brightness": config("FACE_QUALITY_MAX_BRIGHTNESS", cast=float, default=220.0),
+    "min_face_size": config("FACE_QUALITY_MIN_FACE_SIZE", cast=int, default=80),
+    "min_det_score": config("FACE_QUALITY_MIN_DET_SCORE", cast=float, default=0.50),
+}
+
+# 1:1 verification when the check-in carries a JWT or badge employee_id
+FACE_VERIFY_MATCH_THRESHOLD = config("FACE_VERIFY_MATCH_THRESHOLD", cast=float, default=0.62)
+FACE_VERIFY_AUTO_APPROVE_THRESHOLD = config("FACE_VERIFY_AUTO_APPROVE_THRESHOLD", cast=float, default=0.78)
+FACE_VERIFY_COHORT_SIZE = config("FACE_VERIFY_COHORT_SIZE", cast=int, default=20)
+FACE_VERIFY_COHORT_MARGIN = config("FACE_VERIFY_COHORT_MARGIN", cast=float, default=0.03)
+
+# 1:N search: optional in-memory index with a compressed first pass (PCA
+# and/or float16/int8) whose top-K candidates are re-scored in float32
+# (manage.py benchmark_gallery_search)
+FACE_COARSE_SEARCH = config("FACE_COARSE_SEARCH", cast=bool, default=False)
+FACE_COARSE_DIMS = config("FACE_COARSE_DIMS", cast=int, default=128)
+FACE_COARSE_DTYPE = config("FACE_COARSE_DTYPE", default="float16")
+FACE_COARSE_TOP_K = config("FACE_COARSE_TOP_K", cast=int, default=32)
+FACE_COARSE_MIN_GALLERY = config("FACE_COARSE_MIN_GALLERY", cast=int, default=5000)
+
+# Kiosks registered as KioskDevice search their department's gallery
+# first and fall back to the whole gallery on a miss
+FACE_GALLERY_SHARDING = config("FACE_GALLERY_SHARDING", cast=bool, default=True)
+
+# Model pack / encoding_version used until an EmbeddingVersion is activated
+# (manage.py reembed_gallery)
+FACE_MODEL_PACK = config("FACE_MODEL_PACK", default="buffalo_l")
+FACE_ENCODING_VERSION = config("FACE_ENCODING_VERSION", default="insightface_v1")
+REEMBED_CHUNK_SIZE = config("REEMBED_CHUNK_SIZE", cast=int, default=100)
+
+# onnxruntime intra-op threads per process (0 = one per core). Celery
+# workers run with 1 so the models can be preloaded before forking and
+# concurrency comes from the number of children.
+FACE_ORT_INTRA_OP_THREADS = config("FACE_ORT_INTRA_OP_THREADS", cast=int, default=0)
+
 CELERY_BROKER_URL = config("CELERY_BROKER_URL")
 CELERY_RESULT_BACKEND = config("CELERY_RESULT_BACKEND")
 
@@ -210,6 +331,66 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "Asia/Karachi"
 
+# prefork children share the models loaded by config.celery.preload_face_models
+CELERY_PRELOAD_FACE_MODELS = config("CELERY_PRELOAD_FACE_MODELS", cast=bool, default=True)
+CELERY_WORKER_CONCURRENCY = config("CELERY_WORKER_CONCURRENCY", cast=int, default=4)
+
+# ---------------------------------------------------------
+# Queues: one worker per queue (see Procfile) so nightly/bulk work can
+# never sit in front of check-in verification.
+#   realtime - check-in verification + review thumbnails
+#   anomaly  - post-verification checks, audit fallback writes
+#   bulk     - maintenance, bulk review, re-embedding
+#   email    - outgoing mail and reports
+# ---------------------------------------------------------
+_REDIS_BROKER = CELERY_BROKER_URL.startswith(("redis://", "rediss://"))
+
+
+def _priority(urgency):
+    # urgency 0 (background) .. 9 (most urgent); Redis treats 0 as highest
+    return 9 - urgency if _REDIS_BROKER else urgency
+
+
+CELERY_TASK_QUEUES = [
+    Queue(name, routing_key=name, queue_arguments={"x-max-priority": 10})
+    for name in ("realtime", "anomaly", "bulk", "email")
+]
+CELERY_TASK_DEFAULT_QUEUE = "bulk"  # unrouted tasks never land on realtime
+CELERY_BROKER_TRANSPORT_OPTIONS = {"queue_order_strategy": "priority", "priority_steps": list(range(10))}
+CELERY_TASK_DEFAULT_PRIORITY = _priority(5)
+CELERY_WORKER_PREFETCH_MULTIPLIER = config("CELERY_WORKER_PREFETCH_MULTIPLIER", cast=int, default=1)
+
+CELERY_TASK_ROUTES = {
+    "attendance_ai.tasks.process_face_verification": {"queue": "realtime", "priority": _priority(9)},
+    "attendance_ai.tasks.generate_image_derivatives": {"queue": "realtime", "priority": _priority(4)},
+    "attendance_ai.tasks.detect_anomalies_batch": {"queue": "anomaly", "priority": _priority(6)},
+    "attendance_ai.tasks.detect_attendance_anomalies": {"queue": "anomaly", "priority": _priority(6)},
+    "attendance_ai.tasks.write_audit_entries": {"queue": "anomaly", "priority": _priority(3)},
+    "attendance_ai.tasks.bulk_review_attendance": {"queue": "bulk", "priority": _priority(6)},
+    "attendance_ai.tasks.cleanup_old_images": {"queue": "bulk", "priority": _priority(1)},
+    "attendance_ai.tasks.archive_audit_logs": {"queue": "bulk", "priority": _priority(1)},
+    "attendance_ai.tasks.reembed_profiles": {"queue": "bulk", "priority": _priority(2)},
+    "attendance_ai.tasks.generate_daily_reports": {"queue": "email", "priority": _priority(4)},
+    "attendance_ai.tasks.flush_notifications": {"queue": "email", "priority": _priority(7)},
+}
+
+# (soft, hard) time limits in seconds
+CELERY_TASK_ANNOTATIONS = {
+    name: {"soft_time_limit": soft, "time_limit": hard}
+    for name, (soft, hard) in {
+        "attendance_ai.tasks.process_face_verification": (30, 60),
+        "attendance_ai.tasks.generate_image_derivatives": (30, 60),
+        "attendance_ai.tasks.detect_anomalies_batch": (120, 180),
+        "attendance_ai.tasks.detect_attendance_anomalies": (120, 180),
+        "attendance_ai.tasks.bulk_review_attendance": (1800, 1900),
+        "attendance_ai.tasks.cleanup_old_images": (3600, 3700),
+        "attendance_ai.tasks.archive_audit_logs": (3600, 3700),
+        "attendance_ai.tasks.reembed_profiles": (600, 700),
+        "attendance_ai.tasks.generate_daily_reports": (300, 360),
+        "attendance_ai.tasks.flush_notifications": (300, 360),
+    }.items()
+}
+
 
 CELERY_BEAT_SCHEDULE = {
     "cleanup-old-images-daily": {
@@ -220,6 +401,18 @@ CELERY_BEAT_SCHEDULE = {
         "task": "attendance_ai.tasks.generate_daily_reports",
         "schedule": crontab(hour=18, minute=0),
     },
+    "archive-audit-logs-daily": {
+        "task": "attendance_ai.tasks.archive_audit_logs",
+        "schedule": crontab(hour=2, minute=30),
+    },
+    "anomaly-drain-sweep": {
+        "task": "attendance_ai.tasks.detect_anomalies_batch",
+        "schedule": 60.0,
+    },
+    "notification-digest": {
+        "task": "attendance_ai.tasks.flush_notifications",
+        "schedule": float(NOTIFY_DIGEST_INTERVAL),
+    },
 }
 
 
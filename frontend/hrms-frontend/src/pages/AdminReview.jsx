@@ -29,7 +29,7 @@ export default function AdminReview() {
           api.get("review/anomalies/"),
         ]);
 
-        setPending(pendingRes.data || []);
+        setPending(pendingRes.data?.results || []);
         setAnomalies(anomalyRes.data || []);
       } catch (err) {
         setError("Failed to load admin review data");
@@ -123,7 +123,7 @@ useEffect(() => {
 
   const batchApprove = async () => {
     await api.post("review/batch-approve/", {
-      ids: Array.from(selected), // backend expects IDs
+      employee_ids: Array.from(selected),
     });
     setPending((p) => p.filter((x) => !selected.has(x.employee_id)));
     setSelected(new Set());
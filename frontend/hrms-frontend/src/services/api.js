@@ -130,8 +130,19 @@ export const getTodayStatus = async () => {
 // ------------------------------
 // HISTORY
 // ------------------------------
-export const getAttendanceHistory = async () => {
-  return (await api.get("attendance/history/")).data;
+// The endpoint is cursor-paginated: follow next_cursor until the last
+// page so callers get the full history (optionally narrowed with from/to).
+export const getAttendanceHistory = async (params = {}) => {
+  const results = [];
+  let cursor = null;
+  do {
+    const { data } = await api.get("attendance/history/", {
+      params: { limit: 200, ...params, ...(cursor ? { cursor } : {}) },
+    });
+    results.push(...data.results);
+    cursor = data.next_cursor;
+  } while (cursor);
+  return results;
 };
 
 // ------------------------------
@@ -1,8 +1,13 @@
 import os
+import sys
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
 import django
-import cv2
 import numpy as np
-from insightface.app import FaceAnalysis
 
 # -----------------------------
 # Load Django Settings
@@ -10,88 +15,189 @@ from insightface.app import FaceAnalysis
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 django.setup()
 
+from django.db import connections, transaction
+from django.utils import timezone
+
 from attendance_ai.models import User, FaceProfile
+from attendance_ai.services import gallery, reembed
+from attendance_ai.services.face_recognition import active_model, embed_image_paths, init_embedding_worker
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 
 
 # -----------------------------
-# Generate embedding using InsightFace
+# Stream known_faces/<username>/
 # -----------------------------
-def generate_embedding(image_path, app):
-    img = cv2.imread(image_path)
-
-    if img is None:
-        print(f"[ERROR] Cannot read image: {image_path}")
-        return None
-
-    faces = app.get(img)
+def iter_user_folders(root):
+    """
+    Yield (username, [image paths]) one user folder at a time.
+    """
+    with os.scandir(root) as it:
+        for entry in it:
+            if not entry.is_dir():
+                continue
+            with os.scandir(entry.path) as files:
+                paths = sorted(f.path for f in files if f.is_file() and f.name.lower().endswith(IMAGE_EXTENSIONS))
+            if paths:
+                yield entry.name, paths
 
-    if len(faces) == 0:
-        print(f"[ERROR] No face found in: {image_path}")
-        return None
 
-    return faces[0].embedding.tolist()
+def best_template(results, top_k):
+    """
+    Mean of the top_k highest quality embeddings, re-normalized.
+    """
+    ranked = sorted(results, key=lambda r: r[1], reverse=True)[:top_k]
+    emb = np.mean([np.array(e, dtype=np.float32) for e, _ in ranked], axis=0)
+    norm = np.linalg.norm(emb)
+    return (emb / norm if norm > 0 else emb).tolist(), ranked[0][1]
 
 
 # -----------------------------
-# Main Execution
+# Resume file: one finished username per line
 # -----------------------------
-def run():
-    print("🚀 Starting InsightFace Encoding Generator...")
-
-    # Initialize InsightFace model
-    app = FaceAnalysis(name="buffalo_l")
-    app.prepare(ctx_id=0, det_size=(640, 640))
-
-    # Correct base directory for known_faces
-    project_root = os.path.dirname(os.path.abspath(__file__))  # D:\hrms-face-attendance
-    known_faces_dir = os.path.join(project_root, "attendance_ai", "known_faces")
-
-    print("🔍 Known faces directory:", known_faces_dir)
+def load_done(path):
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path) as fh:
+        return {line.strip() for line in fh if line.strip()}
 
-    # Process all users
-    users = User.objects.all()
 
-    for user in users:
-        folder = os.path.join(known_faces_dir, user.username)
+def mark_done(path, usernames):
+    if path and usernames:
+        with open(path, "a") as fh:
+            fh.writelines(f"{u}\n" for u in usernames)
 
-        print("👉 Checking folder:", folder)
 
-        if not os.path.exists(folder):
-            print(f"[SKIP] No folder found for user: {user.username}")
+# -----------------------------
+# Batched writes
+# -----------------------------
+def save_templates(templates, encoding_version):
+    """
+    templates: {user_id: embedding}. One SELECT, one bulk_update and one
+    bulk_create per batch.
+    """
+    now = timezone.now()
+    existing = {p.user_id: p for p in FaceProfile.objects.filter(user_id__in=templates)}
+    created = []
+    for user_id, emb in templates.items():
+        profile = existing.get(user_id)
+        if profile is None:
+            created.append(FaceProfile(
+                user_id=user_id, face_encoding=emb, encoding_version=encoding_version,
+                consent_given=True, is_active=True,
+            ))
             continue
+        profile.face_encoding = emb
+        profile.encoding_version = encoding_version
+        profile.consent_given = True
+        profile.is_active = True
+        profile.updated_at = now  # bulk_update skips auto_now
 
-        # Scan all image files
-        for file_name in os.listdir(folder):
-            image_path = os.path.join(folder, file_name)
-
-            if not image_path.lower().endswith((".jpg", ".jpeg", ".png")):
-                continue
-
-            print(f"➡️ Processing: {image_path}")
-
-            embedding = generate_embedding(image_path, app)
+    with transaction.atomic():
+        FaceProfile.objects.bulk_update(
+            existing.values(), ["face_encoding", "encoding_version", "consent_given", "is_active", "updated_at"]
+        )
+        FaceProfile.objects.bulk_create(created)
+        reembed.discard_stale_embeddings([p.id for p in existing.values()])
+    return len(existing), len(created)
 
-            if embedding is None:
-                continue
 
-            # Store embedding in DB
-            FaceProfile.objects.update_or_create(
-                user=user,
-                defaults={
-                    "face_encoding": embedding,
-                    "encoding_version": "insightface_v1",
-                    "consent_given": True,
-                    "is_active": True,
-                }
-            )
+# -----------------------------
+# Main Execution
+# -----------------------------
+def run(args):
+    print("🚀 Starting InsightFace Encoding Generator...")
 
-            print(f"✅ Saved embedding for: {user.username}")
+    known_faces_dir = args.dir or os.path.join(PROJECT_ROOT, "attendance_ai", "known_faces")
+    print("🔍 Known faces directory:", known_faces_dir)
 
-    print("🎉 All embeddings generated successfully!")
+    encoding_version, model_pack = active_model()
+    if args.model_pack and args.model_pack != model_pack:
+        # rows are labelled with the active encoding_version; another pack's
+        # embeddings would silently mix into the live gallery
+        print(f"❌ --model-pack {args.model_pack} is not the active pack ({model_pack}). "
+              f"Build and activate a new gallery with: python manage.py reembed_gallery")
+        sys.exit(1)
+    resume_file = None if args.no_resume else args.resume_file
+    if args.restart and resume_file and os.path.exists(resume_file):
+        os.remove(resume_file)
+    done = load_done(resume_file)
+    if done:
+        print(f"⏩ Resuming: {len(done)} users already enrolled")
+
+    stats = {"users": 0, "images": 0, "enrolled": 0, "no_face": 0, "unknown": 0, "updated": 0, "created": 0}
+    started = time.monotonic()
+    folders = (f for f in iter_user_folders(known_faces_dir) if f[0] not in done)
+
+    # workers spawn fresh: no inherited DB connections, one CPU model each
+    connections.close_all()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(args.workers, mp_context=context, initializer=init_embedding_worker,
+                             initargs=(model_pack,)) as inference:
+        while True:
+            batch = list(islice(folders, args.batch_size))
+            if not batch:
+                break
+
+            users = dict(User.objects.filter(username__in=[u for u, _ in batch]).values_list("username", "id"))
+            folders_seen = len(batch)
+            batch = [(u, paths) for u, paths in batch if u in users]
+            stats["unknown"] += folders_seen - len(batch)
+
+            # workers decode their own images: only paths and embeddings are pickled
+            embedded = inference.map(embed_image_paths, [paths for _, paths in batch], [model_pack] * len(batch))
+
+            templates = {}
+            for (username, paths), (results, unreadable) in zip(batch, embedded):
+                stats["users"] += 1
+                stats["images"] += len(paths)
+                for path in unreadable:
+                    print(f"[ERROR] Cannot read image: {path}")
+                if not results:
+                    print(f"[ERROR] No face found for: {username}")
+                    stats["no_face"] += 1
+                    continue
+                templates[users[username]], quality = best_template(results, args.top_k)
+                if args.verbose:
+                    print(f"✅ {username}: {len(results)}/{len(paths)} faces, best quality {quality:.2f}")
+
+            updated, created = save_templates(templates, encoding_version) if templates else (0, 0)
+            stats["updated"] += updated
+            stats["created"] += created
+            stats["enrolled"] += len(templates)
+            mark_done(resume_file, [u for u, _ in batch])
+
+            elapsed = time.monotonic() - started
+            print(f"👉 {stats['users']} users, {stats['images']} images, "
+                  f"{stats['images'] / elapsed:.1f} img/s")
+
+    gallery.invalidate()
+
+    elapsed = time.monotonic() - started
+    print(f"🎉 Enrolled {stats['enrolled']} users ({stats['created']} new, {stats['updated']} updated) "
+          f"from {stats['images']} images in {elapsed:.1f}s")
+    print(f"   {stats['users'] / elapsed if elapsed else 0:.1f} users/s, "
+          f"{stats['images'] / elapsed if elapsed else 0:.1f} images/s; "
+          f"{stats['no_face']} without a usable face, {stats['unknown']} folders with no matching user")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Batch-enroll faces from known_faces/<username>/ folders.")
+    parser.add_argument("--dir", help="known_faces root (default attendance_ai/known_faces).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Inference processes.")
+    parser.add_argument("--batch-size", type=int, default=200, help="Users per DB write / resume step.")
+    parser.add_argument("--top-k", type=int, default=1, help="Average the K best embeddings per user.")
+    parser.add_argument("--model-pack", help="Must match the active version's pack (upgrades: reembed_gallery).")
+    parser.add_argument("--resume-file", default=os.path.join(PROJECT_ROOT, ".generate_encodings.resume"))
+    parser.add_argument("--no-resume", action="store_true", help="Neither read nor write the resume file.")
+    parser.add_argument("--restart", action="store_true", help="Delete the resume file first.")
+    parser.add_argument("--verbose", action="store_true", help="Print one line per user.")
+    return parser.parse_args(argv)
 
 
 # -----------------------------
 # Entry Point
 # -----------------------------
 if __name__ == "__main__":
-    run()
+    run(parse_args(sys.argv[1:]))